@@ -1,13 +1,20 @@
-from flask import Flask
+import multiprocessing
 from app.config.settings import Config
 
 def create_app(config_class=Config):
+    # Imported here so the services (and the command-line converter) load without Flask
+    from flask import Flask
+
     app = Flask(__name__, 
                 template_folder='../templates',
                 static_folder='../static')
     
     app.config.from_object(config_class)
     
+    # Stream multipart uploads straight into conversion workspaces
+    from app.services.upload_service import StreamingRequest
+    app.request_class = StreamingRequest
+    
     # Register blueprints
     from app.routes.main import main_bp
     from app.routes.api import api_bp
@@ -15,4 +22,10 @@ def create_app(config_class=Config):
     app.register_blueprint(main_bp)
     app.register_blueprint(api_bp, url_prefix='/api')
     
+    # Expire finished conversion workspaces in the background, though not
+    # from render pool workers, which import the main module (run.py) again
+    from app.services.workspace_service import WorkspaceService
+    if multiprocessing.parent_process() is None:
+        WorkspaceService().start_reaper()
+    
     return app
@@ -6,6 +6,16 @@ class Config:
     # File upload settings
     UPLOAD_DIR = os.path.join(tempfile.gettempdir(), "uploads")
     MAX_CONTENT_LENGTH = 200 * 1024 * 1024  # 200MB max file size
+    MAX_UNCOMPRESSED_ZIP_BYTES = 1024 * 1024 * 1024  # 1GB once a ZIP is expanded
+    # Per-conversion workspaces and their expiry
+    WORKSPACE_ROOT = os.path.join(tempfile.gettempdir(), "workspaces")
+    WORKSPACE_TTL = 60 * 60  # Seconds a finished workspace is kept
+    WORKSPACE_QUOTA_BYTES = 2 * 1024 * 1024 * 1024  # 2GB across all workspaces
+    WORKSPACE_ACTIVE_TIMEOUT = 6 * 60 * 60  # Active workspaces older than this are stale
+    WORKSPACE_REAP_INTERVAL = 5 * 60  # Seconds between reaper runs
+    TREE_PAGE_SIZE = 500  # Files per folder page on the confirmation screen
+    # Read ZIP members straight from the archive instead of extracting them
+    STREAM_ZIP_INGESTION = os.environ.get("STREAM_ZIP_INGESTION", "1") == "1"
     
     # File extensions
     IMAGE_EXTENSIONS = {".png", ".jpg", ".jpeg", ".gif", ".bmp"}
@@ -22,6 +32,75 @@ class Config:
     DEFAULT_LINE_HEIGHT = 12
     DEFAULT_MARGIN = 10
     MAX_CHARS_PER_LINE = 90
+    TAB_SIZE = 4  # Columns a tab expands to
+    # Images are resampled to this resolution for the area they are drawn in
+    IMAGE_DOWNSCALE_ENABLED = os.environ.get("IMAGE_DOWNSCALE_ENABLED", "1") == "1"
+    IMAGE_TARGET_DPI = 150
+    IMAGE_JPEG_QUALITY = 80  # Used when a resampled opaque image is stored as JPEG
+    # Redraw PDF input pages of another size at the output page size
+    RESCALE_PDF_INPUTS = os.environ.get("RESCALE_PDF_INPUTS", "1") == "1"
+    # Bytes read from the start of each input to classify it before converting
+    CLASSIFY_SAMPLE_BYTES = 8 * 1024
+    # Estimated pages a job may produce; files that would exceed it are skipped (0: no limit)
+    PDF_PAGE_BUDGET = int(os.environ.get("PDF_PAGE_BUDGET", 20000))
+    # Default for the table of contents page option
+    PDF_CONTENTS_PAGE = os.environ.get("PDF_CONTENTS_PAGE", "0") == "1"
+    # Default for the syntax highlighting option; token styles are cached in memory
+    SYNTAX_HIGHLIGHTING = os.environ.get("SYNTAX_HIGHLIGHTING", "0") == "1"
+    HIGHLIGHT_CACHE_MAX_BYTES = 64 * 1024 * 1024  # 64MB
+    # Processes used to render files in parallel (1 renders serially)
+    PDF_WORKERS = int(os.environ.get("PDF_WORKERS", 1))
+    # Low-memory output appends chunks of PDF_FLUSH_PAGES pages to the file as
+    # they complete, holding no more than that in memory
+    PDF_LOW_MEMORY = os.environ.get("PDF_LOW_MEMORY", "0") == "1"
+    PDF_FLUSH_PAGES = int(os.environ.get("PDF_FLUSH_PAGES", 200))
+    # Output save profile: "fast" or "compact" (see pdf_output.SAVE_PROFILES)
+    PDF_SAVE_PROFILE = os.environ.get("PDF_SAVE_PROFILE", "compact")
+
+    # Render cache of per-file PDF fragments
+    RENDER_CACHE_ENABLED = os.environ.get("RENDER_CACHE_ENABLED", "1") == "1"
+    RENDER_CACHE_DIR = os.path.join(tempfile.gettempdir(), "render_cache")
+    RENDER_CACHE_MAX_BYTES = 512 * 1024 * 1024  # 512MB
+
+    # Deterministic output: the document ID and default output name come from
+    # a hash of the inputs and settings, and repeat conversions are served
+    # from the result store without rendering
+    DETERMINISTIC_OUTPUT = os.environ.get("DETERMINISTIC_OUTPUT", "0") == "1"
+    RESULT_STORE_DIR = os.path.join(tempfile.gettempdir(), "results")
+    RESULT_STORE_MAX_BYTES = 2 * 1024 * 1024 * 1024  # 2GB
+
+    # Background conversion jobs
+    JOB_WORKERS = int(os.environ.get("JOB_WORKERS", 2))
+    JOB_RETENTION = 60 * 60  # Seconds a finished job stays queryable
+
+    # Admission control: bounds on the work a single conversion may trigger
+    MAX_ZIP_MEMBERS = int(os.environ.get("MAX_ZIP_MEMBERS", 100000))  # Across a request's ZIPs
+    MAX_ZIP_MEMBER_RATIO = 200  # Expanded/compressed size of a member over 1MB (zip bombs)
+    # Per-job budgets (0: no limit); CPU time includes render workers', see JobBudget
+    JOB_CPU_SECONDS = int(os.environ.get("JOB_CPU_SECONDS", 600))
+    JOB_MAX_PAGES = int(os.environ.get("JOB_MAX_PAGES", 50000))
+    JOB_DISK_BYTES = int(os.environ.get("JOB_DISK_BYTES", 1536 * 1024 * 1024))  # 1.5GB
+    # Jobs with more supported input than either limit are heavy; at most
+    # MAX_HEAVY_JOBS run at once per process and further ones get a 429
+    HEAVY_JOB_BYTES = 20 * 1024 * 1024  # 20MB
+    HEAVY_JOB_FILES = 5000
+    MAX_HEAVY_JOBS = int(os.environ.get("MAX_HEAVY_JOBS", 1))
+    HEAVY_JOB_WAIT = 30  # Seconds /generate waits for a heavy slot before a 429
+    HEAVY_JOB_SECONDS = 60  # Initial guess of a heavy job's duration, for Retry-After
+
+    # Conversion counter shared by all worker processes
+    COUNTER_FILE = "counter.json"
+    COUNTER_FLUSH_INTERVAL = 5  # Seconds between merges of local counts into the file
+
+    # Delivery of generated PDFs
+    PRECOMPRESS_OUTPUTS = os.environ.get("PRECOMPRESS_OUTPUTS", "0") == "1"  # Also write .gz variants
+    # Let the front-end server send the file: X-Sendfile (Apache, lighttpd) or,
+    # with a prefix, X-Accel-Redirect to an nginx internal location mapped to WORKSPACE_ROOT
+    USE_X_SENDFILE = os.environ.get("USE_X_SENDFILE", "0") == "1"
+    X_ACCEL_REDIRECT_PREFIX = os.environ.get("X_ACCEL_REDIRECT_PREFIX", "")
+
+    # Per-conversion stage traces (Chrome trace format) are written here when set
+    TRACE_DIR = os.environ.get("TRACE_DIR") or None
     
     # Ensure upload directory exists
     os.makedirs(UPLOAD_DIR, exist_ok=True) 
\ No newline at end of file
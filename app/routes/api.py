@@ -1,11 +1,81 @@
-from flask import Blueprint, jsonify
+from flask import Blueprint, Response, jsonify, request
+from app.config.settings import Config
+from app.services.admission_service import AdmissionService
 from app.services.counter_service import CounterService
+from app.services.file_processor import FileProcessor
+from app.services.job_service import JobService
+from app.services.metrics import MetricsRegistry
+from app.services.render_cache import RenderCache
+from app.services.result_store import ResultStore
+from app.services.workspace_service import WorkspaceService
 
 api_bp = Blueprint('api', __name__)
 counter_service = CounterService()
+job_service = JobService()
+workspace_service = WorkspaceService()
 
 @api_bp.route("/pdf_count")
 def pdf_count():
     """Get the current PDF conversion count."""
     current_count = counter_service.get_count()
-    return jsonify({"count": current_count}) 
\ No newline at end of file
+    return jsonify({"count": current_count})
+
+@api_bp.route("/jobs/<job_id>")
+def job_status(job_id):
+    """Get the status, progress and result URLs of a conversion job."""
+    status = job_service.get_status(
+        job_id, workspace_service.control_dir(workspace_service.path(job_id)))
+    if status is None:
+        return jsonify({'status': 'error', 'message': 'Job not found'}), 404
+    return jsonify(status)
+
+@api_bp.route("/tree")
+def file_tree_level():
+    """Get one folder level of a confirmation file tree, with a page of its files."""
+    workspace_dir = workspace_service.path(request.args.get("workspace"))
+    file_tree = FileProcessor.load_file_tree(workspace_dir) if workspace_dir else None
+    if file_tree is None:
+        return jsonify({'status': 'error', 'message': 'Upload expired'}), 404
+    offset = max(0, request.args.get("offset", 0, type=int))
+    limit = min(max(1, request.args.get("limit", Config.TREE_PAGE_SIZE, type=int)),
+                Config.TREE_PAGE_SIZE)
+    level = FileProcessor.tree_level(file_tree, request.args.get("path", ""), offset, limit)
+    if level is None:
+        return jsonify({'status': 'error', 'message': 'Folder not found'}), 404
+    return jsonify(level)
+
+@api_bp.route("/render_cache")
+def render_cache_stats():
+    """Get render cache hit/miss counters and size."""
+    return jsonify(RenderCache().get_stats())
+
+@api_bp.route("/metrics")
+def metrics():
+    """Stage timing histograms and service counters in the Prometheus text format."""
+    cache_stats = RenderCache().get_stats()
+    admission_stats = AdmissionService().get_stats()
+    result_stats = ResultStore().get_stats()
+    extra_lines = [
+        "# HELP unifydoc_conversions_total Completed conversions.",
+        "# TYPE unifydoc_conversions_total counter",
+        f"unifydoc_conversions_total {counter_service.get_count()}",
+        "# HELP unifydoc_render_cache_requests_total Render cache lookups by result.",
+        "# TYPE unifydoc_render_cache_requests_total counter",
+        f'unifydoc_render_cache_requests_total{{result="hit"}} {cache_stats["hits"]}',
+        f'unifydoc_render_cache_requests_total{{result="miss"}} {cache_stats["misses"]}',
+        "# HELP unifydoc_render_cache_bytes Size of the render cache on disk.",
+        "# TYPE unifydoc_render_cache_bytes gauge",
+        f"unifydoc_render_cache_bytes {cache_stats['bytes']}",
+        "# HELP unifydoc_result_store_requests_total Stored result lookups by result.",
+        "# TYPE unifydoc_result_store_requests_total counter",
+        f'unifydoc_result_store_requests_total{{result="hit"}} {result_stats["hits"]}',
+        f'unifydoc_result_store_requests_total{{result="miss"}} {result_stats["misses"]}',
+        "# HELP unifydoc_heavy_jobs Heavy conversions running in this process.",
+        "# TYPE unifydoc_heavy_jobs gauge",
+        f"unifydoc_heavy_jobs {admission_stats['heavy_running']}",
+        "# HELP unifydoc_heavy_jobs_limit Heavy conversions allowed at once per process.",
+        "# TYPE unifydoc_heavy_jobs_limit gauge",
+        f"unifydoc_heavy_jobs_limit {admission_stats['heavy_limit']}"
+    ]
+    return Response(MetricsRegistry().render(extra_lines),
+                    mimetype="text/plain; version=0.0.4")
@@ -2,22 +2,37 @@ import os
 import secrets
 import json
 from flask import (
-    Blueprint, render_template, request, send_file, 
-    flash, session, current_app, jsonify, redirect, url_for
+    Blueprint, render_template, request,
+    flash, session, current_app, jsonify, redirect, url_for, abort
 )
 from werkzeug.utils import secure_filename
 from werkzeug.exceptions import RequestEntityTooLarge
-from app.services.pdf_generator import PDFGenerator
+from app.services.pdf_generator import ConversionCancelled
+from app.services.exporters import exporter_class, create_exporter
 from app.services.file_processor import FileProcessor
 from app.services.counter_service import CounterService
+from app.services.job_service import JobService
+from app.services.workspace_service import WorkspaceService
+from app.services.upload_service import UploadRejected, collect_uploads
+from app.services.metrics import timed, tracing
+from app.services.delivery_service import DeliveryService
+from app.services.result_store import ResultStore
+from app.services.admission_service import (
+    AdmissionService, AdmissionRejected, JobBudget, JobLimitExceeded
+)
+from app.utils.security import is_safe_path
 from app.config.settings import Config
 
 main_bp = Blueprint('main', __name__)
 counter_service = CounterService()
 file_processor = FileProcessor()
 
-# Dictionary to track active conversions
-active_conversions = {}
+# Table of background conversions, shared with the API blueprint
+job_service = JobService()
+# Per-conversion upload/output directories; job ids are workspace ids
+workspace_service = WorkspaceService()
+# Caps the heavy conversions running at once
+admission_service = AdmissionService()
 
 @main_bp.errorhandler(RequestEntityTooLarge)
 def handle_file_too_large(error):
@@ -27,6 +42,13 @@ def handle_file_too_large(error):
         'message': 'File is too large. Maximum upload size is 200MB.'
     }), 413
 
+def busy_response(error):
+    """429 for a heavy conversion turned away by admission control."""
+    return jsonify({
+        'status': 'error',
+        'message': str(error)
+    }), 429, {'Retry-After': str(error.retry_after)}
+
 @main_bp.route("/", methods=["GET", "POST"])
 def index():
     if request.method == "GET":
@@ -40,32 +62,27 @@ def index():
             pdf_url=pdf_url, 
             view_url=view_url, 
             section=section,
-            converted_pdf_count=current_count
+            converted_pdf_count=current_count,
+            save_profile=Config.PDF_SAVE_PROFILE,
+            syntax_highlighting=Config.SYNTAX_HIGHLIGHTING,
+            contents_page=Config.PDF_CONTENTS_PAGE
         )
 
     # Handle POST request
-    conversion_id = request.form.get('conversion_id', str(secrets.token_hex(8)))
-    active_conversions[conversion_id] = {'status': 'processing'}
+    workspace_id, workspace_dir = workspace_service.create()
 
     try:
-        # Clean up upload directory
-        file_processor.cleanup_upload_dir()
-
-        # Process uploaded files
-        uploaded_files = request.files.getlist("files")
-        file_paths = []
-        for file in uploaded_files:
-            filename = secure_filename(file.filename)
-            file_path = os.path.join(Config.UPLOAD_DIR, filename)
-            file.save(file_path)
-            if filename.endswith(".zip"):
-                file_paths.extend(file_processor.process_zip(file_path))
-            else:
-                file_paths.append(file_path)
-
-        # Check if conversion was cancelled
-        if active_conversions.get(conversion_id, {}).get('status') == 'cancelled':
-            return jsonify({'status': 'cancelled'})
+        # Uploads stream straight into the workspace while the body is parsed;
+        # ZIP extraction runs in the background job
+        request.upload_dir = workspace_dir
+        totals = {}
+        with timed("upload") as timing:
+            upload_paths, content_hashes = collect_uploads(request.files.getlist("files"),
+                                                           workspace_dir, totals)
+            timing["bytes"] = request.content_length
+        # Sized from the ZIP central directories; nothing is extracted yet
+        ticket = admission_service.acquire(
+            AdmissionService.is_heavy(totals["bytes"], totals["files"]))
 
         # Process settings
         settings = {
@@ -75,129 +92,211 @@ def index():
             'orientation': request.form.get("orientation", "portrait"),
             'page_size': request.form.get("page_size", "letter"),
             'show_file_info': bool(request.form.get("show_file_info")),
-            'pdf_name': request.form.get("pdf_name", "UnifyDoc.pdf")
+            'pdf_name': request.form.get("pdf_name", "UnifyDoc.pdf"),
+            'save_profile': request.form.get("save_profile") or Config.PDF_SAVE_PROFILE,
+            'syntax_highlighting': bool(request.form.get("syntax_highlighting")),
+            'contents_page': bool(request.form.get("contents_page")),
+            'output_format': request.form.get("output_format") or "pdf"
         }
 
-        # Generate PDF
-        pdf_name = generate_pdf_with_settings(settings, file_paths, conversion_id)
-        
-        # Check again if conversion was cancelled
-        if active_conversions.get(conversion_id, {}).get('status') == 'cancelled':
-            # Clean up generated files
-            output_pdf_path = os.path.join(Config.UPLOAD_DIR, pdf_name)
-            if os.path.exists(output_pdf_path):
-                os.remove(output_pdf_path)
-            return jsonify({'status': 'cancelled'})
+        def finish_job():
+            # Also runs for jobs cancelled before they start, which never
+            # reach run_conversion
+            admission_service.release(ticket)
+            workspace_service.release(workspace_id)
 
-        # Increment counter on success
-        counter_service.increment()
+        try:
+            job = job_service.submit(workspace_id, run_conversion, settings, upload_paths,
+                                     workspace_dir, content_hashes,
+                                     state_dir=workspace_service.control_dir(workspace_dir),
+                                     on_finish=finish_job)
+        except Exception:
+            admission_service.release(ticket)
+            raise
 
-        # Clean up conversion tracking
-        active_conversions.pop(conversion_id, None)
+        return jsonify({
+            'status': 'queued',
+            'job_id': job.id,
+            'status_url': url_for('api.job_status', job_id=job.id)
+        }), 202
 
+    except UploadRejected as e:
+        workspace_service.release(workspace_id)
         return jsonify({
-            'status': 'success',
-            'pdf_url': f"/download?pdf_name={pdf_name}",
-            'view_url': f"/view?pdf_name={pdf_name}"
-        })
+            'status': 'error',
+            'message': e.description
+        }), e.code
+
+    except AdmissionRejected as e:
+        workspace_service.release(workspace_id)
+        return busy_response(e)
 
     except Exception as e:
-        active_conversions.pop(conversion_id, None)
+        workspace_service.release(workspace_id)
         return jsonify({
             'status': 'error',
             'message': str(e)
         }), 500
 
+def run_conversion(job, settings, upload_paths, workspace_dir, content_hashes=None):
+    """
+    Background job body: extracts uploaded ZIPs and generates the PDF
+    within the job's JobBudget. Returns the generated PDF name. The job's
+    on_finish releases the workspace, however the job ends.
+    """
+    zip_paths = []
+    budget = JobBudget(workspace_dir)
+    try:
+        with tracing(job.id, trace_path(job.id)), timed("conversion") as timing:
+            file_paths = []
+            for file_path in upload_paths:
+                if file_path.endswith(".zip"):
+                    if Config.STREAM_ZIP_INGESTION:
+                        file_paths.extend(file_processor.iter_zip(file_path, workspace_dir))
+                        zip_paths.append(file_path)
+                    else:
+                        file_paths.extend(file_processor.process_zip(file_path, workspace_dir))
+                else:
+                    file_paths.append(file_path)
+
+            job.files_total = len(file_paths)
+            job.update_progress(0, 0)
+            # Extracted ZIPs count against the disk budget
+            budget.check(check_disk=True)
+
+            output_name = generate_pdf_with_settings(settings, file_paths, workspace_dir,
+                                                     budget.progress(job.update_progress),
+                                                     content_hashes, stats=job.stats,
+                                                     cpu_callback=budget.charge_cpu)
+            timing["pages"] = job.stats.get("pages")
+
+        # Cancelled after the last progress update but before we returned
+        if job.cancelled:
+            DeliveryService.discard(os.path.join(workspace_dir, output_name))
+            raise ConversionCancelled(job.id)
+    finally:
+        for zip_path in zip_paths:
+            file_processor.close_zip(zip_path)
+
+    # Increment counter on success
+    counter_service.increment()
+    return output_name
+
+def trace_path(conversion_id):
+    """Where a conversion's stage trace is written, or None if tracing is off."""
+    if not Config.TRACE_DIR:
+        return None
+    return os.path.join(Config.TRACE_DIR, f"{conversion_id}.json")
+
 @main_bp.route("/cancel_conversion", methods=["POST"])
 def cancel_conversion():
     """Handle conversion cancellation requests."""
     conversion_id = request.headers.get('X-Conversion-ID')
-    if conversion_id and conversion_id in active_conversions:
-        active_conversions[conversion_id]['status'] = 'cancelled'
+    if conversion_id and job_service.cancel(
+            conversion_id, workspace_service.control_dir(workspace_service.path(conversion_id))):
         return jsonify({'status': 'success', 'message': 'Conversion cancelled'})
     return jsonify({'status': 'error', 'message': 'Conversion not found'}), 404
 
+def resolve_output_path(workspace_id, output_name):
+    """Returns the path of a generated output inside its workspace, or None."""
+    workspace_dir = workspace_service.path(workspace_id)
+    if workspace_dir is None:
+        return None
+    output_path = os.path.join(workspace_dir, secure_filename(output_name))
+    if not is_safe_path(workspace_dir, output_path) or not os.path.isfile(output_path):
+        return None
+    return output_path
+
 @main_bp.route("/download")
 def download_pdf():
-    pdf_name = request.args.get("pdf_name", "UnifyDoc.pdf")
-    output_pdf_path = os.path.join(Config.UPLOAD_DIR, pdf_name)
-    return send_file(output_pdf_path, as_attachment=True, download_name=pdf_name)
+    output_name = request.args.get("pdf_name", "UnifyDoc.pdf")
+    output_path = resolve_output_path(request.args.get("workspace"), output_name)
+    if output_path is None:
+        abort(404)
+    return DeliveryService.send(output_path, as_attachment=True, download_name=output_name)
 
 @main_bp.route("/view")
 def view_pdf():
-    pdf_name = request.args.get("pdf_name", "UnifyDoc.pdf")
-    output_pdf_path = os.path.join(Config.UPLOAD_DIR, pdf_name)
-    return send_file(output_pdf_path, as_attachment=False)
+    output_name = request.args.get("pdf_name", "UnifyDoc.pdf")
+    output_path = resolve_output_path(request.args.get("workspace"), output_name)
+    if output_path is None:
+        abort(404)
+    return DeliveryService.send(output_path, as_attachment=False)
 
 @main_bp.route("/confirm", methods=["GET", "POST"])
 def confirm():
     if request.method == "POST":
-        # Process uploaded files
-        uploaded_files = request.files.getlist("files")
-        file_tree = {"files": [], "folders": []}
-        for file in uploaded_files:
-            filename = secure_filename(file.filename)
-            file_path = os.path.join(Config.UPLOAD_DIR, filename)
-            file.save(file_path)
-            if filename.endswith(".zip"):
-                # Process the zip file and get its extracted file paths
-                extracted_files = file_processor.process_zip(file_path)
-                # Get the zip folder name (without .zip)
-                zip_folder_name = os.path.splitext(filename)[0]
-                for extracted_file in extracted_files:
-                    # Skip any file or folder whose basename starts with "._"
-                    if os.path.basename(extracted_file).startswith("._"):
-                        continue
-                    relative_path = os.path.relpath(extracted_file, Config.UPLOAD_DIR)
-                    parts = relative_path.split(os.sep)
-                    # Skip system folders like __MACOSX or any part starting with "._"
-                    if parts[0] == "__MACOSX" or parts[0].startswith("._"):
-                        continue
-                    # Remove redundant top-level folder if it matches the zip file name
-                    if parts[0] == zip_folder_name:
-                        parts = parts[1:]
-                        if not parts:
-                            continue
-                    # Build file tree structure
-                    if len(parts) == 1:
-                        file_tree["files"].append({
-                            "name": parts[0],
-                            "full_path": extracted_file
-                        })
-                    else:
-                        current_folder = file_tree
-                        for part in parts[:-1]:
-                            if part == "__MACOSX" or part.startswith("._"):
-                                continue
-                            folder_found = None
-                            for folder in current_folder.get("folders", []):
-                                if folder["name"] == part:
-                                    folder_found = folder
-                                    break
-                            if folder_found is None:
-                                new_folder = {"name": part, "files": [], "folders": []}
-                                current_folder.setdefault("folders", []).append(new_folder)
-                                current_folder = new_folder
-                            else:
-                                current_folder = folder_found
-                        current_folder.setdefault("files", []).append({
-                            "name": parts[-1],
-                            "full_path": extracted_file,
-                            "indent": len(parts) * 20
-                        })
-            else:
-                file_tree["files"].append({
-                    "name": filename,
-                    "full_path": file_path
-                })
-        return render_template("confirm.html", file_tree=file_tree)
+        # Process uploaded files into a fresh workspace
+        workspace_id, workspace_dir = workspace_service.create()
+        request.upload_dir = workspace_dir
+        ticket = None
+        try:
+            totals = {}
+            with timed("upload") as timing:
+                upload_paths, _ = collect_uploads(request.files.getlist("files"),
+                                                  workspace_dir, totals)
+                timing["bytes"] = request.content_length
+            # ZIPs are extracted in the request, so it may wait briefly for a slot
+            ticket = admission_service.acquire(
+                AdmissionService.is_heavy(totals["bytes"], totals["files"]),
+                wait=Config.HEAVY_JOB_WAIT)
+            # Index the selectable files once; the page loads folders on demand
+            budget = JobBudget(workspace_dir)
+            file_tree = None
+            for file_path in upload_paths:
+                filename = os.path.basename(file_path)
+                if filename.endswith(".zip"):
+                    extracted_files = file_processor.process_zip(file_path, workspace_dir)
+                    # Extracted ZIPs count against the disk budget
+                    budget.check(check_disk=True)
+                    # Paths are relative to the extracted folder, which drops a
+                    # redundant top-level folder named after the zip
+                    extracted_folder = os.path.join(workspace_dir, os.path.splitext(filename)[0])
+                    file_tree = file_processor.build_file_tree(extracted_files, extracted_folder,
+                                                               file_tree)
+                else:
+                    file_tree = file_processor.build_file_tree([file_path], workspace_dir,
+                                                               file_tree)
+        except UploadRejected as e:
+            flash(e.description)
+            return redirect(url_for('main.index'))
+        except JobLimitExceeded as e:
+            flash(str(e))
+            return redirect(url_for('main.index'))
+        except AdmissionRejected as e:
+            flash(f"{e} Retry in {e.retry_after} seconds.")
+            return redirect(url_for('main.index'))
+        finally:
+            admission_service.release(ticket)
+            # Selection is pending until /generate; let the reaper age it from now
+            workspace_service.release(workspace_id)
+        if file_tree is None:
+            file_tree = file_processor.build_file_tree([], workspace_dir)
+        file_processor.save_file_tree(file_tree, workspace_dir)
+        root_level = file_processor.tree_level(file_tree, "", limit=Config.TREE_PAGE_SIZE)
+        return render_template("confirm.html", root_level=root_level,
+                               workspace_id=workspace_id)
     return redirect(url_for('main.index'))
 
 @main_bp.route("/generate", methods=["POST"])
 def generate():
     try:
-        # Get selected files from confirmation page
-        selected_files = request.form.getlist("files")
+        # Get selected files from confirmation page, limited to its workspace
+        workspace_id = request.form.get("workspace")
+        workspace_dir = workspace_service.activate(workspace_id)
+        if workspace_dir is None:
+            raise ValueError("Upload expired. Please upload your files again.")
+        file_tree = file_processor.load_file_tree(workspace_dir)
+        if file_tree is not None:
+            # Checked folders stand for all files below them, loaded or not
+            selected_files = file_processor.select_tree_files(
+                file_tree, request.form.getlist("files"), request.form.getlist("folders"),
+                request.form.getlist("unchecked_files"),
+                request.form.getlist("unchecked_folders"))
+        else:
+            selected_files = request.form.getlist("files")
+        selected_files = [file_path for file_path in selected_files
+                          if is_safe_path(workspace_dir, file_path)]
         
         # Generate PDF with selected files
         settings = {
@@ -207,53 +306,93 @@ def generate():
             'orientation': request.form.get("orientation", "portrait"),
             'page_size': request.form.get("page_size", "letter"),
             'show_file_info': bool(request.form.get("show_file_info")),
-            'pdf_name': request.form.get("pdf_name", "UnifyDoc.pdf")
+            'pdf_name': request.form.get("pdf_name", "UnifyDoc.pdf"),
+            'save_profile': request.form.get("save_profile") or Config.PDF_SAVE_PROFILE,
+            'syntax_highlighting': bool(request.form.get("syntax_highlighting")),
+            'contents_page': bool(request.form.get("contents_page")),
+            'output_format': request.form.get("output_format") or "pdf"
         }
         
-        pdf_name = generate_pdf_with_settings(settings, selected_files, None)
+        input_bytes = sum(os.path.getsize(file_path) for file_path in selected_files
+                          if os.path.isfile(file_path))
+        try:
+            # This conversion runs in the request, so it may wait briefly for a slot
+            ticket = admission_service.acquire(
+                AdmissionService.is_heavy(input_bytes, len(selected_files)),
+                wait=Config.HEAVY_JOB_WAIT)
+        except AdmissionRejected as e:
+            workspace_service.release(workspace_id)
+            return busy_response(e)
+
+        try:
+            with tracing(workspace_id, trace_path(workspace_id)), \
+                    timed("conversion") as timing:
+                stats = {}
+                budget = JobBudget(workspace_dir)
+                output_name = generate_pdf_with_settings(settings, selected_files,
+                                                         workspace_dir, budget.progress(),
+                                                         stats=stats,
+                                                         cpu_callback=budget.charge_cpu)
+                timing["pages"] = stats.get("pages")
+        finally:
+            admission_service.release(ticket)
+            workspace_service.release(workspace_id)
         
         # Increment counter on success
         counter_service.increment()
         
-        return redirect(f"/?pdf_url=/download?pdf_name={pdf_name}&view_url=/view?pdf_name={pdf_name}")
+        pdf_url = url_for('main.download_pdf', workspace=workspace_id, pdf_name=output_name)
+        view_url = url_for('main.view_pdf', workspace=workspace_id, pdf_name=output_name)
+        return redirect(url_for('main.index', pdf_url=pdf_url, view_url=view_url))
         
     except Exception as e:
         flash(str(e))
         return redirect(url_for('main.index'))
 
-def generate_pdf_with_settings(settings, file_paths, conversion_id):
-    """Helper function to generate PDF with given settings."""
-    page_size_option = settings.get("page_size", "letter")
-    page_sizes = {
-        "letter": (612, 792),
-        "a4": (595, 842),
-        "legal": (612, 1008)
-    }
-    page_size = page_sizes.get(page_size_option, (612, 792))
-    
-    if settings.get("orientation") == "landscape":
-        page_size = (page_size[1], page_size[0])
-    
-    pdf_name_input = settings.get("pdf_name", "").strip()
-    if not pdf_name_input or pdf_name_input == "UnifyDoc.pdf":
-        pdf_name = f"UnifyDoc-{secrets.token_hex(8)}.pdf"
+def generate_pdf_with_settings(settings, file_paths, workspace_dir, progress_callback=None,
+                               content_hashes=None, stats=None, cpu_callback=None):
+    """
+    Helper function to generate PDF with given settings into a workspace.
+    settings["output_format"] picks the writer (see exporters.create_exporter).
+    progress_callback and cpu_callback are forwarded to its generate; content_hashes
+    (path -> SHA-256 computed while uploading) spares the render cache a re-read.
+    With Config.DETERMINISTIC_OUTPUT, a result already in the ResultStore is
+    reused instead of rendered.
+    If given, stats is updated with the generator's run statistics.
+    """
+    exporter = exporter_class(settings)
+    result_key = None
+    if Config.DETERMINISTIC_OUTPUT:
+        content_hashes = dict(content_hashes or {})
+        result_key = ResultStore.make_key(settings, file_paths, workspace_dir, content_hashes)
+
+    name_input = settings.get("pdf_name", "").strip()
+    if not name_input or name_input == "UnifyDoc.pdf":
+        # Content-addressed in deterministic mode: identical requests get the same name
+        name_token = result_key[:16] if result_key else secrets.token_hex(8)
+        output_name = f"UnifyDoc-{name_token}{exporter.extension}"
     else:
-        pdf_name = secure_filename(pdf_name_input)
+        output_name = secure_filename(name_input)
+        if exporter.extension != ".pdf":
+            output_name = os.path.splitext(output_name)[0] + exporter.extension
     
-    output_pdf_path = os.path.join(Config.UPLOAD_DIR, pdf_name)
-    
-    generator = PDFGenerator(
-        margin=settings.get("margin", 10),
-        header_note=settings.get("header_note", ""),
-        footer_note=settings.get("footer_note", ""),
-        orientation=settings.get("orientation", "portrait"),
-        page_size=page_size,
-        show_file_info=settings.get("show_file_info", False)
-    )
-    
-    # Check for cancellation before starting generation
-    if active_conversions.get(conversion_id, {}).get('status') == 'cancelled':
-        return None
-        
-    generator.generate(file_paths, output_pdf_path)
-    return pdf_name 
\ No newline at end of file
+    output_path = os.path.join(workspace_dir, output_name)
+    run_stats = None
+    if result_key:
+        run_stats = ResultStore().get(result_key, exporter.extension, output_path)
+        if run_stats is not None:
+            run_stats["reused"] = True
+            if progress_callback:
+                progress_callback(len(file_paths), run_stats.get("pages", 0))
+    if run_stats is None:
+        generator = create_exporter(settings, workspace_dir, content_hashes,
+                                    document_id=result_key and result_key[:32])
+        run_stats = generator.generate(file_paths, output_path, progress_callback,
+                                       cpu_callback=cpu_callback)
+        if result_key:
+            ResultStore().put(result_key, exporter.extension, output_path, run_stats)
+    # Content hash for ETags and the pre-compressed variant, ready before the first request
+    DeliveryService.prepare(output_path)
+    if stats is not None:
+        stats.update(run_stats)
+    return output_name 
\ No newline at end of file
@@ -0,0 +1,133 @@
+import itertools
+import math
+import time
+from threading import Condition, Lock
+from app.config.settings import Config
+from app.services.workspace_service import WorkspaceService
+
+class JobLimitExceeded(Exception):
+    """Raised by a JobBudget when a conversion uses more than it may."""
+
+class AdmissionRejected(Exception):
+    """Raised when a heavy job cannot start now; retry_after is in seconds."""
+
+    def __init__(self, retry_after):
+        super().__init__("The server is busy with other large conversions. "
+                         "Please try again shortly.")
+        self.retry_after = retry_after
+
+class JobBudget:
+    """
+    CPU time, page and disk limits of one conversion, checked from its
+    progress callback, i.e. after each input file. CPU time is that of the
+    thread running the conversion plus what the PDF_WORKERS process pool
+    spent on its files, as reported to charge_cpu.
+    """
+    DISK_CHECK_INTERVAL = 1.0  # Seconds between walks of the workspace
+
+    def __init__(self, workspace_dir, cpu_seconds=None, max_pages=None, disk_bytes=None):
+        self.workspace_dir = workspace_dir
+        self.cpu_seconds = Config.JOB_CPU_SECONDS if cpu_seconds is None else cpu_seconds
+        self.max_pages = Config.JOB_MAX_PAGES if max_pages is None else max_pages
+        self.disk_bytes = Config.JOB_DISK_BYTES if disk_bytes is None else disk_bytes
+        self._cpu_start = time.thread_time()
+        self._worker_cpu = 0.0
+        self._disk_checked_at = 0
+
+    def cpu_used(self):
+        """CPU seconds the conversion has used so far."""
+        return time.thread_time() - self._cpu_start + self._worker_cpu
+
+    def charge_cpu(self, seconds):
+        """Adds CPU time spent on the conversion in other processes."""
+        self._worker_cpu += seconds
+
+    def check(self, pages_done=0, check_disk=False):
+        """Raises JobLimitExceeded once any limit is exceeded."""
+        if self.max_pages and pages_done > self.max_pages:
+            raise JobLimitExceeded(f"Conversion exceeds the limit of {self.max_pages} pages.")
+        if self.cpu_seconds and self.cpu_used() > self.cpu_seconds:
+            raise JobLimitExceeded(
+                f"Conversion exceeds the limit of {self.cpu_seconds} seconds of CPU time.")
+        now = time.monotonic()
+        if self.disk_bytes and (check_disk or
+                                now - self._disk_checked_at >= self.DISK_CHECK_INTERVAL):
+            self._disk_checked_at = now
+            if WorkspaceService.dir_size(self.workspace_dir) > self.disk_bytes:
+                raise JobLimitExceeded("Conversion exceeds its disk space limit.")
+
+    def progress(self, callback=None):
+        """Progress callback that calls callback, then checks the budget."""
+        def progress_callback(files_done, pages_done):
+            if callback:
+                callback(files_done, pages_done)
+            self.check(pages_done)
+        return progress_callback
+
+class AdmissionService:
+    """
+    Caps the heavy conversions running at once in this process at
+    Config.MAX_HEAVY_JOBS, so a few large uploads cannot hold every job
+    worker. Light jobs are always admitted. Rejections carry a Retry-After
+    estimate from how long heavy jobs have been taking.
+    """
+    _instance = None
+    _lock = Lock()
+
+    def __new__(cls):
+        if cls._instance is None:
+            cls._instance = super(AdmissionService, cls).__new__(cls)
+            cls._instance._slots = Condition()
+            cls._instance._running = {}  # Start time of each running heavy job, by ticket
+            cls._instance._tickets = itertools.count(1)
+            # Moving average of heavy job durations
+            cls._instance._heavy_seconds = Config.HEAVY_JOB_SECONDS
+        return cls._instance
+
+    @staticmethod
+    def is_heavy(input_bytes, input_files):
+        """Whether a job with this much supported input counts as heavy."""
+        return input_bytes >= Config.HEAVY_JOB_BYTES or input_files >= Config.HEAVY_JOB_FILES
+
+    def acquire(self, heavy, wait=0):
+        """
+        Admits a job. Heavy jobs take a slot, waiting up to wait seconds for
+        one to free up, or raise AdmissionRejected. Returns the ticket to
+        hand to release() when the job ends (None for light jobs).
+        """
+        if not heavy:
+            return None
+        deadline = time.monotonic() + wait
+        with self._slots:
+            while len(self._running) >= Config.MAX_HEAVY_JOBS:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    raise AdmissionRejected(self._retry_after())
+                self._slots.wait(remaining)
+            ticket = next(self._tickets)
+            self._running[ticket] = time.monotonic()
+        return ticket
+
+    def release(self, ticket):
+        """Frees the slot of an admitted job, however it ended."""
+        if ticket is None:
+            return
+        with self._slots:
+            started = self._running.pop(ticket, None)
+            if started is not None:
+                self._heavy_seconds = (0.7 * self._heavy_seconds +
+                                       0.3 * (time.monotonic() - started))
+                self._slots.notify()
+
+    def _retry_after(self):
+        # Seconds until the oldest running heavy job is expected to finish
+        now = time.monotonic()
+        soonest = min((started + self._heavy_seconds - now
+                       for started in self._running.values()), default=0)
+        return max(1, math.ceil(soonest))
+
+    def get_stats(self):
+        with self._slots:
+            return {"heavy_running": len(self._running),
+                    "heavy_limit": Config.MAX_HEAVY_JOBS,
+                    "heavy_seconds": round(self._heavy_seconds, 1)}
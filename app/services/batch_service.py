@@ -0,0 +1,227 @@
+import glob
+import hashlib
+import json
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from app.config.settings import Config
+from app.services.exporters import exporter_class, create_exporter
+from app.services.file_processor import FileProcessor
+from app.services.pdf_generator import RENDER_VERSION
+from app.services.render_cache import RenderCache
+
+class Project:
+    """
+    One output of a batch run: a directory, a ZIP or a set of loose files.
+    sources are the files on disk the output depends on (the ZIP itself for
+    a ZIP project); paths in the output are shown relative to base_dir.
+    """
+
+    def __init__(self, name, kind, base_dir, sources):
+        self.name = name
+        self.kind = kind  # "directory", "zip" or "files"
+        self.base_dir = base_dir
+        self.sources = sources
+
+    def file_paths(self):
+        if self.kind == "zip":
+            # Members are read from the archive in place, never extracted
+            return FileProcessor.iter_zip(self.sources[0], self.base_dir)
+        return self.sources
+
+class BatchConverter:
+    """
+    Converts many projects in one run, outside the web app: one output per
+    project in output_dir, rendered across a pool of worker processes.
+    A state file in output_dir records each output file's settings and the size,
+    mtime and hash of its inputs, so unchanged projects are not converted again.
+    """
+    STATE_FILE = ".unifydoc-state.json"
+
+    def __init__(self, settings, output_dir, jobs=None, force=False):
+        self.settings = settings
+        self.output_dir = output_dir
+        self.jobs = max(1, jobs or os.cpu_count() or 1)
+        self.force = force
+        self.extension = exporter_class(settings).extension
+        # Outputs are only reused when made with the same settings and renderer
+        self.settings_key = json.dumps([settings, RENDER_VERSION], sort_keys=True)
+        self.state_path = os.path.join(output_dir, self.STATE_FILE)
+
+    @staticmethod
+    def _walk(directory):
+        """Supported files below directory, skipping hidden folders such as .git."""
+        file_paths = []
+        for root, dirs, files in os.walk(directory):
+            dirs[:] = [name for name in dirs if not name.startswith(".")]
+            file_paths.extend(os.path.join(root, name) for name in files
+                              if FileProcessor.is_supported_file(os.path.join(root, name)))
+        return sorted(file_paths)
+
+    @staticmethod
+    def find_projects(inputs, files_name="files"):
+        """
+        Projects for the command-line inputs: directories, ZIPs or files,
+        each possibly a glob pattern. Every directory and ZIP is a project of
+        its own; loose files are converted together as one project named
+        files_name. Raises ValueError for an input that matches nothing.
+        """
+        projects = []
+        loose_files = []
+        for pattern in inputs:
+            if any(char in pattern for char in "*?["):
+                matches = sorted(glob.glob(pattern, recursive=True))
+            else:
+                matches = [pattern] if os.path.exists(pattern) else []
+            if not matches:
+                raise ValueError(f"No such file or directory: {pattern}")
+            for path in map(os.path.abspath, matches):
+                if os.path.isdir(path):
+                    projects.append(Project(os.path.basename(path), "directory",
+                                            os.path.dirname(path), BatchConverter._walk(path)))
+                elif path.lower().endswith(".zip"):
+                    projects.append(Project(os.path.splitext(os.path.basename(path))[0], "zip",
+                                            os.path.dirname(path), [path]))
+                elif FileProcessor.is_supported_file(path) and path not in loose_files:
+                    loose_files.append(path)
+        if loose_files:
+            base_dir = os.path.commonpath([os.path.dirname(path) for path in loose_files])
+            projects.append(Project(files_name, "files", base_dir, loose_files))
+
+        # Projects with the same name get numbered outputs
+        seen = {}
+        for project in projects:
+            count = seen[project.name] = seen.get(project.name, 0) + 1
+            if count > 1:
+                project.name = f"{project.name}-{count}"
+        return projects
+
+    def _load_state(self):
+        try:
+            with open(self.state_path) as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {}
+
+    def _save_state(self, state):
+        temp_path = self.state_path + ".tmp"
+        with open(temp_path, "w") as f:
+            json.dump(state, f, indent=1, sort_keys=True)
+        os.replace(temp_path, self.state_path)
+
+    @staticmethod
+    def _fingerprint(project, previous):
+        """
+        {path: [size, mtime_ns, sha256]} of a project's sources. Files whose
+        size and mtime match the previous run reuse its hash; the rest are hashed.
+        """
+        inputs = {}
+        for path in project.sources:
+            stat = os.stat(path)
+            known = previous.get(path)
+            if known and known[:2] == [stat.st_size, stat.st_mtime_ns]:
+                inputs[path] = known
+            else:
+                inputs[path] = [stat.st_size, stat.st_mtime_ns, RenderCache.hash_file(path)]
+        return inputs
+
+    def run(self, projects, report=None):
+        """
+        Converts the projects whose inputs or settings changed since the last
+        run. report, if given, is called with each project's result dict
+        (name, status "converted", "unchanged" or "failed", output and, once
+        converted, pages and seconds, or error). Returns the results.
+        """
+        os.makedirs(self.output_dir, exist_ok=True)
+        state = self._load_state()
+        results = []
+        pending = []
+        for project in projects:
+            output_name = project.name + self.extension
+            output_path = os.path.join(self.output_dir, output_name)
+            previous = state.get(output_name) or {}
+            inputs = self._fingerprint(project, previous.get("inputs") or {})
+            hashes = {path: entry[2] for path, entry in inputs.items()}
+            unchanged = (not self.force and os.path.exists(output_path) and
+                         previous.get("settings") == self.settings_key and
+                         {path: entry[2] for path, entry in
+                          (previous.get("inputs") or {}).items()} == hashes)
+            entry = {"settings": self.settings_key, "inputs": inputs}
+            if unchanged:
+                # Refreshed mtimes spare the next run from hashing again
+                state[output_name] = entry
+                result = {"name": project.name, "status": "unchanged", "output": output_path}
+                results.append(result)
+                if report:
+                    report(result)
+            else:
+                content_hashes = None if project.kind == "zip" else hashes
+                document_id = None
+                if Config.DETERMINISTIC_OUTPUT:
+                    # From the settings and relative inputs, so it is the same on any machine
+                    inputs_key = sorted([os.path.relpath(path, project.base_dir), file_hash]
+                                        for path, file_hash in hashes.items())
+                    document_id = hashlib.sha256(json.dumps(
+                        [self.settings_key, inputs_key]).encode()).hexdigest()[:32]
+                pending.append((project, output_path, content_hashes, document_id, entry))
+
+        def finished(project, output_path, entry, outcome):
+            result = {"name": project.name, "output": output_path}
+            if isinstance(outcome, Exception):
+                result.update(status="failed", error=str(outcome))
+            else:
+                result.update(status="converted", pages=outcome["pages"],
+                              seconds=outcome["seconds"])
+                state[os.path.basename(output_path)] = entry
+            results.append(result)
+            if report:
+                report(result)
+
+        try:
+            if len(pending) <= 1 or self.jobs == 1:
+                # A single project uses the workers to render its own files in parallel
+                workers = self.jobs if len(pending) == 1 else 1
+                for project, output_path, content_hashes, document_id, entry in pending:
+                    try:
+                        outcome = _convert_project(project, self.settings, output_path,
+                                                   content_hashes, document_id, workers)
+                    except Exception as e:
+                        outcome = e
+                    finished(project, output_path, entry, outcome)
+            else:
+                with ProcessPoolExecutor(max_workers=min(self.jobs, len(pending))) as pool:
+                    futures = {pool.submit(_convert_project, project, self.settings,
+                                           output_path, content_hashes, document_id): (
+                                               project, output_path, entry)
+                               for project, output_path, content_hashes, document_id, entry
+                               in pending}
+                    for future in as_completed(futures):
+                        try:
+                            outcome = future.result()
+                        except Exception as e:
+                            outcome = e
+                        finished(*futures[future], outcome)
+        finally:
+            self._save_state(state)
+        return results
+
+def _convert_project(project, settings, output_path, content_hashes=None, document_id=None,
+                     workers=1):
+    """
+    Converts one project into output_path, written under a temporary name
+    first so an existing output stays intact if the conversion fails.
+    Returns the exporter's statistics plus the seconds taken.
+    """
+    start = time.perf_counter()
+    exporter = create_exporter(settings, project.base_dir, content_hashes, workers,
+                               document_id)
+    partial_path = output_path + ".partial"
+    try:
+        stats = exporter.generate(project.file_paths(), partial_path)
+        os.replace(partial_path, output_path)
+    finally:
+        if os.path.exists(partial_path):
+            os.remove(partial_path)
+        if project.kind == "zip":
+            FileProcessor.close_zip(project.sources[0])
+    return dict(stats, seconds=round(time.perf_counter() - start, 3))
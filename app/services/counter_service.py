@@ -1,58 +1,133 @@
+import atexit
 import json
 import os
-from threading import Lock
+import time
+from threading import Lock, Thread
+from app.config.settings import Config
+
+try:
+    import fcntl
+except ImportError:  # Windows: single-process deployments only
+    fcntl = None
 
 class CounterService:
+    """
+    Conversion counter shared by every worker process through counter.json.
+    Increments are kept in memory and merged into the file by a background
+    flush every Config.COUNTER_FLUSH_INTERVAL seconds, under an exclusive
+    fcntl lock on counter.json.lock beside it so concurrent processes add
+    up instead of overwriting each other. Reads return the cached total and never touch the disk.
+    """
     _instance = None
     _lock = Lock()
     ENV_VAR_NAME = 'PDF_CONVERSION_COUNT'
-    
+
     def __new__(cls):
         if cls._instance is None:
             cls._instance = super(CounterService, cls).__new__(cls)
-            cls._instance._counter_file = 'counter.json'
-            # Initialize from environment or file
+            cls._instance._counter_file = os.path.abspath(Config.COUNTER_FILE)
+            cls._instance._stored = 0  # Total in the file as of the last flush
+            cls._instance._pending = 0  # Local increments not yet flushed
+            cls._instance._flusher_pid = None
             cls._instance._initialize_counter()
+            atexit.register(cls._instance._flush_at_exit)
         return cls._instance
-    
+
     def _initialize_counter(self):
-        """Initialize counter from environment or file."""
-        try:
-            # Try to get count from environment first
-            count = int(os.environ.get(self.ENV_VAR_NAME, -1))
-            if count < 0:
-                # If not in environment, try to get from file
-                with open(self._counter_file, 'r') as f:
-                    count = json.load(f)["converted_pdf_count"]
-                # Store in environment for future use
-                os.environ[self.ENV_VAR_NAME] = str(count)
-        except (FileNotFoundError, json.JSONDecodeError, KeyError, ValueError):
-            # Initialize counter if no valid count found
-            count = 0
-            os.environ[self.ENV_VAR_NAME] = str(count)
-            self.save_counter(count)
-    
-    def load_counter(self):
-        """Load the current counter value."""
+        """Reads the stored total, seeding a missing file from the environment."""
+        with self._file_lock():
+            count = self._read_file()
+            if count is None:
+                try:
+                    count = max(0, int(os.environ.get(self.ENV_VAR_NAME, 0)))
+                except ValueError:
+                    count = 0
+                self._write_file(count)
+        self._stored = count
+
+    def _file_lock(self):
+        return _FileLock(f"{self._counter_file}.lock")
+
+    def _read_file(self):
         try:
-            return int(os.environ.get(self.ENV_VAR_NAME, 0))
-        except ValueError:
-            return 0
-    
-    def save_counter(self, count):
-        """Save the counter value to both environment and file."""
-        os.environ[self.ENV_VAR_NAME] = str(count)
-        # Also save to file as backup
-        with open(self._counter_file, 'w') as f:
+            with open(self._counter_file, 'r') as f:
+                return int(json.load(f)["converted_pdf_count"])
+        except (FileNotFoundError, json.JSONDecodeError, KeyError, ValueError, TypeError):
+            return None
+
+    def _write_file(self, count):
+        tmp_path = f"{self._counter_file}.{os.getpid()}.tmp"
+        with open(tmp_path, 'w') as f:
             json.dump({"converted_pdf_count": count}, f)
-    
+        os.replace(tmp_path, self._counter_file)
+
+    def flush(self):
+        """
+        Adds this process's pending increments to the file and picks up
+        those flushed by other processes.
+        """
+        pending = self._pending
+        try:
+            with self._file_lock():
+                count = (self._read_file() or 0) + pending
+                if pending:
+                    self._write_file(count)
+        except OSError as e:
+            print(f"Failed to flush conversion counter. Reason: {e}")
+            return
+        with self._lock:
+            # Increments made while flushing stay pending for the next flush
+            self._pending -= pending
+            self._stored = count
+
+    def _flush_at_exit(self):
+        if self._pending:
+            self.flush()
+
+    def _flush_forever(self):
+        while True:
+            time.sleep(Config.COUNTER_FLUSH_INTERVAL)
+            self.flush()
+
+    def _ensure_flusher(self):
+        """Starts the flush thread once per process, including forked workers."""
+        if self._flusher_pid == os.getpid():
+            return
+        with self._lock:
+            if self._flusher_pid != os.getpid():
+                if self._flusher_pid is not None:
+                    # Forked child: the parent flushes the counts it inherited
+                    self._pending = 0
+                self._flusher_pid = os.getpid()
+                Thread(target=self._flush_forever, name="counter-flush",
+                       daemon=True).start()
+
     def increment(self):
-        """Thread-safe increment of the counter."""
+        """Counts one conversion; written to disk by the next flush."""
+        self._ensure_flusher()
         with self._lock:
-            count = self.load_counter() + 1
-            self.save_counter(count)
-            return count
-    
+            self._pending += 1
+            return self._stored + self._pending
+
     def get_count(self):
         """Get the current counter value."""
-        return self.load_counter() 
\ No newline at end of file
+        self._ensure_flusher()
+        return self._stored + self._pending
+
+class _FileLock:
+    """Exclusive fcntl lock on a side file, held for the duration of a with block."""
+
+    def __init__(self, path):
+        self.path = path
+        self._file = None
+
+    def __enter__(self):
+        self._file = open(self.path, 'a')
+        if fcntl is not None:
+            fcntl.flock(self._file.fileno(), fcntl.LOCK_EX)
+        return self
+
+    def __exit__(self, *exc_info):
+        if fcntl is not None:
+            fcntl.flock(self._file.fileno(), fcntl.LOCK_UN)
+        self._file.close()
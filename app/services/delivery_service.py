@@ -0,0 +1,140 @@
+import gzip
+import hashlib
+import mimetypes
+import os
+import shutil
+from flask import Response, request, send_file
+from app.config.settings import Config
+from app.services.metrics import timed
+
+class DeliveryService:
+    """
+    Serves generated PDFs with strong content ETags, conditional and Range
+    requests, optional pre-compressed variants and optional X-Sendfile /
+    X-Accel-Redirect offload to the front-end server.
+    """
+    HASH_SUFFIX = ".sha256"
+    GZIP_SUFFIX = ".gz"
+
+    @staticmethod
+    def _hash_file(path):
+        digest = hashlib.sha256()
+        with open(path, "rb") as f:
+            for chunk in iter(lambda: f.read(1024 * 1024), b""):
+                digest.update(chunk)
+        return digest.hexdigest()
+
+    @staticmethod
+    def prepare(path):
+        """
+        Called once a PDF is written: records its content hash in a sidecar
+        file and, if enabled, writes its gzip variant.
+        """
+        with timed("delivery_prepare") as timing:
+            timing["bytes"] = os.path.getsize(path)
+            content_hash = DeliveryService._hash_file(path)
+            with open(path + DeliveryService.HASH_SUFFIX, "w") as f:
+                f.write(content_hash)
+            if Config.PRECOMPRESS_OUTPUTS:
+                with open(path, "rb") as source, \
+                        gzip.open(path + DeliveryService.GZIP_SUFFIX, "wb",
+                                  compresslevel=6) as target:
+                    shutil.copyfileobj(source, target, 1024 * 1024)
+        return content_hash
+
+    @staticmethod
+    def discard(path):
+        """Removes a PDF along with the sidecar files prepare() wrote for it."""
+        for discarded_path in (path, path + DeliveryService.HASH_SUFFIX,
+                               path + DeliveryService.GZIP_SUFFIX):
+            try:
+                os.remove(discarded_path)
+            except FileNotFoundError:
+                pass
+
+    @staticmethod
+    def etag(path):
+        """Content hash of a PDF from its sidecar, recomputed if missing or stale."""
+        sidecar = path + DeliveryService.HASH_SUFFIX
+        try:
+            if os.path.getmtime(sidecar) >= os.path.getmtime(path):
+                with open(sidecar) as f:
+                    content_hash = f.read().strip()
+                if content_hash:
+                    return content_hash
+        except OSError:
+            pass
+        return DeliveryService.prepare(path)
+
+    @staticmethod
+    def _gzip_variant(path):
+        """The pre-compressed variant to serve for this request, or None."""
+        if not Config.PRECOMPRESS_OUTPUTS or request.range is not None:
+            return None
+        if "gzip" not in request.accept_encodings:
+            return None
+        gzip_path = path + DeliveryService.GZIP_SUFFIX
+        try:
+            if os.path.getmtime(gzip_path) >= os.path.getmtime(path):
+                return gzip_path
+        except OSError:
+            pass
+        return None
+
+    @staticmethod
+    def _mimetype(path):
+        return mimetypes.guess_type(path)[0] or "application/octet-stream"
+
+    @staticmethod
+    def _offload(served_path, mimetype, as_attachment, download_name):
+        """Response whose body the front-end server sends from served_path."""
+        response = Response(mimetype=mimetype)
+        if Config.X_ACCEL_REDIRECT_PREFIX:
+            relative_path = os.path.relpath(served_path, Config.WORKSPACE_ROOT)
+            response.headers["X-Accel-Redirect"] = (
+                Config.X_ACCEL_REDIRECT_PREFIX.rstrip("/") + "/" +
+                relative_path.replace(os.sep, "/"))
+        else:
+            response.headers["X-Sendfile"] = served_path
+        response.headers.set("Content-Disposition",
+                             "attachment" if as_attachment else "inline",
+                             filename=download_name)
+        response.last_modified = os.path.getmtime(served_path)
+        return response
+
+    @staticmethod
+    def send(path, as_attachment=False, download_name=None):
+        """Response for GET/HEAD of a generated PDF (or other export format)."""
+        download_name = download_name or os.path.basename(path)
+        mimetype = DeliveryService._mimetype(path)
+        etag = DeliveryService.etag(path)
+        served_path = DeliveryService._gzip_variant(path) or path
+        if served_path != path:
+            etag += "-gzip"
+
+        if Config.X_ACCEL_REDIRECT_PREFIX or Config.USE_X_SENDFILE:
+            response = DeliveryService._offload(served_path, mimetype, as_attachment,
+                                                download_name)
+            response.set_etag(etag)
+            # The front-end server answers Range requests itself
+            response = response.make_conditional(request)
+            if response.status_code == 304:
+                response.headers.pop("X-Accel-Redirect", None)
+                response.headers.pop("X-Sendfile", None)
+        else:
+            response = send_file(served_path, mimetype=mimetype,
+                                 as_attachment=as_attachment, download_name=download_name,
+                                 etag=etag, conditional=True)
+
+        if served_path != path:
+            response.content_encoding = "gzip"
+        if mimetype == "text/html":
+            # Exported HTML is shown inline from our origin: no scripts or external loads
+            response.headers["Content-Security-Policy"] = (
+                "default-src 'none'; img-src data:; style-src 'unsafe-inline'")
+        if Config.PRECOMPRESS_OUTPUTS:
+            response.vary.add("Accept-Encoding")
+        # Cacheable by the browser only, revalidated against the ETag on every use
+        response.cache_control.no_cache = True
+        response.cache_control.private = True
+        return response
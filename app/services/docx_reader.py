@@ -0,0 +1,79 @@
+import io
+import zipfile
+from lxml import etree
+from app.services.file_processor import FileProcessor, ZipMember
+
+W = "{http://schemas.openxmlformats.org/wordprocessingml/2006/main}"
+DOCUMENT_PART = "word/document.xml"
+# Run content and its text equivalent, as python-docx renders it
+RUN_TEXT = {f"{W}tab": "\t", f"{W}ptab": "\t", f"{W}cr": "\n", f"{W}noBreakHyphen": "-"}
+CELL_SEPARATOR = " | "
+
+def _open_docx(file_path):
+    if isinstance(file_path, ZipMember):
+        # A docx inside an uploaded ZIP needs random access; only its
+        # compressed bytes are held in memory
+        return zipfile.ZipFile(io.BytesIO(FileProcessor.read_bytes(file_path)))
+    return zipfile.ZipFile(file_path)
+
+def iter_docx_lines(file_path):
+    """
+    Yields the text lines of a .docx file while streaming word/document.xml,
+    without building the document tree. Paragraphs become lines (split at
+    line breaks) and each table row becomes one line of its cells' text
+    joined by CELL_SEPARATOR.
+    """
+    tags = [f"{W}{name}" for name in ("p", "t", "br", "tbl", "tc", "tr", "body")]
+    tags.extend(RUN_TEXT)
+    with _open_docx(file_path) as archive, archive.open(DOCUMENT_PART) as part:
+        paragraphs = []  # Text buffers of the open paragraphs, innermost last
+        rows = []  # Cell texts of the open table rows, innermost last
+        cells = []  # Paragraph texts of the open table cells, innermost last
+        for event, elem in etree.iterparse(part, events=("start", "end"), tag=tags):
+            tag = elem.tag
+            if event == "start":
+                if tag == f"{W}p":
+                    paragraphs.append([])
+                elif tag == f"{W}tr":
+                    rows.append([])
+                elif tag == f"{W}tc":
+                    cells.append([])
+                continue
+
+            if tag == f"{W}t":
+                if paragraphs and elem.text:
+                    paragraphs[-1].append(elem.text)
+            elif tag in RUN_TEXT or tag == f"{W}br":
+                # Only run content counts; w:tab also defines tab stops in w:pPr
+                parent = elem.getparent()
+                if paragraphs and parent is not None and parent.tag == f"{W}r":
+                    if tag != f"{W}br":
+                        paragraphs[-1].append(RUN_TEXT[tag])
+                    elif elem.get(f"{W}type", "textWrapping") == "textWrapping":
+                        paragraphs[-1].append("\n")
+            elif tag == f"{W}p":
+                text = "".join(paragraphs.pop())
+                if cells:
+                    cells[-1].append(text.replace("\n", " "))
+                else:
+                    yield from text.split("\n")
+            elif tag == f"{W}tc":
+                text = " ".join(cells.pop())
+                if rows:
+                    rows[-1].append(text)
+            elif tag == f"{W}tr":
+                text = CELL_SEPARATOR.join(rows.pop())
+                if cells:
+                    cells[-1].append(text)
+                else:
+                    yield text
+            elif tag == f"{W}body":
+                break
+
+            if tag in (f"{W}p", f"{W}tbl"):
+                # Their text is taken; drop them so memory stays bounded
+                elem.clear()
+                parent = elem.getparent()
+                if parent is not None and parent.tag == f"{W}body":
+                    while elem.getprevious() is not None:
+                        del parent[0]
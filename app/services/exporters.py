@@ -0,0 +1,241 @@
+import base64
+import html
+from abc import ABCMeta, abstractmethod
+import mimetypes
+import os
+import re
+import shutil
+import time
+from app.config.settings import Config
+from app.services.file_processor import FileProcessor
+from app.services.metrics import timed
+from app.services.page_layout import PageLayout
+from app.services.syntax_highlighter import STYLE_COLORS, PLAIN
+from app.services.pdf_generator import PDFGenerator
+from app.services.render_cache import RenderCache
+
+class PagedExporter(PageLayout, metaclass=ABCMeta):
+    """
+    Writes the pages of PageLayout.file_pages to a file without a PDF engine.
+    Pages are streamed to the output as they are laid out; a table of
+    contents, which needs every page number, is written to the front
+    afterwards by copying the finished body behind it.
+    Subclasses write the pages in their format: the output is write_start,
+    write_contents (only with a contents page), each write_page, write_end.
+    """
+    extension = None
+
+    def __init__(self, **settings):
+        # PDF-only settings (workers, cache, save profile, ...) do not apply
+        layout_settings = ("margin", "header_note", "footer_note", "orientation", "page_size",
+                           "show_file_info", "base_dir", "content_hashes",
+                           "syntax_highlighting", "contents_page", "page_budget")
+        super().__init__(**{key: value for key, value in settings.items()
+                            if key in layout_settings})
+
+    def write_start(self, f):
+        """Writes what precedes the contents and pages, if anything."""
+
+    @abstractmethod
+    def write_page(self, f, page, page_number):
+        """Writes one page from PageLayout.file_pages, numbered from 1."""
+
+    @abstractmethod
+    def write_contents(self, f):
+        """Writes the contents page from PageLayout.contents."""
+
+    def write_end(self, f):
+        """Writes what follows the last page, if anything."""
+
+    def generate(self, file_paths, output_path, progress_callback=None, manifest=None,
+                 cpu_callback=None):
+        """
+        Exports the provided file paths to output_path, with the same
+        progress_callback and manifest arguments and statistics as
+        PDFGenerator.generate. Pages are laid out in the calling thread, so
+        cpu_callback is never called.
+        """
+        estimated_pages = self.prepare(file_paths, manifest)
+        body_path = output_path + ".body"
+        page_count = 0
+        try:
+            with timed("export") as timing, \
+                    open(body_path, "w", encoding="utf-8", newline="\n") as body:
+                for files_done, file_path in enumerate(file_paths, start=1):
+                    start_page = page_count
+                    try:
+                        for page in self.file_pages(file_path):
+                            page_count += 1
+                            self.write_page(body, page, page_count)
+                    except Exception as e:
+                        print(f"Error processing {file_path}: {e}")
+                    self._add_file_toc(file_path, start_page, page_count)
+                    if progress_callback:
+                        progress_callback(files_done, page_count)
+                timing["pages"] = page_count
+
+            save_start = time.perf_counter()
+            with open(output_path, "w", encoding="utf-8", newline="\n") as f, \
+                    open(body_path, encoding="utf-8") as body:
+                self.write_start(f)
+                if self.contents_page and self.contents:
+                    self.write_contents(f)
+                shutil.copyfileobj(body, f, 1024 * 1024)
+                self.write_end(f)
+            save_seconds = time.perf_counter() - save_start
+        except BaseException:
+            if os.path.exists(output_path):
+                os.remove(output_path)
+            raise
+        finally:
+            if os.path.exists(body_path):
+                os.remove(body_path)
+
+        self.stats = {
+            "pages": page_count,
+            "output_bytes": os.path.getsize(output_path),
+            "save_seconds": round(save_seconds, 4),
+            "estimated_pages": estimated_pages,
+            "skipped_files": self.skipped_files(file_paths)
+        }
+        return self.stats
+
+class TextExporter(PagedExporter):
+    """Merged plain-text bundle: the pages separated by form feeds."""
+    extension = ".txt"
+
+    def write_page(self, f, page, page_number):
+        if page_number > 1:
+            f.write("\f\n")
+        for _, text in page["header"]:
+            f.write(text + "\n\n")
+        if page["kind"] != "text":
+            f.write(f"[{page['kind'].upper()}: {page['relative_path']}]\n")
+        elif page["styled"]:
+            f.writelines(line + "\n" for line, _ in page["lines"])
+        else:
+            f.writelines(line + "\n" for line in page["lines"])
+        if self.footer_note:
+            f.write("\n" + self.footer_note + "\n")
+
+    def write_contents(self, f):
+        f.write("Contents\n\n")
+        f.writelines(self.contents_line(level, title, str(page)) + "\n"
+                     for level, title, page in self.contents)
+        f.write("\f\n")
+
+class HTMLExporter(PagedExporter):
+    """
+    Single self-contained, searchable HTML file: one section per page,
+    syntax highlighting as styled spans and images embedded as data URIs.
+    """
+    extension = ".html"
+
+    STYLE = """
+body { font-family: monospace; margin: 0 auto; max-width: 100ch; }
+section.page { padding: 1em 0; border-bottom: 1px solid #ccc; page-break-after: always; }
+header p { font-weight: bold; margin: 0 0 1em; }
+pre { margin: 0; white-space: pre-wrap; }
+footer { font-style: italic; margin-top: 1em; }
+nav ol { list-style: none; padding: 0; }
+img { max-width: 50%; display: block; margin: 0 auto; }
+""" + "".join(f".{style} {{ color: rgb({', '.join(str(round(c * 255)) for c in color)}); }}\n"
+              for style, color in STYLE_COLORS.items() if style != PLAIN)
+
+    _RUN = re.compile(r"(.)\1*", re.S)
+
+    def write_start(self, f):
+        f.write('<!DOCTYPE html>\n<html>\n<head>\n<meta charset="utf-8">\n'
+                f"<style>{self.STYLE}</style>\n</head>\n<body>\n")
+
+    def _styled_line(self, line, styles):
+        parts = []
+        for match in self._RUN.finditer(styles):
+            style = match.group(1)
+            text = html.escape(line[match.start():match.end()], quote=False)
+            parts.append(text if style == PLAIN else f'<span class="{style}">{text}</span>')
+        return "".join(parts)
+
+    def write_page(self, f, page, page_number):
+        f.write(f'<section class="page" id="page-{page_number}">\n<header>\n')
+        for role, text in page["header"]:
+            f.write(f'<p class="{role}">{html.escape(text)}</p>\n')
+        f.write("</header>\n")
+        if page["kind"] == "image":
+            data = FileProcessor.read_bytes(page["file_path"])
+            mimetype = mimetypes.guess_type(page["file_name"])[0] or "image/png"
+            f.write(f'<img alt="{html.escape(page["file_name"])}" src="data:{mimetype};base64,'
+                    f'{base64.b64encode(data).decode("ascii")}">\n')
+        elif page["kind"] == "pdf":
+            f.write(f"<p>[PDF: {html.escape(page['relative_path'])}]</p>\n")
+        elif page["styled"]:
+            f.write("<pre>" + "\n".join(self._styled_line(line, styles)
+                                        for line, styles in page["lines"]) + "</pre>\n")
+        else:
+            f.write("<pre>" + html.escape("\n".join(page["lines"]), quote=False) + "</pre>\n")
+        if self.footer_note:
+            f.write(f"<footer>{html.escape(self.footer_note)}</footer>\n")
+        f.write("</section>\n")
+
+    def write_contents(self, f):
+        f.write("<nav>\n<h1>Contents</h1>\n<ol>\n")
+        for level, title, page in self.contents:
+            f.write(f'<li style="margin-left: {2 * (level - 1)}ch">'
+                    f'<a href="#page-{page}">{html.escape(title)}</a> {page}</li>\n')
+        f.write("</ol>\n</nav>\n")
+
+    def write_end(self, f):
+        f.write("</body>\n</html>\n")
+
+# Writer for each output_format setting
+EXPORTERS = {
+    "pdf": PDFGenerator,
+    "html": HTMLExporter,
+    "txt": TextExporter,
+}
+
+PAGE_SIZES = {
+    "letter": (612, 792),
+    "a4": (595, 842),
+    "legal": (612, 1008)
+}
+
+def exporter_class(settings):
+    """The EXPORTERS writer of settings["output_format"] ("pdf" by default)."""
+    exporter = EXPORTERS.get(settings.get("output_format") or "pdf")
+    if exporter is None:
+        raise ValueError(f"Unknown output format: {settings.get('output_format')}")
+    return exporter
+
+def create_exporter(settings, base_dir, content_hashes=None, workers=None, document_id=None):
+    """
+    Writer for a conversion with the upload form's settings (margin,
+    page_size, orientation, notes, ...), showing paths relative to base_dir.
+    document_id fixes the ID of PDF output; other formats have none.
+    """
+    page_size = PAGE_SIZES.get(settings.get("page_size", "letter"), (612, 792))
+    if settings.get("orientation") == "landscape":
+        page_size = (page_size[1], page_size[0])
+
+    exporter = exporter_class(settings)
+    options = {}
+    if exporter is PDFGenerator:
+        options = {
+            "workers": workers,
+            "cache": RenderCache() if Config.RENDER_CACHE_ENABLED else None,
+            "save_profile": settings.get("save_profile"),
+            "document_id": document_id
+        }
+    return exporter(
+        margin=settings.get("margin", 10),
+        header_note=settings.get("header_note", ""),
+        footer_note=settings.get("footer_note", ""),
+        orientation=settings.get("orientation", "portrait"),
+        page_size=page_size,
+        show_file_info=settings.get("show_file_info", False),
+        base_dir=base_dir,
+        content_hashes=content_hashes,
+        syntax_highlighting=settings.get("syntax_highlighting", False),
+        contents_page=settings.get("contents_page", False),
+        **options
+    )
@@ -1,80 +1,378 @@
+import codecs
+import json
+import math
 import os
 import zipfile
+from collections import OrderedDict
+from threading import Lock
 from app.config.settings import Config
 from app.utils.security import is_safe_path
+from app.services.metrics import timed
+from app.services.workspace_service import WorkspaceService
+
+class ZipMember(str):
+    """
+    Path-like string naming a member inside a ZIP archive.
+    Its value is the path the member would have if extracted, so name and
+    relative-path handling work unchanged, while the bytes are read straight
+    from the archive.
+    """
+
+    def __new__(cls, path, zip_path, member_name):
+        member = super(ZipMember, cls).__new__(cls, path)
+        member.zip_path = zip_path
+        member.member_name = member_name
+        return member
+
+    def __reduce__(self):
+        return (ZipMember, (str(self), self.zip_path, self.member_name))
+
+class _ArchiveCache:
+    """Keeps a few ZIP archives open so members can be read without
+    re-parsing the central directory for every file."""
+
+    def __init__(self, max_open=8):
+        self._archives = OrderedDict()
+        self._max_open = max_open
+        self._lock = Lock()
+
+    def _after_fork(self):
+        # A forked child shares its parent's descriptors and file offsets, so
+        # reading through inherited handles races with the parent; it opens
+        # its own instead. The lock may have been held by another thread.
+        self._archives = OrderedDict()
+        self._lock = Lock()
+
+    def get(self, zip_path):
+        with self._lock:
+            archive = self._archives.pop(zip_path, None)
+            if archive is None:
+                archive = zipfile.ZipFile(zip_path, "r")
+            self._archives[zip_path] = archive
+            while len(self._archives) > self._max_open:
+                _, evicted = self._archives.popitem(last=False)
+                evicted.close()
+            return archive
+
+    def close(self, zip_path):
+        with self._lock:
+            archive = self._archives.pop(zip_path, None)
+        if archive is not None:
+            archive.close()
+
+_archive_cache = _ArchiveCache()
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=_archive_cache._after_fork)
+
+# Parsed confirmation file trees by (path, mtime), most recent last
+_tree_cache = OrderedDict()
+_tree_cache_lock = Lock()
 
 class FileProcessor:
     @staticmethod
-    def process_zip(zip_path):
+    def is_supported_file(file_path):
+        """
+        Whether a file is a supported input: a text or image extension that
+        is not a hidden/system file or part of a virtual environment.
         """
-        Extracts files from a ZIP folder and returns a list of file paths.
+        file_name = os.path.basename(file_path)
+        if file_name.startswith((".", "__")):
+            return False
+        parts = file_path.replace("\\", "/").split("/")
+        if ".venv" in parts or "__MACOSX" in parts:
+            return False
+
+        file_extension = os.path.splitext(file_name)[1].lower()
+        return (file_extension in Config.TEXT_EXTENSIONS or
+                file_extension in Config.IMAGE_EXTENSIONS)
+
+    @staticmethod
+    def _supported_members(zip_ref, extracted_folder):
+        """
+        Yields (member, target path) for supported, safe members of an archive.
+        Decides from the central directory alone, before decompressing anything.
+        """
+        for member in zip_ref.infolist():
+            if member.is_dir() or not FileProcessor.is_supported_file(member.filename):
+                continue
+            member_path = os.path.join(extracted_folder, member.filename)
+            if not is_safe_path(extracted_folder, member_path):
+                print(f"Skipped unsafe file path: {member.filename}")
+                continue
+            yield member, os.path.normpath(member_path)
+
+    @staticmethod
+    def process_zip(zip_path, dest_dir=None):
+        """
+        Extracts the supported files from a ZIP folder into dest_dir (the
+        upload directory by default) and returns their paths.
         Ensures no directory traversal attacks are possible.
         """
-        extracted_folder = os.path.join(Config.UPLOAD_DIR, 
+        extracted_folder = os.path.join(dest_dir or Config.UPLOAD_DIR, 
                                       os.path.basename(zip_path).replace(".zip", ""))
         os.makedirs(extracted_folder, exist_ok=True)
         
         file_paths = []
-        with zipfile.ZipFile(zip_path, "r") as zip_ref:
-            for member in zip_ref.infolist():
-                member_path = os.path.join(extracted_folder, member.filename)
-                if not is_safe_path(extracted_folder, member_path):
-                    print(f"Skipped unsafe file path: {member.filename}")
-                    continue
+        with timed("zip_extract") as timing, zipfile.ZipFile(zip_path, "r") as zip_ref:
+            timing["bytes"] = 0
+            for member, member_path in FileProcessor._supported_members(zip_ref,
+                                                                       extracted_folder):
                 zip_ref.extract(member, extracted_folder)
-                
+                file_paths.append(member_path)
+                timing["bytes"] += member.file_size
+
         # Return sorted list of extracted files
-        return sorted([
-            os.path.join(root, file)
-            for root, _, files in os.walk(extracted_folder)
-            for file in files
-        ])
+        return sorted(set(file_paths))
 
     @staticmethod
-    def build_file_tree(file_paths, base_dir):
+    def iter_zip(zip_path, dest_dir=None):
         """
-        Builds a nested file tree structure with metadata for UI.
+        Lists the supported files of a ZIP folder as ZipMembers, named as if
+        extracted into dest_dir, without extracting anything to disk.
         """
-        tree = {"folders": [], "files": []}
-        
+        extracted_folder = os.path.join(dest_dir or Config.UPLOAD_DIR, 
+                                      os.path.basename(zip_path).replace(".zip", ""))
+        members = {}
+        with timed("zip_scan"), zipfile.ZipFile(zip_path, "r") as zip_ref:
+            for member, member_path in FileProcessor._supported_members(zip_ref,
+                                                                       extracted_folder):
+                # Later duplicates win, as they would when extracting
+                members[member_path] = ZipMember(member_path, zip_path, member.filename)
+        return [members[path] for path in sorted(members)]
+
+    @staticmethod
+    def open_binary(file_path):
+        """Opens a file or ZipMember for binary reading."""
+        if isinstance(file_path, ZipMember):
+            return _archive_cache.get(file_path.zip_path).open(file_path.member_name)
+        return open(file_path, "rb")
+
+    @staticmethod
+    def read_bytes(file_path):
+        """Reads the full content of a file or ZipMember."""
+        with FileProcessor.open_binary(file_path) as f:
+            return f.read()
+
+    @staticmethod
+    def file_size(file_path):
+        """Uncompressed size of a file or ZipMember, without reading it."""
+        if isinstance(file_path, ZipMember):
+            return _archive_cache.get(file_path.zip_path).getinfo(file_path.member_name).file_size
+        return os.path.getsize(file_path)
+
+    @staticmethod
+    def _detect_encoding(sample, complete):
+        """
+        Text encoding of a file from its first bytes, or None if it looks
+        binary. complete tells whether sample is the whole file.
+        """
+        if sample.startswith(codecs.BOM_UTF8):
+            return "utf-8-sig"
+        if sample.startswith((codecs.BOM_UTF32_LE, codecs.BOM_UTF32_BE)):
+            return "utf-32"
+        if sample.startswith((codecs.BOM_UTF16_LE, codecs.BOM_UTF16_BE)):
+            return "utf-16"
+        if b"\0" in sample:
+            # BOM-less UTF-16 of mostly ASCII text has every other byte zero
+            half = len(sample) // 2
+            for encoding, zeros, others in (("utf-16-le", sample[1::2], sample[0::2]),
+                                            ("utf-16-be", sample[0::2], sample[1::2])):
+                if zeros.count(0) > half * 0.9 and others.count(0) < half * 0.05:
+                    return encoding
+            return None
+        # Control characters other than tab, newlines, form feed and escape
+        controls = sum(sample.count(byte) for byte in
+                       b"\x01\x02\x03\x04\x05\x06\x07\x08\x0e\x0f\x10\x11\x12"
+                       b"\x13\x14\x15\x16\x17\x18\x19\x1a\x1c\x1d\x1e\x1f\x7f")
+        if controls > len(sample) * 0.1:
+            return None
+        try:
+            # A character cut off at the end of the sample is not an error
+            codecs.getincrementaldecoder("utf-8")().decode(sample, final=complete)
+            return "utf-8"
+        except UnicodeDecodeError:
+            pass
+        try:
+            sample.decode("cp1252")
+            return "cp1252"
+        except UnicodeDecodeError:
+            return "latin-1"
+
+    @staticmethod
+    def classify(file_path):
+        """
+        Classifies a candidate input from its size and first
+        Config.CLASSIFY_SAMPLE_BYTES only. Returns its manifest entry: kind
+        ("text", "binary", "docx", "pdf", "image", "unsupported" or
+        "unreadable") and size, plus the encoding and estimated number of
+        wrapped lines of text files.
+        """
+        if not FileProcessor.is_supported_file(file_path):
+            return {"kind": "unsupported", "size": None}
+        extension = os.path.splitext(file_path)[1].lower()
+        try:
+            size = FileProcessor.file_size(file_path)
+            if extension in Config.IMAGE_EXTENSIONS:
+                return {"kind": "image", "size": size}
+            if extension in (".docx", ".pdf"):
+                return {"kind": extension[1:], "size": size}
+            with FileProcessor.open_binary(file_path) as f:
+                sample = f.read(Config.CLASSIFY_SAMPLE_BYTES)
+        except (OSError, KeyError, zipfile.BadZipFile) as e:
+            print(f"Could not read {file_path}. Reason: {e}")
+            return {"kind": "unreadable", "size": None}
+
+        encoding = FileProcessor._detect_encoding(sample, len(sample) >= size)
+        if encoding is None:
+            return {"kind": "binary", "size": size}
+        # Wrapped lines of the sample, scaled up to the whole file
+        text = sample.decode(encoding, errors="ignore").expandtabs(Config.TAB_SIZE)
+        width = Config.MAX_CHARS_PER_LINE
+        lines = sum(max(1, -(-len(line) // width)) for line in text.splitlines())
+        return {"kind": "text", "size": size, "encoding": encoding,
+                "estimated_lines": math.ceil(lines * size / len(sample)) if sample else 0}
+
+    @staticmethod
+    def classify_files(file_paths):
+        """Manifest of a job's inputs: classify() of each, by path."""
+        with timed("classify"):
+            return {file_path: FileProcessor.classify(file_path) for file_path in file_paths}
+
+    @staticmethod
+    def close_zip(zip_path):
+        """Releases the cached handle of an archive read through ZipMembers."""
+        _archive_cache.close(zip_path)
+
+    TREE_FILE = "tree.json"
+
+    @staticmethod
+    def _new_folder(name, path):
+        return {"name": name, "path": path, "file_count": 0, "folders": {}, "files": []}
+
+    @staticmethod
+    def build_file_tree(file_paths, base_dir, tree=None):
+        """
+        Builds a file tree for the confirmation UI in a single pass, or adds
+        to an existing one. Folders are indexed by name and carry their
+        relative path and total file count, so any level can be looked up
+        and served on its own.
+        """
+        if tree is None:
+            tree = FileProcessor._new_folder("", "")
+        prefix = os.path.join(base_dir, "")
+
         for file in file_paths:
             if file.startswith('.') or '/.' in file or '__MACOSX' in file:
                 continue
-            
+
             file_extension = os.path.splitext(file)[1].lower()
             if (file_extension not in Config.TEXT_EXTENSIONS and 
                 file_extension not in Config.IMAGE_EXTENSIONS):
                 continue
 
-            rel_path = os.path.relpath(file, base_dir)
-            parts = rel_path.split(os.sep)
+            if file.startswith(prefix):
+                parts = file[len(prefix):].split(os.sep)
+            else:
+                parts = os.path.relpath(file, base_dir).split(os.sep)
             current = tree
-
-            # Process folders
-            for depth, part in enumerate(parts[:-1]):
-                folder_name = part + "/"
-                folder = next((f for f in current.get('folders', []) 
-                             if f['name'] == folder_name), None)
+            current["file_count"] += 1
+            for part in parts[:-1]:
+                folder = current["folders"].get(part)
                 if folder is None:
-                    folder = {
-                        "name": folder_name,
-                        "folders": [],
-                        "files": [],
-                        "level": depth + 1,
-                        "indent": (depth + 1) * 20
-                    }
-                    current['folders'].append(folder)
+                    path = f"{current['path']}/{part}" if current["path"] else part
+                    folder = current["folders"][part] = FileProcessor._new_folder(part, path)
                 current = folder
+                current["file_count"] += 1
+            current["files"].append({"name": parts[-1], "full_path": file})
 
-            # Add file
-            current_level = len(parts)
-            current["files"].append({
-                "name": parts[-1],
-                "full_path": file,
-                "level": current_level,
-                "indent": current_level * 20
-            })
+        return tree
+
+    @staticmethod
+    def find_folder(tree, path):
+        """Returns the folder at a relative path of a file tree, or None."""
+        folder = tree
+        for part in filter(None, (path or "").split("/")):
+            folder = folder["folders"].get(part)
+            if folder is None:
+                return None
+        return folder
 
+    @staticmethod
+    def tree_level(tree, path, offset=0, limit=None):
+        """
+        One directory level of a file tree: its subfolders and a page of its
+        files. next_offset is None once the last file is included.
+        """
+        folder = FileProcessor.find_folder(tree, path)
+        if folder is None:
+            return None
+        end = len(folder["files"]) if limit is None else offset + limit
+        return {
+            "path": folder["path"],
+            "folders": [{"name": sub["name"], "path": sub["path"],
+                         "file_count": sub["file_count"]}
+                        for sub in folder["folders"].values()],
+            "files": folder["files"][offset:end],
+            "next_offset": end if end < len(folder["files"]) else None
+        }
+
+    @staticmethod
+    def select_tree_files(tree, files=(), folders=(), unchecked_files=(),
+                          unchecked_folders=()):
+        """
+        Resolves a selection on a file tree into file paths in tree order.
+        A checked or unchecked folder applies to everything below it unless
+        a deeper folder or file is marked itself; unmarked items at the top
+        level are not selected.
+        """
+        files, folders = set(files), set(folders)
+        unchecked_files, unchecked_folders = set(unchecked_files), set(unchecked_folders)
+        selected = []
+        stack = [(tree, False)]
+        while stack:
+            folder, inherited = stack.pop()
+            if folder["path"] in folders:
+                inherited = True
+            elif folder["path"] in unchecked_folders:
+                inherited = False
+            for file in folder["files"]:
+                path = file["full_path"]
+                if path in files or (inherited and path not in unchecked_files):
+                    selected.append(path)
+            # Reversed so folders are visited in their original order
+            stack.extend((sub, inherited) for sub in reversed(list(folder["folders"].values())))
+        return selected
+
+    @staticmethod
+    def save_file_tree(tree, workspace_dir):
+        """Saves a workspace's file tree in its control directory, apart from the uploads."""
+        path = os.path.join(WorkspaceService.control_dir(workspace_dir), FileProcessor.TREE_FILE)
+        with open(path, "w") as f:
+            json.dump(tree, f)
+
+    @staticmethod
+    def load_file_tree(workspace_dir):
+        """
+        Reads the file tree saved for a workspace, or None. Recently read
+        trees are kept parsed, since the UI requests one folder at a time.
+        """
+        path = os.path.join(WorkspaceService.control_dir(workspace_dir), FileProcessor.TREE_FILE)
+        try:
+            key = (path, os.path.getmtime(path))
+        except OSError:
+            return None
+        with _tree_cache_lock:
+            tree = _tree_cache.pop(key, None)
+        if tree is None:
+            try:
+                with open(path) as f:
+                    tree = json.load(f)
+            except (FileNotFoundError, json.JSONDecodeError):
+                return None
+        with _tree_cache_lock:
+            _tree_cache[key] = tree
+            while len(_tree_cache) > 8:
+                _tree_cache.popitem(last=False)
         return tree
 
     @staticmethod
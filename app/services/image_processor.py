@@ -0,0 +1,69 @@
+import hashlib
+import time
+import fitz
+from app.config.settings import Config
+from app.services.metrics import timed
+
+class ImageProcessor:
+    """
+    Prepares images for insertion: resamples them to Config.IMAGE_TARGET_DPI
+    for the rectangle they are drawn in and recompresses them: JPEG for opaque
+    images, PNG where there is transparency. Images already at or below the
+    target resolution are embedded unchanged. Keeps totals in stats.
+    """
+
+    def __init__(self, enabled=None, target_dpi=None, jpeg_quality=None):
+        self.enabled = Config.IMAGE_DOWNSCALE_ENABLED if enabled is None else enabled
+        self.target_dpi = target_dpi or Config.IMAGE_TARGET_DPI
+        self.jpeg_quality = jpeg_quality or Config.IMAGE_JPEG_QUALITY
+        self.stats = self.empty_stats()
+
+    @staticmethod
+    def empty_stats():
+        return {"images": 0, "images_deduplicated": 0, "image_bytes_in": 0,
+                "image_bytes_out": 0, "image_seconds": 0.0}
+
+    @staticmethod
+    def digest(data):
+        return hashlib.sha256(data).hexdigest()
+
+    def _target_size(self, pix, rect):
+        """Pixel size at the target DPI of pix drawn proportionally into rect."""
+        scale = min(rect.width / pix.width, rect.height / pix.height)
+        width = round(pix.width * scale / 72 * self.target_dpi)
+        height = round(pix.height * scale / 72 * self.target_dpi)
+        return max(1, width), max(1, height)
+
+    def _resample(self, data, rect):
+        pix = fitz.Pixmap(data)
+        width, height = self._target_size(pix, rect)
+        if width >= pix.width:
+            return data  # Already at or below the target resolution
+        if pix.colorspace is None or pix.colorspace.n not in (1, 3):
+            pix = fitz.Pixmap(fitz.csRGB, pix)
+        pix = fitz.Pixmap(pix, width, height, None)
+        if pix.alpha:
+            return pix.tobytes("png")
+        return pix.tobytes("jpeg", jpg_quality=self.jpeg_quality)
+
+    def prepare(self, data, rect):
+        """Returns the bytes to embed for image data drawn into rect."""
+        start = time.perf_counter()
+        prepared = data
+        if self.enabled:
+            with timed("image_prepare") as timing:
+                timing["bytes"] = len(data)
+                try:
+                    prepared = self._resample(data, rect)
+                except Exception as e:
+                    print(f"Could not resample image, embedding it unchanged: {e}")
+        self.stats["images"] += 1
+        self.stats["image_bytes_in"] += len(data)
+        self.stats["image_bytes_out"] += len(prepared)
+        self.stats["image_seconds"] += time.perf_counter() - start
+        return prepared
+
+    def merge_stats(self, stats):
+        """Adds totals collected by another processor, e.g. in a pool worker."""
+        for key, value in stats.items():
+            self.stats[key] += value
@@ -0,0 +1,184 @@
+import json
+import os
+import time
+from threading import Event, Lock
+from concurrent.futures import ThreadPoolExecutor
+from app.config.settings import Config
+from app.services.pdf_generator import ConversionCancelled
+
+class Job:
+    """
+    State of a single background conversion.
+    Job ids are workspace ids. The state is mirrored to job.json in the
+    workspace's control directory (state_dir) so any worker process can
+    report it, and a cancel marker there lets any worker cancel it.
+    """
+    STATE_FILE = "job.json"
+    CANCEL_MARKER = "cancel"
+    SAVE_INTERVAL = 1.0  # Seconds between progress writes
+
+    def __init__(self, job_id, state_dir=None):
+        self.id = job_id
+        self.state_dir = state_dir
+        self.status = 'queued'
+        self.files_total = 0
+        self.files_done = 0
+        self.pages_done = 0
+        self.pdf_name = None
+        self.stats = {}
+        self.error = None
+        self.finished_at = None
+        self.future = None
+        self.on_finish = None  # Called once the job ends, however it ends
+        self._cancel_event = Event()
+        self._saved_at = 0
+
+    @property
+    def cancelled(self):
+        if (not self._cancel_event.is_set() and self.state_dir and
+                os.path.exists(os.path.join(self.state_dir, self.CANCEL_MARKER))):
+            self._cancel_event.set()
+        return self._cancel_event.is_set()
+
+    def save_state(self):
+        """Writes the job's status to its workspace."""
+        if not self.state_dir:
+            return
+        self._saved_at = time.time()
+        path = os.path.join(self.state_dir, self.STATE_FILE)
+        try:
+            with open(f"{path}.tmp", "w") as f:
+                json.dump(self.to_dict(), f)
+            os.replace(f"{path}.tmp", path)
+        except OSError as e:
+            print(f"Failed to save job state {self.id}. Reason: {e}")
+
+    @staticmethod
+    def load_state(state_dir):
+        """Reads a job status saved by another process, or None."""
+        try:
+            with open(os.path.join(state_dir, Job.STATE_FILE)) as f:
+                return json.load(f)
+        except (FileNotFoundError, json.JSONDecodeError):
+            return None
+
+    def update_progress(self, files_done, pages_done):
+        """
+        Progress callback handed to the PDF generator.
+        Raises ConversionCancelled so cancellation takes effect mid-generation.
+        """
+        self.files_done = files_done
+        self.pages_done = pages_done
+        if time.time() - self._saved_at >= self.SAVE_INTERVAL:
+            self.save_state()
+        if self.cancelled:
+            raise ConversionCancelled(self.id)
+
+    def to_dict(self):
+        data = {
+            'job_id': self.id,
+            'status': self.status,
+            'progress': {
+                'files_total': self.files_total,
+                'files_done': self.files_done,
+                'pages_done': self.pages_done
+            }
+        }
+        if self.status == 'success':
+            query = f"workspace={self.id}&pdf_name={self.pdf_name}"
+            data['pdf_url'] = f"/download?{query}"
+            data['view_url'] = f"/view?{query}"
+            data['stats'] = self.stats
+        elif self.status == 'error':
+            data['message'] = self.error
+        return data
+
+class JobService:
+    """
+    Process-wide table of conversion jobs run on a bounded thread pool.
+    """
+    _instance = None
+    _lock = Lock()
+
+    def __new__(cls):
+        if cls._instance is None:
+            cls._instance = super(JobService, cls).__new__(cls)
+            cls._instance._jobs = {}
+            cls._instance._executor = ThreadPoolExecutor(
+                max_workers=Config.JOB_WORKERS, thread_name_prefix="conversion")
+        return cls._instance
+
+    def submit(self, job_id, func, *args, state_dir=None, on_finish=None):
+        """
+        Queues func(job, *args) on the executor and returns the new Job.
+        func returns the generated PDF name; on_finish() is called when the
+        job ends, including when it is cancelled before it starts.
+        """
+        job = Job(job_id, state_dir)
+        job.on_finish = on_finish
+        with self._lock:
+            self._prune_finished()
+            self._jobs[job_id] = job
+        job.save_state()
+        job.future = self._executor.submit(self._run, job, func, *args)
+        return job
+
+    def _run(self, job, func, *args):
+        if job.cancelled:
+            self._finish(job, 'cancelled')
+            return
+        job.status = 'processing'
+        job.save_state()
+        try:
+            job.pdf_name = func(job, *args)
+            self._finish(job, 'cancelled' if job.cancelled else 'success')
+        except ConversionCancelled:
+            self._finish(job, 'cancelled')
+        except Exception as e:
+            job.error = str(e)
+            self._finish(job, 'error')
+
+    def _finish(self, job, status):
+        job.status = status
+        job.finished_at = time.time()
+        job.save_state()
+        on_finish, job.on_finish = job.on_finish, None
+        if on_finish:
+            try:
+                on_finish()
+            except Exception as e:
+                print(f"Failed to finish job {job.id}. Reason: {e}")
+
+    def _prune_finished(self):
+        """Drops finished jobs older than the retention period."""
+        cutoff = time.time() - Config.JOB_RETENTION
+        for job_id in [job_id for job_id, job in self._jobs.items()
+                       if job.finished_at and job.finished_at < cutoff]:
+            del self._jobs[job_id]
+
+    def get(self, job_id):
+        return self._jobs.get(job_id)
+
+    def get_status(self, job_id, state_dir=None):
+        """
+        Returns a job's status dict, falling back to the state saved in its
+        workspace when another process runs it. None if unknown.
+        """
+        job = self._jobs.get(job_id)
+        if job is not None:
+            return job.to_dict()
+        return Job.load_state(state_dir) if state_dir else None
+
+    def cancel(self, job_id, state_dir=None):
+        """Requests cancellation. Returns False if the job is unknown."""
+        job = self._jobs.get(job_id)
+        if job is None:
+            if state_dir and Job.load_state(state_dir) is not None:
+                # Running in another process; it polls for the marker
+                open(os.path.join(state_dir, Job.CANCEL_MARKER), "w").close()
+                return True
+            return False
+        job._cancel_event.set()
+        if job.future is not None and job.future.cancel():
+            self._finish(job, 'cancelled')
+        return True
@@ -0,0 +1,171 @@
+"""
+Per-stage timing instrumentation for the conversion pipeline.
+
+Stages are timed with `timed()`; each observation feeds process-wide
+duration/bytes/pages histograms that /api/metrics renders in the Prometheus
+text format, and the current conversion's trace when tracing is enabled.
+Metrics are per process: with several gunicorn workers, scrape each one.
+"""
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+DURATION_BUCKETS = (0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1, 5, 10, 30, 60, 300)
+BYTES_BUCKETS = (1024, 16384, 131072, 1048576, 8388608, 67108864, 268435456)
+PAGES_BUCKETS = (1, 5, 10, 50, 100, 500, 1000, 5000)
+
+_local = threading.local()
+
+class Histogram:
+    """Cumulative histogram keyed by stage label."""
+
+    def __init__(self, name, help_text, buckets):
+        self.name = name
+        self.help_text = help_text
+        self.buckets = buckets
+        self._series = {}
+
+    def observe(self, stage, value):
+        series = self._series.get(stage)
+        if series is None:
+            series = self._series[stage] = {"counts": [0] * len(self.buckets),
+                                            "sum": 0.0, "count": 0}
+        for index, bound in enumerate(self.buckets):
+            if value <= bound:
+                series["counts"][index] += 1
+        series["sum"] += value
+        series["count"] += 1
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} histogram"]
+        for stage in sorted(self._series):
+            series = self._series[stage]
+            for bound, count in zip(self.buckets, series["counts"]):
+                lines.append(f'{self.name}_bucket{{stage="{stage}",le="{bound}"}} {count}')
+            lines.append(f'{self.name}_bucket{{stage="{stage}",le="+Inf"}} {series["count"]}')
+            lines.append(f'{self.name}_sum{{stage="{stage}"}} {series["sum"]:.6f}')
+            lines.append(f'{self.name}_count{{stage="{stage}"}} {series["count"]}')
+        return lines
+
+class MetricsRegistry:
+    """Process-wide stage histograms."""
+    _instance = None
+    _lock = threading.Lock()
+
+    def __new__(cls):
+        if cls._instance is None:
+            cls._instance = super(MetricsRegistry, cls).__new__(cls)
+            cls._instance.durations = Histogram(
+                "unifydoc_stage_duration_seconds", "Time spent in each pipeline stage.",
+                DURATION_BUCKETS)
+            cls._instance.bytes = Histogram(
+                "unifydoc_stage_bytes", "Bytes handled by each pipeline stage.",
+                BYTES_BUCKETS)
+            cls._instance.pages = Histogram(
+                "unifydoc_stage_pages", "Pages produced by each pipeline stage.",
+                PAGES_BUCKETS)
+        return cls._instance
+
+    def observe(self, stage, seconds, nbytes=None, pages=None):
+        with self._lock:
+            self.durations.observe(stage, seconds)
+            if nbytes is not None:
+                self.bytes.observe(stage, nbytes)
+            if pages is not None:
+                self.pages.observe(stage, pages)
+
+    def render(self, extra_lines=()):
+        """Renders all histograms plus extra_lines in the Prometheus text format."""
+        with self._lock:
+            lines = (self.durations.render() + self.bytes.render() +
+                     self.pages.render())
+        lines.extend(extra_lines)
+        return "\n".join(lines) + "\n"
+
+class Trace:
+    """Spans of one conversion, written in the Chrome trace event format."""
+
+    def __init__(self, name):
+        self.name = name
+        self.origin = time.perf_counter()
+        self.events = []
+
+    def add(self, stage, start, seconds, nbytes=None, pages=None):
+        args = {key: value for key, value in (("bytes", nbytes), ("pages", pages))
+                if value is not None}
+        self.events.append({
+            "name": stage, "ph": "X", "pid": os.getpid(),
+            "tid": threading.get_ident() % 100000,
+            "ts": round((start - self.origin) * 1e6), "dur": round(seconds * 1e6),
+            "args": args
+        })
+
+    def save(self, path):
+        with open(path, "w") as f:
+            json.dump({"traceEvents": self.events, "otherData": {"conversion": self.name}}, f)
+
+def observe(stage, seconds, nbytes=None, pages=None, start=None):
+    """Records one stage observation for the current thread."""
+    sink = getattr(_local, "sink", None)
+    if sink is not None:
+        # Inside a pool worker: hand the observation back to the parent
+        sink.append((stage, seconds, nbytes, pages))
+        return
+    MetricsRegistry().observe(stage, seconds, nbytes, pages)
+    trace = getattr(_local, "trace", None)
+    if trace is not None:
+        if start is None:
+            start = time.perf_counter() - seconds
+        trace.add(stage, start, seconds, nbytes, pages)
+
+@contextmanager
+def timed(stage):
+    """
+    Times a block as one observation of stage. The yielded dict accepts
+    "bytes" and "pages" entries that are recorded alongside the duration.
+    """
+    record = {}
+    start = time.perf_counter()
+    try:
+        yield record
+    finally:
+        observe(stage, time.perf_counter() - start, record.get("bytes"),
+                record.get("pages"), start)
+
+@contextmanager
+def collecting():
+    """Buffers this thread's observations in a list instead of recording them."""
+    previous = getattr(_local, "sink", None)
+    _local.sink = observations = []
+    try:
+        yield observations
+    finally:
+        _local.sink = previous
+
+def replay(observations):
+    """Records observations buffered by collecting(), e.g. in a pool worker."""
+    for stage, seconds, nbytes, pages in observations:
+        observe(stage, seconds, nbytes, pages)
+
+@contextmanager
+def tracing(name, output_path=None):
+    """
+    Collects a trace of this thread's stages and writes it to output_path
+    when the block exits. Does nothing when output_path is None.
+    """
+    if not output_path:
+        yield None
+        return
+    previous = getattr(_local, "trace", None)
+    _local.trace = trace = Trace(name)
+    try:
+        yield trace
+    finally:
+        _local.trace = previous
+        try:
+            os.makedirs(os.path.dirname(output_path), exist_ok=True)
+            trace.save(output_path)
+        except OSError as e:
+            print(f"Failed to write trace {output_path}. Reason: {e}")
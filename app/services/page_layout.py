@@ -0,0 +1,249 @@
+import math
+import os
+from itertools import islice
+from app.config.settings import Config
+from app.services.docx_reader import iter_docx_lines
+from app.services.syntax_highlighter import SyntaxHighlighter
+from app.services.metrics import timed
+from app.services.file_processor import FileProcessor
+from app.utils.text_wrap import wrap_code, wrap_styled, iter_wrapped
+
+class PageLayout:
+    """
+    Format-independent layout shared by the output writers: which inputs are
+    rendered (classification and page budget), page headers, wrapping,
+    pagination and the outline. Writers subclass it and turn its pages into
+    their format, so every format breaks pages in the same places.
+    """
+
+    def __init__(self, margin=None, header_note="", footer_note="",
+                 orientation="portrait", page_size=(612, 792), show_file_info=True,
+                 base_dir=None, content_hashes=None, syntax_highlighting=None,
+                 contents_page=None, page_budget=None):
+        self.margin = margin or Config.DEFAULT_MARGIN
+        self.header_note = header_note
+        self.footer_note = footer_note
+        self.page_size = page_size
+        self.show_file_info = show_file_info
+        self.font_size = Config.DEFAULT_FONT_SIZE
+        self.line_height = Config.DEFAULT_LINE_HEIGHT
+        self.max_chars_per_line = Config.MAX_CHARS_PER_LINE
+        self.tab_size = Config.TAB_SIZE
+        self.reserved_space = self.margin + (self.line_height * 2 if footer_note else 0)
+        # Directory that file paths are shown relative to
+        self.base_dir = base_dir or Config.UPLOAD_DIR
+        # Content hashes already known (e.g. computed while uploading), by path
+        self.content_hashes = content_hashes or {}
+        # Color code files that SyntaxHighlighter has a lexer for
+        self.syntax_highlighting = (Config.SYNTAX_HIGHLIGHTING if syntax_highlighting is None
+                                    else syntax_highlighting)
+        # Estimated pages a conversion may produce (0: no limit); see _admit
+        self.page_budget = Config.PDF_PAGE_BUDGET if page_budget is None else page_budget
+        # FileProcessor.classify() entries of the inputs, by path
+        self.manifest = {}
+        # Start the output with a table of contents linking to each file
+        self.contents_page = Config.PDF_CONTENTS_PAGE if contents_page is None else contents_page
+        # Outline of the output as [level, title, page]: the folder tree with
+        # each file's own bookmarks nested below it. contents holds only the
+        # folder and file entries; bookmarks of the file rendered last,
+        # relative to its first page, are in _file_toc
+        self.toc = []
+        self.contents = []
+        self._file_toc = []
+        self._outline_folders = []
+        self.stats = {}
+
+    def header_lines(self, file_name, relative_path):
+        """(role, text) lines at the top of every page of a file; each takes two lines."""
+        lines = []
+        if self.header_note:
+            lines.append(("note", self.header_note))
+        if self.show_file_info:
+            lines.append(("file", f"File: {file_name}"))
+            lines.append(("path", f"File Path: {relative_path}"))
+        return lines
+
+    def body_top(self):
+        """Y position where the body of every page starts, below the header."""
+        return self.margin + self.line_height * 2 * len(self.header_lines("", ""))
+
+    def _wrap_content(self, content):
+        """Wraps a whole file's content into the lines drawn on the page."""
+        return wrap_code(content, self.max_chars_per_line, self.tab_size)
+
+    def _paginate(self, lines, body_top, page_height):
+        """
+        Lazily splits wrapped lines (any iterable) into per-page blocks.
+        Every page of a file starts its body at body_top, so all pages hold the
+        same number of lines; the first block may be empty when the header
+        leaves no room for text, in which case each line gets its own page.
+        """
+        available = page_height - self.reserved_space - body_top
+        lines_per_page = int(available // self.line_height) if available > 0 else 0
+        lines = iter(lines)
+        if lines_per_page <= 0:
+            yield []
+            for line in lines:
+                yield [line]
+            return
+        # The first block is yielded even when empty: the file still gets a page
+        block = list(islice(lines, lines_per_page))
+        while True:
+            yield block
+            block = list(islice(lines, lines_per_page))
+            if not block:
+                return
+
+    def text_blocks(self, file_path, body_top):
+        """
+        Reads, decodes, highlights and wraps a text or .docx input and splits
+        it into per-page blocks. Returns (blocks, styled); styled blocks hold
+        (line, styles) pairs from wrap_styled. A .docx is streamed: its blocks
+        are produced lazily while they are written.
+        """
+        page_height = self.page_size[1]
+        if file_path.lower().endswith(".docx"):
+            # Stream the document's lines straight into pages, so a large
+            # docx is never held whole in memory
+            lines = iter_wrapped(iter_docx_lines(file_path),
+                                 self.max_chars_per_line, self.tab_size)
+            return self._paginate(lines, body_top, page_height), False
+
+        entry = self.manifest.get(file_path) or {}
+        with timed("read_text") as timing:
+            data = FileProcessor.read_bytes(file_path)
+            timing["bytes"] = len(data)
+            content = data.decode(entry.get("encoding", "utf-8"), errors="replace")
+
+        lexer = SyntaxHighlighter.lexer_for(file_path) if self.syntax_highlighting else None
+        if lexer:
+            with timed("highlight") as timing:
+                content = content.expandtabs(self.tab_size)
+                timing["bytes"] = len(content)
+                content_hash = self.content_hashes.get(file_path)
+                styles = SyntaxHighlighter.styles(
+                    lexer, content, content_hash and (content_hash, self.tab_size))
+
+        # Lay out the whole file up front, so each page's body can be written at once
+        with timed("wrap") as timing:
+            if lexer:
+                lines = wrap_styled(content, styles, self.max_chars_per_line)
+            else:
+                lines = self._wrap_content(content)
+            blocks = list(self._paginate(lines, body_top, page_height))
+            timing["pages"] = len(blocks)
+        return blocks, bool(lexer)
+
+    def _relative_path(self, file_path):
+        return (os.path.relpath(file_path, self.base_dir)
+                if self.base_dir in file_path else file_path)
+
+    def _lexer_name(self, file_path):
+        lexer = SyntaxHighlighter.lexer_for(file_path) if self.syntax_highlighting else None
+        return lexer.name if lexer else None
+
+    def _estimated_pages(self, entry):
+        """Rough page count of a manifest entry, for the page budget."""
+        if entry["kind"] == "text":
+            available = self.page_size[1] - self.reserved_space - self.body_top()
+            lines_per_page = max(1, int(available // self.line_height))
+            return max(1, math.ceil(entry["estimated_lines"] / lines_per_page))
+        if entry["kind"] == "docx":
+            return max(1, entry["size"] // 4096)
+        if entry["kind"] == "pdf":
+            return max(1, entry["size"] // (20 * 1024))
+        return 1
+
+    def _admit(self, file_paths):
+        """
+        Marks the manifest entries of files not to render with a "skip"
+        reason: binary, unsupported or unreadable files, and in order, files
+        whose estimated pages no longer fit the page budget.
+        Returns the estimated page count of the admitted files.
+        """
+        estimated = 0
+        for file_path in file_paths:
+            entry = self.manifest.get(file_path)
+            if entry is None:
+                entry = self.manifest[file_path] = FileProcessor.classify(file_path)
+            if entry["kind"] in ("binary", "unsupported", "unreadable"):
+                entry["skip"] = entry["kind"]
+                continue
+            pages = self._estimated_pages(entry)
+            if self.page_budget and estimated + pages > self.page_budget:
+                entry["skip"] = "page budget"
+                continue
+            estimated += pages
+        return estimated
+
+    def prepare(self, file_paths, manifest=None):
+        """
+        Starts a conversion: classifies the inputs (or takes manifest, as
+        returned by FileProcessor.classify_files), applies the page budget
+        and resets the outline. Returns the estimated page count.
+        """
+        if manifest is None:
+            manifest = FileProcessor.classify_files(file_paths)
+        # Copied, as skip reasons are added to the entries
+        self.manifest = {file_path: dict(entry) for file_path, entry in manifest.items()}
+        self.toc = []
+        self.contents = []
+        self._outline_folders = []
+        return self._admit(file_paths)
+
+    def skipped_files(self, file_paths):
+        return [{"path": self._relative_path(file_path),
+                 "reason": self.manifest[file_path]["skip"]}
+                for file_path in file_paths if "skip" in self.manifest[file_path]]
+
+    def _add_file_toc(self, file_path, start_page, end_page):
+        """
+        Adds the file rendered last, on pages start_page..end_page - 1, to the
+        outline: entries for the folders it opens, the file itself and its own
+        bookmarks below it. Files that added no pages are left out.
+        """
+        if end_page <= start_page:
+            return
+        folders = [part for part in os.path.dirname(self._relative_path(file_path))
+                   .replace("\\", "/").split("/") if part]
+        common = 0
+        while (common < min(len(folders), len(self._outline_folders)) and
+               folders[common] == self._outline_folders[common]):
+            common += 1
+        entries = [[depth + 1, folders[depth], start_page + 1]
+                   for depth in range(common, len(folders))]
+        entries.append([len(folders) + 1, os.path.basename(file_path), start_page + 1])
+        self._outline_folders = folders
+        self.contents.extend(entries)
+        self.toc.extend(entries)
+        self.toc.extend([level + len(folders) + 1, title, page + start_page if page > 0 else page]
+                        for level, title, page in self._file_toc)
+
+    def contents_line(self, level, title, label):
+        """A table of contents line: the indented title, dot leaders and label."""
+        text = "  " * (level - 1) + title
+        room = self.max_chars_per_line - len(label) - 2
+        if len(text) > room:
+            text = text[:room - 3] + "..."
+        return f"{text} {'.' * (room - len(text))} {label}"
+
+    def file_pages(self, file_path):
+        """
+        Yields the pages of one admitted input as dicts for writers without
+        a PDF engine: file, header lines, kind ("text", "image" or "pdf") and,
+        for text, the body lines and whether they are styled. Images and PDF
+        inputs take one page that only references the file.
+        """
+        entry = self.manifest.get(file_path) or {}
+        if "skip" in entry or not FileProcessor.is_supported_file(file_path):
+            return
+        file_name = os.path.basename(file_path)
+        page = {"file_path": file_path, "file_name": file_name,
+                "relative_path": self._relative_path(file_path),
+                "header": self.header_lines(file_name, self._relative_path(file_path))}
+        if entry.get("kind") in ("image", "pdf"):
+            yield dict(page, kind=entry["kind"], lines=[], styled=False)
+            return
+        blocks, styled = self.text_blocks(file_path, self.body_top())
+        for block in blocks:
+            yield dict(page, kind="text", lines=block, styled=styled)
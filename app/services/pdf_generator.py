@@ -1,147 +1,636 @@
 import os
+import math
+import re
+import multiprocessing
+import functools
+import time
 import fitz
-import textwrap
-from docx import Document
+from itertools import chain
+from threading import Lock
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
 from app.config.settings import Config
+from app.services.render_cache import RenderCache
+from app.services.image_processor import ImageProcessor
+from app.services.syntax_highlighter import SyntaxHighlighter
+from app.services.metrics import timed, collecting, replay
+from app.services.file_processor import FileProcessor, ZipMember
+from app.services.page_layout import PageLayout
+from app.services.pdf_output import DocumentOutput, ChunkedOutput, SAVE_PROFILES
+
+# Bump whenever rendering output changes so cached fragments are invalidated
+RENDER_VERSION = 6
+
+class ConversionCancelled(Exception):
+    """Raised by a progress callback to abort a running conversion."""
+
+class PDFGenerator(PageLayout):
+    extension = ".pdf"
+    # Font size and name of each role of PageLayout.header_lines
+    HEADER_FONTS = {"note": (12, "courier-bold"), "file": (12, "courier-bold"),
+                    "path": (10, "courier-bold")}
 
-class PDFGenerator:
     def __init__(self, margin=None, header_note="", footer_note="", 
-                 orientation="portrait", page_size=(612, 792), show_file_info=True):
-        self.margin = margin or Config.DEFAULT_MARGIN
-        self.header_note = header_note
-        self.footer_note = footer_note
-        self.page_size = page_size
-        self.show_file_info = show_file_info
-        self.font_size = Config.DEFAULT_FONT_SIZE
-        self.line_height = Config.DEFAULT_LINE_HEIGHT
-        self.max_chars_per_line = Config.MAX_CHARS_PER_LINE
-        self.reserved_space = self.margin + (self.line_height * 2 if footer_note else 0)
+                 orientation="portrait", page_size=(612, 792), show_file_info=True,
+                 workers=None, cache=None, base_dir=None, content_hashes=None,
+                 low_memory=None, image_processor=None, save_profile=None,
+                 rescale_pdf_inputs=None, syntax_highlighting=None, contents_page=None,
+                 page_budget=None, document_id=None):
+        super().__init__(margin=margin, header_note=header_note, footer_note=footer_note,
+                         orientation=orientation, page_size=page_size,
+                         show_file_info=show_file_info, base_dir=base_dir,
+                         content_hashes=content_hashes,
+                         syntax_highlighting=syntax_highlighting,
+                         contents_page=contents_page, page_budget=page_budget)
+        self.workers = workers or Config.PDF_WORKERS
+        self.cache = cache
+        # Flush finished pages to disk instead of holding the whole document
+        self.low_memory = Config.PDF_LOW_MEMORY if low_memory is None else low_memory
+        self.image_processor = image_processor or ImageProcessor()
+        # How the output is optimized when saved; see SAVE_PROFILES
+        self.save_profile = save_profile or Config.PDF_SAVE_PROFILE
+        if self.save_profile not in SAVE_PROFILES:
+            raise ValueError(f"Unknown output profile: {self.save_profile}")
+        # Redraw PDF input pages of another size at page_size; otherwise they are
+        # copied unchanged, as pages that already match always are
+        self.rescale_pdf_inputs = (Config.RESCALE_PDF_INPUTS if rescale_pdf_inputs is None
+                                   else rescale_pdf_inputs)
+        # Trailer ID of the output instead of a random one (deterministic mode)
+        self.document_id = document_id
+        # Images already embedded in the document being built, by content hash
+        self._image_doc = None
+        self._image_xrefs = {}
+        # Images spliced in with fragments, by digest (see _dedupe_images)
+        self._spliced_doc = None
+        self._spliced_images = {}
+
+    def __getstate__(self):
+        # The render cache stays in the parent process; pool workers only render
+        state = self.__dict__.copy()
+        state["cache"] = None
+        state["_image_doc"] = None
+        state["_image_xrefs"] = {}
+        state["_spliced_doc"] = None
+        state["_spliced_images"] = {}
+        return state
 
     def _insert_page_header(self, page, y_position, file_name, relative_path):
         """Helper to insert header note and file info."""
-        if self.header_note:
-            page.insert_text((self.margin, y_position), self.header_note, 
-                           fontsize=12, fontname="courier-bold")
-            y_position += self.line_height * 2
-            
-        if self.show_file_info:
-            page.insert_text((self.margin, y_position), f"File: {file_name}", 
-                           fontsize=12, fontname="courier-bold")
-            y_position += self.line_height * 2
-            page.insert_text((self.margin, y_position), f"File Path: {relative_path}", 
-                           fontsize=10, fontname="courier-bold")
+        for role, text in self.header_lines(file_name, relative_path):
+            fontsize, fontname = self.HEADER_FONTS[role]
+            page.insert_text((self.margin, y_position), text,
+                             fontsize=fontsize, fontname=fontname)
             y_position += self.line_height * 2
-            
         return y_position
 
-    def generate(self, file_paths, output_pdf_path):
+    def _insert_footer(self, page, page_height):
+        """Helper to insert the footer note at the bottom of a page."""
+        page.insert_text(
+            (self.margin, page_height - self.margin - self.line_height),
+            self.footer_note, fontsize=10, fontname="courier-oblique"
+        )
+
+    def _insert_blocks(self, doc, page, y_position, blocks, file_name, relative_path,
+                       styled=False):
         """
-        Generates a PDF from the provided file paths.
-        Supports text files, Word documents (.docx), PDFs, and image files.
+        Writes paginated text blocks, starting on page at y_position; styled
+        blocks hold (line, styles) pairs from wrap_styled.
+        Returns the last page and the y position after its text.
         """
         page_width, page_height = self.page_size
-        doc = fitz.open()
+        for index, block in enumerate(blocks):
+            if index > 0:
+                if self.footer_note:
+                    self._insert_footer(page, page_height)
+                # Start new page
+                page = doc.new_page(width=page_width, height=page_height)
+                y_position = self.margin
+                y_position = self._insert_page_header(page, y_position,
+                                                    file_name, relative_path)
+            if block and styled:
+                SyntaxHighlighter.draw_lines(doc, page, (self.margin, y_position), block,
+                                             self.font_size, self.line_height)
+            elif block:
+                page.insert_text((self.margin, y_position), "\n".join(block),
+                               fontsize=self.font_size, fontname="courier",
+                               lineheight=self.line_height / self.font_size)
+            y_position += self.line_height * len(block)
+        return page, y_position
 
-        for file_path in file_paths:
-            file_name = os.path.basename(file_path)
-            # Skip system files and files in virtual environments
-            if (file_name.startswith((".", "__")) or 
-                ".venv" in file_path.split(os.sep)):
-                continue
+    def _insert_image(self, doc, page, rect, data, content_hash=None):
+        """
+        Draws image data into rect. An image already embedded in doc is
+        referenced by its xref instead of being stored again.
+        """
+        if self._image_doc is not doc:
+            self._image_doc = doc
+            self._image_xrefs = {}
+        digest = content_hash or ImageProcessor.digest(data)
+        xref = self._image_xrefs.get(digest)
+        if xref:
+            page.insert_image(rect, xref=xref)
+            self.image_processor.stats["images_deduplicated"] += 1
+            return
+        prepared = self.image_processor.prepare(data, rect)
+        self._image_xrefs[digest] = page.insert_image(rect, stream=prepared)
 
-            file_extension = os.path.splitext(file_name)[1].lower()
-            if (file_extension not in Config.TEXT_EXTENSIONS and 
-                file_extension not in Config.IMAGE_EXTENSIONS):
-                continue
+    @staticmethod
+    def _fitz_source(file_path):
+        """fitz keyword arguments that read a file from disk or a ZipMember from memory."""
+        if isinstance(file_path, ZipMember):
+            return {"stream": FileProcessor.read_bytes(file_path)}
+        return {"filename": file_path}
+
+    def _cache_key(self, file_path):
+        """Render cache key: file content plus every setting that shapes its pages."""
+        layout = {
+            "version": RENDER_VERSION,
+            "extension": os.path.splitext(file_path)[1].lower(),
+            "margin": self.margin,
+            "page_size": list(self.page_size),
+            "header_note": self.header_note,
+            "footer_note": self.footer_note,
+            "show_file_info": self.show_file_info,
+            "font_size": self.font_size,
+            "line_height": self.line_height,
+            "max_chars_per_line": self.max_chars_per_line,
+            "tab_size": self.tab_size,
+            "rescale_pdf_inputs": self.rescale_pdf_inputs,
+            "syntax_highlighting": self._lexer_name(file_path)
+        }
+        if layout["extension"] in Config.IMAGE_EXTENSIONS:
+            processor = self.image_processor
+            layout["image"] = ([processor.target_dpi, processor.jpeg_quality]
+                               if processor.enabled else None)
+        if self.show_file_info:
+            layout["file_name"] = os.path.basename(file_path)
+            layout["relative_path"] = self._relative_path(file_path)
+        content_hash = self.content_hashes.get(file_path) or RenderCache.hash_file(file_path)
+        return RenderCache.make_key(content_hash, layout)
+
+    def _render_file(self, doc, file_path):
+        """
+        Renders a single input file onto new pages appended to doc.
+        Skipped and unreadable files add no pages.
+        """
+        self._file_toc = []
+        if "skip" in self.manifest.get(file_path, {}) or not FileProcessor.is_supported_file(file_path):
+            return
+
+        page_width, page_height = self.page_size
+        file_name = os.path.basename(file_path)
+        file_extension = os.path.splitext(file_name)[1].lower()
+
+        # Compute relative path
+        relative_path = self._relative_path(file_path)
+
+        # Handle PDF files
+        if file_extension == ".pdf":
+            try:
+                with timed("pdf_embed") as timing, \
+                        fitz.open(filetype="pdf", **self._fitz_source(file_path)) as pdf_in:
+                    self._embed_pdf(doc, pdf_in)
+                    self._file_toc = pdf_in.get_toc()
+                    timing["pages"] = len(pdf_in)
+            except Exception as e:
+                print(f"Error processing PDF {file_path}: {e}")
+            return
+
+        # Create new page for non-PDF files
+        page = doc.new_page(width=page_width, height=page_height)
+        y_position = self.margin
+
+        # Insert header and file info
+        y_position = self._insert_page_header(page, y_position, file_name, relative_path)
+
+        # Handle images
+        if file_extension in Config.IMAGE_EXTENSIONS:
+            try:
+                if y_position + 200 > page_height - self.margin:
+                    page = doc.new_page(width=page_width, height=page_height)
+                    y_position = self.margin
+                    
+                # Calculate image dimensions and center it
+                img_width = (page_width - 2 * self.margin) * 0.5
+                img_height = img_width * 0.75
+                img_x0 = (page_width - img_width) / 2
+                img_rect = fitz.Rect(img_x0, y_position, 
+                                   img_x0 + img_width, y_position + img_height)
+                with timed("image_insert") as timing:
+                    data = FileProcessor.read_bytes(file_path)
+                    timing["bytes"] = len(data)
+                    self._insert_image(doc, page, img_rect, data,
+                                       self.content_hashes.get(file_path))
+                y_position += img_height + 20
+            except Exception as e:
+                print(f"Error processing image {file_path}: {e}")
+
+        # Handle text files
+        else:
+            try:
+                blocks, styled = self.text_blocks(file_path, y_position)
+                # Each page's body is written with a single text insert
+                with timed("text_layout") as timing:
+                    first_page = len(doc)
+                    page, y_position = self._insert_blocks(doc, page, y_position, blocks,
+                                                           file_name, relative_path,
+                                                           styled=styled)
+                    timing["pages"] = len(doc) - first_page + 1
+
+            except Exception as e:
+                print(f"Error processing {file_path}: {e}")
+                return
+
+        # Add footer note at the end of file's content
+        if self.footer_note:
+            if y_position + self.line_height > page_height - self.margin:
+                page = doc.new_page(width=page_width, height=page_height)
+            self._insert_footer(page, page_height)
+
+    def _cached_fragment(self, file_path):
+        """
+        Looks a file up in the render cache.
+        Returns (fragment bytes or None, cache key or None).
+        """
+        if (self.cache is None or not FileProcessor.is_supported_file(file_path) or
+                "skip" in self.manifest.get(file_path, {})):
+            return None, None
+        with timed("cache_lookup"):
+            try:
+                key = self._cache_key(file_path)
+            except OSError:
+                return None, None
+            return self.cache.get(key), key
+
+    def _insert_fragment(self, doc, fragment):
+        with timed("fragment_insert") as timing, fitz.open("pdf", fragment) as fragment_doc:
+            timing["bytes"] = len(fragment)
+            timing["pages"] = len(fragment_doc)
+            first_page, first_xref = len(doc), doc.xref_length()
+            doc.insert_pdf(fragment_doc)
+            self._file_toc = fragment_doc.get_toc()
+        self._dedupe_images(doc, first_page, first_xref)
+
+    def _dedupe_images(self, doc, first_page, first_xref):
+        """
+        Points the images on the pages spliced in from first_page at
+        identical images spliced into doc before, which _insert_image cannot
+        do across fragments. The copies brought in with the fragment (objects
+        from first_xref on) are then dropped, so no save profile writes them.
+        """
+        if self._spliced_doc is not doc:
+            self._spliced_doc = doc
+            self._spliced_images = {}
+        duplicates = set()
+        for page_number in range(first_page, len(doc)):
+            page = doc[page_number]
+            for xref, smask, width, height, bpc, colorspace, _, name, image_filter, \
+                    referencer in page.get_images(full=True):
+                digest = ImageProcessor.digest(b"\0".join([
+                    doc.xref_stream_raw(xref) or b"",
+                    doc.xref_stream_raw(smask) or b"" if smask else b"",
+                    repr((width, height, bpc, colorspace, image_filter)).encode()]))
+                kept = self._spliced_images.setdefault(digest, xref)
+                if kept == xref:
+                    continue
+                _set_xobject(doc, referencer or page.xref, name, kept)
+                if xref not in duplicates and xref >= first_xref:
+                    duplicates.add(xref)
+                    self.image_processor.stats["images_deduplicated"] += 1
+        if duplicates:
+            _drop_unreferenced(doc, duplicates, first_xref)
+
+    def _contents_blocks(self):
+        """Table of contents entries, paginated like file text."""
+        return list(self._paginate(self.contents, self.margin + self.line_height * 2,
+                                   self.page_size[1]))
 
-            # Compute relative path
-            relative_path = (os.path.relpath(file_path, Config.UPLOAD_DIR) 
-                           if Config.UPLOAD_DIR in file_path else file_path)
-
-            # Handle PDF files
-            if file_extension == ".pdf":
-                try:
-                    with fitz.open(file_path) as pdf_in:
-                        for pdf_page in pdf_in:
-                            new_page = doc.new_page(width=page_width, height=page_height)
-                            new_page.show_pdf_page(new_page.rect, pdf_in, pdf_page.number)
-                except Exception as e:
-                    print(f"Error processing PDF {file_path}: {e}")
+    def _insert_contents_pages(self, doc, blocks):
+        """
+        Inserts the table of contents pages at the front of the finished doc,
+        each entry linking to its page. Contents pages are labelled i, ii, ...
+        and the pages after them 1, 2, ..., the numbers the entries show.
+        """
+        page_width, page_height = self.page_size
+        front = len(blocks)
+        body_top = self.margin + self.line_height * 2
+        for index, block in enumerate(blocks):
+            page = doc.new_page(pno=index, width=page_width, height=page_height)
+            page.insert_text((self.margin, self.margin), "Contents",
+                             fontsize=12, fontname="courier-bold")
+            lines = [self.contents_line(level, title, str(page_number))
+                     for level, title, page_number in block]
+            if lines:
+                page.insert_text((self.margin, body_top), "\n".join(lines),
+                                 fontsize=self.font_size, fontname="courier",
+                                 lineheight=self.line_height / self.font_size)
+        # Link annotations are written directly: Page.insert_link costs about
+        # a millisecond per link, which adds up over thousands of files
+        for index, block in enumerate(blocks):
+            links = []
+            for line, (_, _, page_number) in enumerate(block):
+                top = page_height - (body_top + line * self.line_height - self.font_size)
+                target = doc.page_xref(front + page_number - 1)
+                xref = doc.get_new_xref()
+                doc.update_object(xref, (
+                    f"<</Type/Annot/Subtype/Link/Border[0 0 0]"
+                    f"/Rect[{self.margin:g} {top - self.line_height:g} "
+                    f"{page_width - self.margin:g} {top:g}]"
+                    f"/Dest[{target} 0 R/Fit]>>"))
+                links.append(f"{xref} 0 R")
+            doc.xref_set_key(doc.page_xref(index), "Annots", "[" + " ".join(links) + "]")
+        doc.set_page_labels([{"startpage": 0, "prefix": "", "style": "r", "firstpagenum": 1},
+                             {"startpage": front, "prefix": "", "style": "D",
+                              "firstpagenum": 1}])
+
+    def _embed_pdf(self, doc, pdf_in):
+        """
+        Appends the pages of a PDF input. Runs of pages already at page_size
+        (or every page, without rescaling) are copied with insert_pdf; only
+        the others are redrawn onto a new page of page_size.
+        """
+        if not self.rescale_pdf_inputs:
+            doc.insert_pdf(pdf_in)
+            return
+        page_width, page_height = self.page_size
+        run_start = None
+        for pdf_page in pdf_in:
+            rect = pdf_page.rect
+            if abs(rect.width - page_width) < 1 and abs(rect.height - page_height) < 1:
+                if run_start is None:
+                    run_start = pdf_page.number
                 continue
+            if run_start is not None:
+                doc.insert_pdf(pdf_in, from_page=run_start, to_page=pdf_page.number - 1)
+                run_start = None
+            new_page = doc.new_page(width=page_width, height=page_height)
+            new_page.show_pdf_page(new_page.rect, pdf_in, pdf_page.number)
+        if run_start is not None:
+            doc.insert_pdf(pdf_in, from_page=run_start, to_page=len(pdf_in) - 1)
+
+    def _render_cached(self, doc, file_path):
+        """Splices a file's cached fragment into doc, rendering it on a miss."""
+        fragment, key = self._cached_fragment(file_path)
+        if fragment is None:
+            if key is None:
+                self._render_file(doc, file_path)
+                return
+            fragment = _render_fragment(self, file_path)
+            if fragment is None:
+                return
+            self.cache.put(key, fragment)
+        self._insert_fragment(doc, fragment)
 
-            # Create new page for non-PDF files
-            page = doc.new_page(width=page_width, height=page_height)
-            y_position = self.margin
-
-            # Insert header and file info
-            y_position = self._insert_page_header(page, y_position, file_name, relative_path)
-
-            # Handle images
-            if file_extension in Config.IMAGE_EXTENSIONS:
-                try:
-                    if y_position + 200 > page_height - self.margin:
-                        page = doc.new_page(width=page_width, height=page_height)
-                        y_position = self.margin
-                        
-                    # Calculate image dimensions and center it
-                    img_width = (page_width - 2 * self.margin) * 0.5
-                    img_height = img_width * 0.75
-                    img_x0 = (page_width - img_width) / 2
-                    img_rect = fitz.Rect(img_x0, y_position, 
-                                       img_x0 + img_width, y_position + img_height)
-                    page.insert_image(img_rect, filename=file_path)
-                    y_position += img_height + 20
-                except Exception as e:
-                    print(f"Error processing image {file_path}: {e}")
-
-            # Handle text files
+    def _render_spliced(self, doc, file_path):
+        """Renders a file on its own and splices it into doc, as a cache miss would."""
+        fragment = _render_fragment(self, file_path)
+        if fragment is not None:
+            self._insert_fragment(doc, fragment)
+
+    def _generate_parallel(self, file_paths, output, progress_callback=None,
+                           cpu_callback=None):
+        """
+        Renders contiguous groups of uncached files in a process pool and
+        merges them with cached fragments in the original order.
+        """
+        fragments = {}
+        keys = {}
+        pending = []
+        for index, file_path in enumerate(file_paths):
+            fragment, key = self._cached_fragment(file_path)
+            if fragment is not None:
+                fragments[index] = fragment
             else:
-                try:
-                    # Read content from docx or text file
-                    if file_extension == ".docx":
-                        docx_document = Document(file_path)
-                        content = "\n".join(para.text for para in docx_document.paragraphs)
-                    else:
-                        with open(file_path, "r", encoding="utf-8") as file:
-                            content = file.read()
-
-                    # Process content line by line
-                    for line in content.splitlines():
-                        wrapped_lines = textwrap.wrap(line, width=self.max_chars_per_line)
-                        for wrapped_line in wrapped_lines:
-                            if y_position + self.line_height > page_height - self.reserved_space:
-                                if self.footer_note:
-                                    page.insert_text(
-                                        (self.margin, page_height - self.margin - self.line_height),
-                                        self.footer_note, fontsize=10, fontname="courier-oblique"
-                                    )
-                                # Start new page
-                                page = doc.new_page(width=page_width, height=page_height)
-                                y_position = self.margin
-                                y_position = self._insert_page_header(page, y_position, 
-                                                                    file_name, relative_path)
-                                
-                            page.insert_text((self.margin, y_position), wrapped_line, 
-                                           fontsize=self.font_size, fontname="courier")
-                            y_position += self.line_height
-
-                except Exception as e:
-                    print(f"Error processing {file_path}: {e}")
-                    continue
+                keys[index] = key
+                pending.append(index)
+
+        group_size = max(1, math.ceil(len(pending) / (self.workers * 4)))
+        groups = [[file_paths[index] for index in pending[start:start + group_size]]
+                  for start in range(0, len(pending), group_size)]
 
-            # Add footer note at the end of file's content
-            if self.footer_note:
-                if y_position + self.line_height <= page_height - self.margin:
-                    page.insert_text(
-                        (self.margin, page_height - self.margin - self.line_height),
-                        self.footer_note, fontsize=10, fontname="courier-oblique"
-                    )
+        executor = _worker_pool(self.workers)
+        futures = [executor.submit(_render_file_group, self, group) for group in groups]
+        try:
+            # Per-file fragments of pending files, yielded in submission order;
+            # timings and image totals measured in the workers are recorded here
+            rendered = chain.from_iterable(_replayed(
+                self, (future.result() for future in futures), cpu_callback))
+            for index in range(len(file_paths)):
+                if index in fragments:
+                    fragment = fragments.pop(index)
                 else:
-                    page = doc.new_page(width=page_width, height=page_height)
-                    page.insert_text(
-                        (self.margin, page_height - self.margin - self.line_height),
-                        self.footer_note, fontsize=10, fontname="courier-oblique"
-                    )
+                    fragment = next(rendered)
+                    if fragment is not None and keys[index] is not None:
+                        self.cache.put(keys[index], fragment)
+                if fragment is not None:
+                    start_page = output.page_count
+                    self._insert_fragment(output.doc, fragment)
+                    self._add_file_toc(file_paths[index], start_page, output.page_count)
+                output.file_done()
+                if progress_callback:
+                    progress_callback(index + 1, output.page_count)
+        except BrokenProcessPool:
+            _discard_worker_pool(self.workers, executor)
+            raise
+        finally:
+            # Groups a cancelled or failed conversion still has queued are
+            # dropped; the pool itself stays up for the next conversion
+            for future in futures:
+                future.cancel()
+
+    def generate(self, file_paths, output_pdf_path, progress_callback=None, manifest=None,
+                 cpu_callback=None):
+        """
+        Generates a PDF from the provided file paths.
+        Supports text files, Word documents (.docx), PDFs, and image files.
+        progress_callback(files_done, pages_done) is called after each file;
+        it may raise ConversionCancelled to stop the conversion before
+        the output is complete. cpu_callback(seconds) is called with the CPU
+        time each group of files took in the PDF_WORKERS process pool, as
+        it completes, since the caller's own CPU time does not include it.
+        Inputs are classified first (or taken from manifest, as returned by
+        FileProcessor.classify_files) to decode text correctly and skip
+        binaries and files over the page budget without reading them whole.
+        Returns run statistics: page count, output size and save time, peak
+        resident memory, image preprocessing totals and skipped files.
+        """
+        estimated_pages = self.prepare(file_paths, manifest)
+        self.image_processor.stats = ImageProcessor.empty_stats()
+        if self.low_memory:
+            output = ChunkedOutput(output_pdf_path, Config.PDF_FLUSH_PAGES, self.save_profile,
+                                   self.document_id)
+        else:
+            output = DocumentOutput(output_pdf_path, self.save_profile, self.document_id)
+
+        try:
+            if self.workers > 1 and len(file_paths) > 1:
+                self._generate_parallel(file_paths, output, progress_callback, cpu_callback)
+            else:
+                if self.cache is not None:
+                    render = self._render_cached
+                elif self.document_id:
+                    # Deterministic output is built the way the cache and the
+                    # workers build it, so its bytes do not depend on either
+                    render = self._render_spliced
+                else:
+                    render = self._render_file
+                for files_done, file_path in enumerate(file_paths, start=1):
+                    start_page = output.page_count
+                    render(output.doc, file_path)
+                    self._add_file_toc(file_path, start_page, output.page_count)
+                    output.file_done()
+                    if progress_callback:
+                        progress_callback(files_done, output.page_count)
+            page_count = output.page_count
+            output.toc = self.toc
+            if self.contents_page and self.contents:
+                # Laid out from the entries recorded while rendering; the
+                # output is only shifted back, never rendered again
+                blocks = self._contents_blocks()
+                page_count += len(blocks)
+                output.toc = [[level, title, page + len(blocks) if page > 0 else page]
+                              for level, title, page in self.toc]
+                output.front_matter = functools.partial(self._insert_contents_pages,
+                                                        blocks=blocks)
+            save_start = time.perf_counter()
+            with timed("save") as timing:
+                output.finish()
+                output_bytes = os.path.getsize(output_pdf_path)
+                timing["pages"] = page_count
+                timing["bytes"] = output_bytes
+            save_seconds = time.perf_counter() - save_start
+        except BaseException:
+            output.abort()
+            raise
+
+        self.stats = {
+            "pages": page_count,
+            "output_bytes": output_bytes,
+            "save_profile": self.save_profile,
+            "save_seconds": round(save_seconds, 4),
+            "low_memory": self.low_memory,
+            "peak_rss_bytes": output.peak_rss_bytes,
+            "estimated_pages": estimated_pages,
+            "skipped_files": self.skipped_files(file_paths)
+        }
+        self.stats.update(self.image_processor.stats)
+        self.stats["image_seconds"] = round(self.stats["image_seconds"], 4)
+        return self.stats
+
+
+def _set_xobject(doc, holder, name, xref):
+    """Points XObject name in the resources of object holder at xref."""
+    target, key = holder, "Resources"
+    for part in ("XObject", name):
+        # Setting a path through an indirect object would replace it, so
+        # indirect dictionaries are followed here
+        kind, value = doc.xref_get_key(target, key)
+        if kind == "xref":
+            target, key = int(value.split()[0]), part
+        else:
+            key = f"{key}/{part}"
+    doc.xref_set_key(target, key, f"{xref} 0 R")
+
+
+def _drop_unreferenced(doc, xrefs, first_xref):
+    """
+    Replaces the objects xrefs with null, then those they referenced from
+    first_xref on (the objects of the last splice) that nothing else refers
+    to any more, such as soft masks and ICC profiles.
+    """
+    reference = re.compile(r"\b(\d+) 0 R\b")
+    recent = range(first_xref, doc.xref_length())
+    dropped = set()
+    while xrefs:
+        candidates = set()
+        for xref in xrefs:
+            candidates.update(int(ref) for ref in reference.findall(doc.xref_object(xref))
+                              if int(ref) in recent)
+            doc.update_object(xref, "null")
+            dropped.add(xref)
+        candidates -= dropped
+        live = set()
+        if candidates:
+            for xref in recent:
+                if xref not in dropped:
+                    live.update(int(ref) for ref in reference.findall(doc.xref_object(xref)))
+        xrefs = candidates - live
+
+
+# Render pools by size, kept for the life of the process so that what the
+# workers cache (such as syntax highlighting styles) carries over between
+# conversions. Keyed by process id as well, since a forked child cannot use
+# its parent's pool.
+_worker_pools = {}
+_worker_pools_lock = Lock()
+# Workers are not forked from the app directly: it runs job, reaper and
+# counter threads, and its open files would stay open in the workers
+_POOL_START_METHOD = ("forkserver" if "forkserver" in multiprocessing.get_all_start_methods()
+                      else "spawn")
+
+
+def _worker_pool(workers):
+    """The process pool of this size, started on first use."""
+    key = (os.getpid(), workers)
+    with _worker_pools_lock:
+        pool = _worker_pools.get(key)
+        if pool is None:
+            pool = _worker_pools[key] = ProcessPoolExecutor(
+                max_workers=workers, mp_context=multiprocessing.get_context(_POOL_START_METHOD))
+        return pool
+
+
+def _discard_worker_pool(workers, pool):
+    """Drops a broken pool (e.g. a worker was killed) so the next use starts a new one."""
+    with _worker_pools_lock:
+        if _worker_pools.get((os.getpid(), workers)) is pool:
+            del _worker_pools[(os.getpid(), workers)]
+    pool.shutdown(wait=False, cancel_futures=True)
+
+
+def _render_fragment(generator, file_path):
+    """Renders one file to standalone PDF bytes, or None if it has no pages."""
+    doc = fitz.open()
+    try:
+        generator._render_file(doc, file_path)
+        if not len(doc):
+            return None
+        if generator._file_toc:
+            # Kept with the fragment so cached copies restore the bookmarks
+            doc.set_toc(generator._file_toc)
+        return doc.tobytes()
+    finally:
+        doc.close()
+
+
+def _render_file_group(generator, file_paths):
+    """
+    Process pool entry point: renders each file of a group to PDF bytes.
+    Returns (fragments, stage timings, image totals, CPU seconds) of the group.
+    """
+    cpu_start = time.process_time()
+    generator.image_processor.stats = ImageProcessor.empty_stats()
+    try:
+        with collecting() as observations:
+            fragments = [_render_fragment(generator, file_path) for file_path in file_paths]
+    finally:
+        # The worker outlives the conversion; an archive left open would keep
+        # its disk space in use after the workspace is removed
+        for zip_path in {file_path.zip_path for file_path in file_paths
+                         if isinstance(file_path, ZipMember)}:
+            FileProcessor.close_zip(zip_path)
+    return (fragments, observations, generator.image_processor.stats,
+            time.process_time() - cpu_start)
+
 
-        doc.save(output_pdf_path)
-        doc.close() 
\ No newline at end of file
+def _replayed(generator, group_results, cpu_callback=None):
+    """
+    Records the timings, image totals and CPU time of each group and yields
+    its fragments.
+    """
+    for fragments, observations, image_stats, cpu_seconds in group_results:
+        replay(observations)
+        generator.image_processor.merge_stats(image_stats)
+        if cpu_callback:
+            cpu_callback(cpu_seconds)
+        yield fragments
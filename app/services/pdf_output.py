@@ -0,0 +1,137 @@
+import os
+import fitz
+from app.utils.memory import current_rss_bytes
+
+# Options applied when the output is saved, by profile name
+SAVE_PROFILES = {
+    # Minimal processing for the lowest latency; content streams stay uncompressed
+    "fast": {"options": {}, "subset_fonts": False},
+    # Drops unused and duplicate objects, compresses every stream and
+    # subsets embedded fonts: smaller downloads for more time spent saving
+    "compact": {
+        "options": {"garbage": 4, "clean": True, "deflate": True, "deflate_images": True,
+                    "deflate_fonts": True, "use_objstms": 1},
+        "subset_fonts": True
+    }
+}
+# The subset of save options an incremental save accepts
+INCREMENTAL_OPTIONS = ("deflate", "deflate_images", "deflate_fonts")
+
+def _save(doc, path, profile, incremental=False, document_id=None):
+    """
+    Saves doc to path with the options of a SAVE_PROFILES entry. With a
+    document_id (32 hex digits) the trailer ID is set to it instead of a new
+    random one; fitz writes no dates, so the file is then reproducible.
+    """
+    if profile["subset_fonts"]:
+        doc.subset_fonts()
+    options = profile["options"]
+    if document_id:
+        doc.xref_set_key(-1, "ID", f"[<{document_id}><{document_id}>]")
+        options = dict(options, no_new_id=True)
+    if incremental:
+        options = {key: value for key, value in options.items()
+                   if key in INCREMENTAL_OPTIONS or key == "no_new_id"}
+        doc.save(path, incremental=True, encryption=fitz.PDF_ENCRYPT_KEEP, **options)
+    else:
+        doc.save(path, **options)
+
+class DocumentOutput:
+    """Builds the whole output in one in-memory document saved at the end."""
+
+    def __init__(self, output_pdf_path, save_profile="fast", document_id=None):
+        self.output_pdf_path = output_pdf_path
+        self.save_profile = SAVE_PROFILES[save_profile]
+        self.document_id = document_id  # Fixed trailer ID, see _save
+        self.doc = fitz.open()
+        self.toc = []  # Outline set on the finished output
+        # Called with the finished document to insert pages before the content
+        self.front_matter = None
+        self.peak_rss_bytes = current_rss_bytes()
+
+    @property
+    def page_count(self):
+        return len(self.doc)
+
+    def sample_memory(self):
+        rss = current_rss_bytes()
+        if rss is not None and (self.peak_rss_bytes is None or rss > self.peak_rss_bytes):
+            self.peak_rss_bytes = rss
+
+    def file_done(self):
+        """Called after each input file has been appended to doc."""
+        self.sample_memory()
+
+    def finish(self):
+        if self.front_matter:
+            self.front_matter(self.doc)
+        if self.toc:
+            self.doc.set_toc(self.toc)
+        _save(self.doc, self.output_pdf_path, self.save_profile,
+              document_id=self.document_id)
+        self.sample_memory()
+        self.doc.close()
+
+    def abort(self):
+        self.doc.close()
+
+class ChunkedOutput(DocumentOutput):
+    """
+    Low-memory output: pages are collected in a small chunk document that is
+    appended to the output file with an incremental save once it holds
+    flush_pages pages, so memory stays bounded regardless of input size.
+    Incremental saves cannot collect garbage, so only the stream compression
+    of a save profile applies after the first chunk.
+    """
+
+    def __init__(self, output_pdf_path, flush_pages, save_profile="fast", document_id=None):
+        super().__init__(output_pdf_path, save_profile, document_id)
+        self.flush_pages = max(1, flush_pages)
+        self.pages_flushed = 0
+
+    @property
+    def page_count(self):
+        return self.pages_flushed + len(self.doc)
+
+    def file_done(self):
+        if len(self.doc) >= self.flush_pages:
+            self.flush()
+        self.sample_memory()
+
+    def flush(self):
+        """Appends the current chunk to the output file and starts a new one."""
+        if not len(self.doc):
+            return
+        if self.pages_flushed == 0:
+            _save(self.doc, self.output_pdf_path, self.save_profile,
+                  document_id=self.document_id)
+        else:
+            with fitz.open(self.output_pdf_path) as output:
+                output.insert_pdf(self.doc)
+                _save(output, self.output_pdf_path, self.save_profile, incremental=True,
+                      document_id=self.document_id)
+        self.sample_memory()
+        self.pages_flushed += len(self.doc)
+        self.doc.close()
+        self.doc = fitz.open()
+
+    def finish(self):
+        if self.pages_flushed == 0:
+            # Nothing written yet: a plain save, which also rejects empty output
+            super().finish()
+            return
+        self.flush()
+        self.doc.close()
+        if self.front_matter or self.toc:
+            with fitz.open(self.output_pdf_path) as output:
+                if self.front_matter:
+                    self.front_matter(output)
+                if self.toc:
+                    output.set_toc(self.toc)
+                _save(output, self.output_pdf_path, self.save_profile, incremental=True,
+                      document_id=self.document_id)
+
+    def abort(self):
+        self.doc.close()
+        if self.pages_flushed and os.path.exists(self.output_pdf_path):
+            os.remove(self.output_pdf_path)
@@ -0,0 +1,120 @@
+import hashlib
+import json
+import os
+import secrets
+from threading import Lock
+from app.config.settings import Config
+from app.services.file_processor import FileProcessor
+
+class RenderCache:
+    """
+    Content-addressed, size-bounded disk cache of per-file PDF fragments.
+    Entries are keyed by the source file's content hash plus the layout
+    settings that affect its pages, and evicted least recently used first.
+    """
+    _instance = None
+    _lock = Lock()
+
+    def __new__(cls):
+        if cls._instance is None:
+            cls._instance = super(RenderCache, cls).__new__(cls)
+            cls._instance._initialize()
+        return cls._instance
+
+    def _initialize(self):
+        self.cache_dir = Config.RENDER_CACHE_DIR
+        self.max_bytes = Config.RENDER_CACHE_MAX_BYTES
+        self.hits = 0
+        self.misses = 0
+        os.makedirs(self.cache_dir, exist_ok=True)
+        self._total_bytes = sum(size for _, _, size in self._entries())
+
+    @staticmethod
+    def hash_file(file_path):
+        """Returns the SHA-256 hex digest of a file's (or ZipMember's) content."""
+        digest = hashlib.sha256()
+        with FileProcessor.open_binary(file_path) as f:
+            for chunk in iter(lambda: f.read(1024 * 1024), b""):
+                digest.update(chunk)
+        return digest.hexdigest()
+
+    @staticmethod
+    def make_key(content_hash, layout):
+        """Combines a content hash with the layout settings into a cache key."""
+        layout_json = json.dumps(layout, sort_keys=True)
+        return hashlib.sha256(f"{content_hash}:{layout_json}".encode()).hexdigest()
+
+    def _path(self, key):
+        return os.path.join(self.cache_dir, f"{key}.pdf")
+
+    def get(self, key):
+        """Returns the cached fragment bytes for key, or None on a miss."""
+        path = self._path(key)
+        try:
+            with open(path, "rb") as f:
+                data = f.read()
+            # Bump the modification time so eviction treats it as recently used
+            os.utime(path)
+        except FileNotFoundError:
+            with self._lock:
+                self.misses += 1
+            return None
+        with self._lock:
+            self.hits += 1
+        return data
+
+    def put(self, key, data):
+        """Stores a fragment and evicts old entries if over the size limit."""
+        path = self._path(key)
+        tmp_path = f"{path}.{secrets.token_hex(4)}.tmp"
+        try:
+            with open(tmp_path, "wb") as f:
+                f.write(data)
+            os.replace(tmp_path, path)
+        except OSError as e:
+            print(f"Failed to cache fragment {key}. Reason: {e}")
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            return
+        with self._lock:
+            self._total_bytes += len(data)
+            if self._total_bytes > self.max_bytes:
+                self._evict()
+
+    def _entries(self):
+        """Yields (path, mtime, size) for every cached fragment."""
+        for entry in os.scandir(self.cache_dir):
+            if not entry.name.endswith(".pdf"):
+                continue
+            try:
+                stat = entry.stat()
+            except FileNotFoundError:
+                continue
+            yield entry.path, stat.st_mtime, stat.st_size
+
+    def _evict(self):
+        """Removes least recently used fragments down to 90% of the limit."""
+        entries = sorted(self._entries(), key=lambda entry: entry[1])
+        total = sum(size for _, _, size in entries)
+        target = self.max_bytes * 0.9
+        for path, _, size in entries:
+            if total <= target:
+                break
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+            total -= size
+        self._total_bytes = total
+
+    def get_stats(self):
+        """Returns hit/miss counters and the cache's current size."""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_ratio": round(self.hits / lookups, 4) if lookups else 0.0,
+                "bytes": self._total_bytes,
+                "max_bytes": self.max_bytes
+            }
@@ -0,0 +1,152 @@
+import hashlib
+import json
+import os
+import secrets
+import shutil
+from threading import Lock
+import fitz
+from app.config.settings import Config
+from app.services.pdf_generator import RENDER_VERSION
+from app.services.render_cache import RenderCache
+
+class ResultStore:
+    """
+    Size-bounded disk store of finished outputs in deterministic mode, keyed
+    by a hash of the inputs and settings (see make_key), so a repeat
+    conversion is served from storage instead of being rendered again.
+    Entries are evicted least recently used first.
+    """
+    _instance = None
+    _lock = Lock()
+    STATS_SUFFIX = ".json"
+
+    def __new__(cls):
+        if cls._instance is None:
+            cls._instance = super(ResultStore, cls).__new__(cls)
+            cls._instance._initialize()
+        return cls._instance
+
+    def _initialize(self):
+        self.store_dir = Config.RESULT_STORE_DIR
+        self.max_bytes = Config.RESULT_STORE_MAX_BYTES
+        self.hits = 0
+        self.misses = 0
+        os.makedirs(self.store_dir, exist_ok=True)
+        self._total_bytes = sum(size for _, _, size in self._entries())
+
+    @staticmethod
+    def _engine():
+        """
+        Configuration besides the conversion settings that changes output
+        bytes. Worker count and render cache do not: deterministic output is
+        always assembled from per-file fragments.
+        """
+        return [RENDER_VERSION, fitz.VersionBind, Config.DEFAULT_FONT_SIZE,
+                Config.DEFAULT_LINE_HEIGHT, Config.MAX_CHARS_PER_LINE, Config.TAB_SIZE,
+                sorted(Config.TEXT_EXTENSIONS), sorted(Config.IMAGE_EXTENSIONS),
+                Config.IMAGE_DOWNSCALE_ENABLED, Config.IMAGE_TARGET_DPI,
+                Config.IMAGE_JPEG_QUALITY, Config.RESCALE_PDF_INPUTS, Config.PDF_PAGE_BUDGET,
+                Config.PDF_LOW_MEMORY, Config.PDF_FLUSH_PAGES]
+
+    @staticmethod
+    def make_key(settings, file_paths, base_dir, content_hashes):
+        """
+        Hash of a conversion: its settings (but not the output name), the
+        engine configuration and each input's path relative to base_dir and
+        content hash. Hashes missing from content_hashes are added to it, so
+        the render cache does not read the files again.
+        """
+        inputs = []
+        for file_path in file_paths:
+            if file_path not in content_hashes:
+                content_hashes[file_path] = RenderCache.hash_file(file_path)
+            inputs.append([os.path.relpath(file_path, base_dir).replace("\\", "/"),
+                           content_hashes[file_path]])
+        conversion = {key: value for key, value in settings.items() if key != "pdf_name"}
+        data = json.dumps([ResultStore._engine(), conversion, inputs], sort_keys=True)
+        return hashlib.sha256(data.encode()).hexdigest()
+
+    def _path(self, key, extension):
+        return os.path.join(self.store_dir, f"{key}{extension}")
+
+    def get(self, key, extension, target_path):
+        """
+        Places the stored output for key at target_path (a hard link where
+        possible) and returns its run statistics, or None on a miss.
+        """
+        path = self._path(key, extension)
+        try:
+            with open(path + self.STATS_SUFFIX) as f:
+                stats = json.load(f)
+            try:
+                os.link(path, target_path)
+            except OSError:
+                shutil.copyfile(path, target_path)
+            # Bump the modification time so eviction treats it as recently used
+            os.utime(path)
+        except (OSError, ValueError):
+            with self._lock:
+                self.misses += 1
+            return None
+        with self._lock:
+            self.hits += 1
+        return stats
+
+    def put(self, key, extension, output_path, stats):
+        """Stores a finished output and evicts old entries if over the size limit."""
+        path = self._path(key, extension)
+        tmp_path = f"{path}.{secrets.token_hex(4)}.tmp"
+        try:
+            shutil.copyfile(output_path, tmp_path)
+            with open(tmp_path + self.STATS_SUFFIX, "w") as f:
+                json.dump(stats, f)
+            # Statistics first: an output is only served once they exist
+            os.replace(tmp_path + self.STATS_SUFFIX, path + self.STATS_SUFFIX)
+            os.replace(tmp_path, path)
+        except OSError as e:
+            print(f"Failed to store result {key}. Reason: {e}")
+            for leftover in (tmp_path, tmp_path + self.STATS_SUFFIX):
+                if os.path.exists(leftover):
+                    os.remove(leftover)
+            return
+        with self._lock:
+            self._total_bytes += os.path.getsize(path)
+            if self._total_bytes > self.max_bytes:
+                self._evict()
+
+    def _entries(self):
+        """Yields (path, mtime, size) for every stored output."""
+        for entry in os.scandir(self.store_dir):
+            if entry.name.endswith((self.STATS_SUFFIX, ".tmp")):
+                continue
+            try:
+                stat = entry.stat()
+            except FileNotFoundError:
+                continue
+            yield entry.path, stat.st_mtime, stat.st_size
+
+    def _evict(self):
+        """Removes least recently used outputs down to 90% of the limit."""
+        entries = sorted(self._entries(), key=lambda entry: entry[1])
+        total = sum(size for _, _, size in entries)
+        target = self.max_bytes * 0.9
+        for path, _, size in entries:
+            if total <= target:
+                break
+            for stale in (path, path + self.STATS_SUFFIX):
+                try:
+                    os.remove(stale)
+                except FileNotFoundError:
+                    pass
+            total -= size
+        self._total_bytes = total
+
+    def get_stats(self):
+        """Returns hit/miss counters and the store's current size."""
+        with self._lock:
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "bytes": self._total_bytes,
+                "max_bytes": self.max_bytes
+            }
@@ -0,0 +1,208 @@
+import hashlib
+import os
+import re
+from collections import OrderedDict
+from threading import Lock
+from app.config.settings import Config
+
+# Style characters: one per content character; PLAIN text is drawn in black
+PLAIN = " "
+KEYWORD = "k"
+STRING = "s"
+COMMENT = "c"
+NUMBER = "n"
+STYLE_COLORS = {
+    PLAIN: (0, 0, 0),
+    KEYWORD: (0, 0, 0.55),
+    STRING: (0.6, 0.1, 0.1),
+    COMMENT: (0.3, 0.45, 0.3),
+    NUMBER: (0.45, 0.1, 0.5),
+}
+_FILL_OPERATORS = {style: "%g %g %g rg" % color for style, color in STYLE_COLORS.items()}
+_RUN = re.compile(r"(.)\1*", re.S)
+
+NUMBER_PATTERN = r"\b(?:0[xX][\da-fA-F_]+|\d[\d_]*(?:\.\d+)?(?:[eE][+-]?\d+)?)\b"
+C_COMMENTS = [r"//[^\n]*", r"/\*[\s\S]*?(?:\*/|\Z)"]
+C_STRINGS = [r'"(?:\\.|[^"\\\n])*"?', r"'(?:\\.|[^'\\\n])*'?"]
+
+class Lexer:
+    """
+    Tokenizer for one language, compiled into a single regular expression.
+    Only highlighted tokens are matched; everything else stays plain.
+    """
+
+    def __init__(self, name, comments=(), strings=(), keywords=(), numbers=True,
+                 extra_keywords=(), ignore_case=False):
+        self.name = name
+        patterns = [(COMMENT, p) for p in comments] + [(STRING, p) for p in strings]
+        patterns += [(KEYWORD, p) for p in extra_keywords]
+        if keywords:
+            words = "|".join(sorted(keywords, key=len, reverse=True))
+            patterns.append((KEYWORD, rf"\b(?:{words})\b"))
+        if numbers:
+            patterns.append((NUMBER, NUMBER_PATTERN))
+        self._styles = {}
+        groups = []
+        for index, (style, pattern) in enumerate(patterns):
+            group = f"g{index}"
+            self._styles[group] = style
+            groups.append(f"(?P<{group}>{pattern})")
+        flags = re.M | (re.I if ignore_case else 0)
+        self.regex = re.compile("|".join(groups), flags)
+
+    def styles(self, content):
+        """Style string of content: one style character per character."""
+        parts = []
+        append = parts.append
+        position = 0
+        group_styles = self._styles
+        for match in self.regex.finditer(content):
+            start, end = match.span()
+            append(PLAIN * (start - position))
+            append(group_styles[match.lastgroup] * (end - start))
+            position = end
+        append(PLAIN * (len(content) - position))
+        return "".join(parts)
+
+PYTHON_KEYWORDS = (
+    "False None True and as assert async await break class continue def del elif else "
+    "except finally for from global if import in is lambda nonlocal not or pass raise "
+    "return try while with yield self match case").split()
+JS_KEYWORDS = (
+    "break case catch class const continue debugger default delete do else export "
+    "extends false finally for function if import in instanceof let new null return "
+    "super switch this throw true try typeof undefined var void while with yield async "
+    "await of static get set").split()
+JAVA_KEYWORDS = (
+    "abstract assert boolean break byte case catch char class const continue default "
+    "do double else enum extends false final finally float for if implements import "
+    "instanceof int interface long native new null package private protected public "
+    "return short static super switch synchronized this throw throws transient true "
+    "try var void volatile while record").split()
+C_KEYWORDS = (
+    "auto bool break case char const continue default do double else enum extern "
+    "false float for goto if inline int long register return short signed sizeof "
+    "static struct switch true typedef union unsigned void volatile while NULL "
+    "nullptr class namespace template typename public private protected virtual "
+    "override new delete this using try catch throw operator friend constexpr "
+    "explicit noexcept auto std").split()
+PHP_KEYWORDS = (
+    "abstract and array as break case catch class clone const continue declare default "
+    "do echo else elseif empty extends false final finally fn for foreach function "
+    "global if implements include include_once instanceof interface isset list match "
+    "namespace new null or print private protected public require require_once return "
+    "static switch this throw trait true try unset use var while yield").split()
+SQL_KEYWORDS = (
+    "add all alter and as asc begin between by case check column commit constraint "
+    "create cross database default delete desc distinct drop else end exists foreign "
+    "from full group having if in index inner insert into is join key left like limit "
+    "not null offset on or order outer primary references right rollback select set "
+    "table then transaction union unique update values view when where with").split()
+
+PYTHON = Lexer("python",
+               comments=[r"#[^\n]*"],
+               strings=[r"'''[\s\S]*?(?:'''|\Z)", r'"""[\s\S]*?(?:"""|\Z)'] + C_STRINGS,
+               keywords=PYTHON_KEYWORDS)
+JAVASCRIPT = Lexer("javascript", comments=C_COMMENTS,
+                   strings=C_STRINGS + [r"`(?:\\.|[^`\\])*`?"], keywords=JS_KEYWORDS)
+JAVA = Lexer("java", comments=C_COMMENTS, strings=C_STRINGS, keywords=JAVA_KEYWORDS)
+C = Lexer("c", comments=C_COMMENTS, strings=C_STRINGS, keywords=C_KEYWORDS,
+          extra_keywords=[r"^[ \t]*#[ \t]*\w+"])
+PHP = Lexer("php", comments=C_COMMENTS + [r"#[^\n]*"], strings=C_STRINGS,
+            keywords=PHP_KEYWORDS)
+SQL = Lexer("sql", comments=[r"--[^\n]*", r"/\*[\s\S]*?(?:\*/|\Z)"],
+            strings=[r"'(?:''|[^'])*'?"], keywords=SQL_KEYWORDS, ignore_case=True)
+CSS = Lexer("css", comments=[r"/\*[\s\S]*?(?:\*/|\Z)"], strings=C_STRINGS,
+            extra_keywords=[r"@[\w-]+", r"#[\da-fA-F]{3,8}\b"])
+HTML = Lexer("html", comments=[r"<!--[\s\S]*?(?:-->|\Z)"],
+             strings=[r'(?<==)"[^"]*"', r"(?<==)'[^']*'"],
+             extra_keywords=[r"</?[A-Za-z][\w:-]*", r"/?>"], numbers=False)
+JSON = Lexer("json", strings=[r'"(?:\\.|[^"\\\n])*"?'], keywords=["true", "false", "null"])
+
+# Language detection: lexer for each file extension
+LEXERS = {
+    ".py": PYTHON,
+    ".js": JAVASCRIPT,
+    ".java": JAVA,
+    ".c": C,
+    ".cpp": C,
+    ".php": PHP,
+    ".sql": SQL,
+    ".css": CSS,
+    ".html": HTML,
+    ".json": JSON,
+}
+
+_style_cache = OrderedDict()
+_style_cache_bytes = 0
+_style_cache_lock = Lock()
+
+class SyntaxHighlighter:
+    @staticmethod
+    def lexer_for(file_path):
+        """The lexer for a file's extension, or None if it is not highlighted."""
+        return LEXERS.get(os.path.splitext(file_path)[1].lower())
+
+    @staticmethod
+    def styles(lexer, content, content_key=None):
+        """
+        Style string of content, cached in memory so repeated conversions skip
+        tokenizing. content_key identifies content (e.g. the file's hash and
+        tab size); it defaults to the content's SHA-256.
+        """
+        global _style_cache_bytes
+        key = (content_key or hashlib.sha256(content.encode("utf-8")).hexdigest(), lexer.name)
+        with _style_cache_lock:
+            styles = _style_cache.pop(key, None)
+            if styles is not None:
+                _style_cache[key] = styles
+                return styles
+        styles = lexer.styles(content)
+        with _style_cache_lock:
+            if key not in _style_cache:
+                _style_cache[key] = styles
+                _style_cache_bytes += len(styles)
+            while _style_cache_bytes > Config.HIGHLIGHT_CACHE_MAX_BYTES:
+                _, evicted = _style_cache.popitem(last=False)
+                _style_cache_bytes -= len(evicted)
+        return styles
+
+    @staticmethod
+    def _encode(text):
+        # As insert_text encodes for the base-14 fonts: Latin-1, other characters as "·"
+        try:
+            return text.encode("latin-1")
+        except UnicodeEncodeError:
+            return "".join(c if c < "\u0100" else "\xb7" for c in text).encode("latin-1")
+
+    @staticmethod
+    def draw_lines(doc, page, point, lines, fontsize, line_height):
+        """
+        Draws styled (text, styles) lines in courier from baseline point.
+        The whole block is written as one content stream, switching the fill
+        color between runs of equally styled characters.
+        """
+        page.insert_font(fontname="courier")
+        encode = SyntaxHighlighter._encode
+        operators = [f"q\nBT\n1 0 0 1 {point[0]:g} {page.rect.height - point[1]:g} Tm\n"
+                     f"/courier {fontsize:g} Tf\n{line_height:g} TL\n"]
+        append = operators.append
+        current = None
+        for text, styles in lines:
+            data = encode(text)
+            for match in _RUN.finditer(styles):
+                style = match.group(1)
+                if style != current:
+                    append(_FILL_OPERATORS[style])
+                    current = style
+                start, end = match.span()
+                append(f"[<{data[start:end].hex()}>]TJ")
+            append("T*\n")
+        append("ET\nQ\n")
+
+        xref = doc.get_new_xref()
+        doc.update_object(xref, "<<>>")
+        doc.update_stream(xref, " ".join(operators).encode("latin-1"))
+        contents = page.get_contents() + [xref]
+        doc.xref_set_key(page.xref, "Contents",
+                         "[" + " ".join(f"{x} 0 R" for x in contents) + "]")
@@ -0,0 +1,177 @@
+import hashlib
+import io
+import os
+import zipfile
+from flask import Request
+from werkzeug.exceptions import HTTPException
+from werkzeug.utils import secure_filename
+from app.config.settings import Config
+from app.services.file_processor import FileProcessor
+
+ZIP_MAGIC = b"PK\x03\x04"
+# Members smaller than this are not checked for their compression ratio
+ZIP_RATIO_MIN_BYTES = 1024 * 1024
+
+class UploadRejected(HTTPException):
+    """Raised while an upload is streaming in, as soon as it is known to be invalid."""
+    code = 400
+
+    def __init__(self, description, code=None):
+        super().__init__(description)
+        if code is not None:
+            self.code = code
+
+class StreamedUpload(io.FileIO):
+    """
+    Upload container that writes straight to its final path in the workspace,
+    hashing the content and enforcing the size quota chunk by chunk.
+    """
+
+    def __init__(self, path, filename, quota):
+        super().__init__(path, "w+b")
+        self.path = path
+        self.filename = filename
+        self.size = 0
+        self.is_zip = filename.lower().endswith(".zip")
+        self._quota = quota
+        self._digest = hashlib.sha256()
+        self._head = b""
+        # Supported input in the upload (the ZIP's members), set by finish()
+        self.input_bytes = 0
+        self.input_files = 0
+
+    def write(self, data):
+        self.size += len(data)
+        self._quota.remaining -= len(data)
+        if self._quota.remaining < 0:
+            self._reject("Upload exceeds the maximum upload size.", 413)
+        if self.is_zip and len(self._head) < len(ZIP_MAGIC):
+            self._head += bytes(data[:len(ZIP_MAGIC) - len(self._head)])
+            if not ZIP_MAGIC.startswith(self._head):
+                self._reject(f"{self.filename} is not a valid ZIP archive.")
+        self._digest.update(data)
+        return super().write(data)
+
+    def _reject(self, message, code=None):
+        self.close()
+        try:
+            os.remove(self.path)
+        except FileNotFoundError:
+            pass
+        raise UploadRejected(message, code)
+
+    @property
+    def sha256(self):
+        return self._digest.hexdigest()
+
+    def finish(self):
+        """
+        Called once the part is complete. For ZIPs, checks the central
+        directory before anything is extracted: the member count and
+        expanded size (across the request's ZIPs) and each member's
+        compression ratio. Extraction stops at the sizes declared there.
+        """
+        if not self.is_zip:
+            if FileProcessor.is_supported_file(self.filename):
+                self.input_bytes = self.size
+                self.input_files = 1
+            return
+        try:
+            with zipfile.ZipFile(self.path) as zip_ref:
+                members = zip_ref.infolist()
+        except zipfile.BadZipFile:
+            self._reject(f"{self.filename} is not a valid ZIP archive.")
+        self._quota.zip_members -= len(members)
+        if self._quota.zip_members < 0:
+            self._reject(f"{self.filename} contains too many files.", 413)
+        self._quota.uncompressed -= sum(member.file_size for member in members)
+        if self._quota.uncompressed < 0:
+            self._reject(f"{self.filename} expands beyond the allowed size.", 413)
+        for member in members:
+            if (member.file_size > ZIP_RATIO_MIN_BYTES and
+                    member.file_size > member.compress_size * Config.MAX_ZIP_MEMBER_RATIO):
+                self._reject(f"{self.filename} contains a suspiciously compressed file.", 413)
+            if not member.is_dir() and FileProcessor.is_supported_file(member.filename):
+                self.input_bytes += member.file_size
+                self.input_files += 1
+
+class DiscardedUpload(io.BytesIO):
+    """Container for file parts without a usable file name; their bytes are dropped."""
+
+    def __init__(self, filename):
+        super().__init__()
+        self.filename = filename
+
+    def write(self, data):
+        return len(data)
+
+class _UploadQuota:
+    def __init__(self, limit):
+        self.remaining = limit
+        self.uncompressed = Config.MAX_UNCOMPRESSED_ZIP_BYTES
+        self.zip_members = Config.MAX_ZIP_MEMBERS
+
+class StreamingRequest(Request):
+    """
+    Request whose multipart file parts stream into upload_dir as they arrive,
+    instead of being buffered to temporary files first. Routes set upload_dir
+    before touching request.files; otherwise the default behaviour applies.
+    """
+    upload_dir = None
+
+    def _get_file_stream(self, total_content_length, content_type,
+                         filename=None, content_length=None):
+        if self.upload_dir is None:
+            return super()._get_file_stream(total_content_length, content_type,
+                                            filename, content_length)
+        if not hasattr(self, "_upload_quota"):
+            self._upload_quota = _UploadQuota(Config.MAX_CONTENT_LENGTH)
+
+        safe_name = secure_filename(filename or "")
+        if not safe_name:
+            # An empty file input, or a name with nothing usable left
+            return DiscardedUpload(safe_name)
+        extension = os.path.splitext(safe_name)[1].lower()
+        if (extension != ".zip" and extension not in Config.TEXT_EXTENSIONS and
+                extension not in Config.IMAGE_EXTENSIONS):
+            # Members of ZIPs are filtered instead; a part is the user's own choice
+            raise UploadRejected(f"{safe_name} is not a supported file type.", 415)
+        return StreamedUpload(os.path.join(self.upload_dir, safe_name),
+                              safe_name, self._upload_quota)
+
+def collect_uploads(uploaded_files, upload_dir, totals=None):
+    """
+    Finishes the streamed parts of a request; parts that were not streamed
+    are saved into upload_dir as before.
+    Returns (paths, content hashes by path) of the accepted uploads. If given,
+    totals is updated with the "bytes" and "files" of supported input in them
+    (ZIP members counted from the central directory) for admission control.
+    """
+    if totals is not None:
+        totals.setdefault("bytes", 0)
+        totals.setdefault("files", 0)
+    upload_paths = []
+    content_hashes = {}
+    for file in uploaded_files:
+        stream = file.stream
+        if isinstance(stream, DiscardedUpload):
+            continue
+        if not isinstance(stream, StreamedUpload):
+            filename = secure_filename(file.filename)
+            if filename:
+                file_path = os.path.join(upload_dir, filename)
+                file.save(file_path)
+                upload_paths.append(file_path)
+                if totals is not None:
+                    totals["bytes"] += os.path.getsize(file_path)
+                    totals["files"] += 1
+            continue
+        stream.finish()
+        stream.close()
+        upload_paths.append(stream.path)
+        if totals is not None:
+            totals["bytes"] += stream.input_bytes
+            totals["files"] += stream.input_files
+        if not stream.is_zip:
+            content_hashes[stream.path] = stream.sha256
+    return upload_paths, content_hashes
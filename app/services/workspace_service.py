@@ -0,0 +1,139 @@
+import os
+import re
+import secrets
+import shutil
+import time
+from threading import Lock, Thread
+from app.config.settings import Config
+
+class WorkspaceService:
+    """
+    Gives every conversion its own directory under Config.WORKSPACE_ROOT and
+    expires finished workspaces by age and total disk quota.
+    """
+    _instance = None
+    _lock = Lock()
+    ACTIVE_MARKER = ".active"
+    # Server-side files of a workspace; secure_filename never yields a leading dot,
+    # so no upload can land here
+    CONTROL_DIR = ".job"
+    _ID_PATTERN = re.compile(r"^[0-9a-f]{32}$")
+
+    def __new__(cls):
+        if cls._instance is None:
+            cls._instance = super(WorkspaceService, cls).__new__(cls)
+            cls._instance.root = Config.WORKSPACE_ROOT
+            cls._instance._reaper = None
+            os.makedirs(cls._instance.root, exist_ok=True)
+        return cls._instance
+
+    def create(self):
+        """Creates an active workspace and returns (workspace_id, path)."""
+        workspace_id = secrets.token_hex(16)
+        path = os.path.join(self.root, workspace_id)
+        os.makedirs(os.path.join(path, self.CONTROL_DIR))
+        open(os.path.join(path, self.ACTIVE_MARKER), "w").close()
+        return workspace_id, path
+
+    @staticmethod
+    def control_dir(workspace_dir):
+        """Directory of a workspace's job state, apart from its uploads (None for None)."""
+        if workspace_dir is None:
+            return None
+        return os.path.join(workspace_dir, WorkspaceService.CONTROL_DIR)
+
+    def path(self, workspace_id):
+        """Returns the directory of an existing workspace, or None."""
+        if not workspace_id or not self._ID_PATTERN.match(workspace_id):
+            return None
+        path = os.path.join(self.root, workspace_id)
+        return path if os.path.isdir(path) else None
+
+    def activate(self, workspace_id):
+        """Protects an existing workspace from the reaper while it is in use."""
+        path = self.path(workspace_id)
+        if path is not None:
+            open(os.path.join(path, self.ACTIVE_MARKER), "w").close()
+        return path
+
+    def release(self, workspace_id):
+        """Marks a workspace finished; its expiry age counts from now."""
+        path = self.path(workspace_id)
+        if path is None:
+            return
+        try:
+            os.remove(os.path.join(path, self.ACTIVE_MARKER))
+        except FileNotFoundError:
+            pass
+        os.utime(path)
+
+    def _is_active(self, path, now):
+        """Active workspaces are kept unless their marker has gone stale."""
+        try:
+            marker_mtime = os.path.getmtime(os.path.join(path, self.ACTIVE_MARKER))
+        except FileNotFoundError:
+            return False
+        return now - marker_mtime < Config.WORKSPACE_ACTIVE_TIMEOUT
+
+    @staticmethod
+    def dir_size(path):
+        """Bytes of the files below path."""
+        total = 0
+        for root, _, files in os.walk(path):
+            for file in files:
+                try:
+                    total += os.path.getsize(os.path.join(root, file))
+                except OSError:
+                    pass
+        return total
+
+    def reap(self):
+        """
+        Removes finished workspaces older than Config.WORKSPACE_TTL, then the
+        oldest finished ones until the total fits Config.WORKSPACE_QUOTA_BYTES.
+        Returns the number of workspaces removed.
+        """
+        now = time.time()
+        finished = []
+        total = 0
+        removed = 0
+        for entry in os.scandir(self.root):
+            if not entry.is_dir() or not self._ID_PATTERN.match(entry.name):
+                continue
+            try:
+                mtime = entry.stat().st_mtime
+            except FileNotFoundError:
+                continue
+            active = self._is_active(entry.path, now)
+            if not active and now - mtime > Config.WORKSPACE_TTL:
+                shutil.rmtree(entry.path, ignore_errors=True)
+                removed += 1
+                continue
+            size = self.dir_size(entry.path)
+            total += size
+            if not active:
+                finished.append((mtime, size, entry.path))
+
+        for _, size, path in sorted(finished):
+            if total <= Config.WORKSPACE_QUOTA_BYTES:
+                break
+            shutil.rmtree(path, ignore_errors=True)
+            total -= size
+            removed += 1
+        return removed
+
+    def _reap_forever(self):
+        while True:
+            time.sleep(Config.WORKSPACE_REAP_INTERVAL)
+            try:
+                self.reap()
+            except Exception as e:
+                print(f"Workspace reaper failed. Reason: {e}")
+
+    def start_reaper(self):
+        """Starts the background reaper thread once per process."""
+        with self._lock:
+            if self._reaper is None:
+                self._reaper = Thread(target=self._reap_forever,
+                                      name="workspace-reaper", daemon=True)
+                self._reaper.start()
@@ -0,0 +1,21 @@
+import os
+
+def current_rss_bytes():
+    """
+    Returns the resident set size of the current process in bytes.
+    Falls back to the lifetime peak where /proc is unavailable, and to None
+    on platforms without either.
+    """
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, IndexError, AttributeError):
+        pass
+    try:
+        import resource
+        import sys
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        # ru_maxrss is in bytes on macOS and kilobytes elsewhere
+        return peak if sys.platform == "darwin" else peak * 1024
+    except (ImportError, OSError):
+        return None
@@ -0,0 +1,80 @@
+def wrap_code(content, width, tab_size=4):
+    """
+    Wraps a whole file's content into lines of at most width characters for
+    a monospaced font.
+    Tabs are expanded, blank lines and leading indentation are kept, long
+    lines break at the last space that fits and continue at their original
+    indentation, and tokens longer than a line are split.
+    """
+    lines = []
+    append = lines.append
+    for line in content.expandtabs(tab_size).splitlines():
+        if len(line) <= width:
+            append(line)
+        else:
+            lines.extend(_wrap_long_line(line, width))
+    return lines
+
+def iter_wrapped(lines, width, tab_size=4):
+    """
+    Lazy wrap_code over an iterable of lines without line breaks, for
+    content that is produced while it is laid out.
+    """
+    for line in lines:
+        line = line.expandtabs(tab_size)
+        if len(line) <= width:
+            yield line
+        else:
+            yield from _wrap_long_line(line, width)
+
+def wrap_styled(content, styles, width):
+    """
+    wrap_code for content whose tabs are already expanded, carrying along
+    styles: a string with one style character per content character.
+    Returns (line, line styles) pairs; indentation added to continuation
+    lines gets the style of a space.
+    """
+    lines = []
+    append = lines.append
+    offset = 0
+    for line, raw in zip(content.splitlines(), content.splitlines(True)):
+        line_styles = styles[offset:offset + len(line)]
+        offset += len(raw)
+        if len(line) <= width:
+            append((line, line_styles))
+        else:
+            for prefix, start, end in _wrap_spans(line, width):
+                append((" " * prefix + line[start:end], " " * prefix + line_styles[start:end]))
+    return lines
+
+def _wrap_long_line(line, width):
+    return [" " * prefix + line[start:end] for prefix, start, end in _wrap_spans(line, width)]
+
+def _wrap_spans(line, width):
+    """Pieces of a long line as (indent width, start, end) slices of it."""
+    indent = len(line) - len(line.lstrip(" "))
+    # Continuation lines hang at the line's indentation, up to half a line
+    continuation = min(indent, width // 2)
+    spans = []
+    prefix = 0
+    start = 0
+    floor = indent  # Never break inside the leading indentation
+    while prefix + len(line) - start > width:
+        room = width - prefix
+        cut = line.rfind(" ", start + floor + 1, start + room + 1)
+        if cut == -1:
+            spans.append((prefix, start, start + room))
+            start += room
+        else:
+            end = cut
+            while end > start and line[end - 1] == " ":
+                end -= 1
+            spans.append((prefix, start, end))
+            start = cut
+            while start < len(line) and line[start] == " ":
+                start += 1
+        prefix = continuation
+        floor = 0
+    if start < len(line):
+        spans.append((prefix, start, len(line)))
+    return spans
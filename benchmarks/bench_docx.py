@@ -0,0 +1,90 @@
+"""
+Benchmark of docx text extraction.
+
+    python -m benchmarks.bench_docx --paragraphs 100000
+
+Writes one large .docx (paragraphs and tables) and lays it out twice, each
+in a fresh process: the python-docx path (whole tree, joined text, wrapped
+at once) and the streaming path (iter_docx_lines, wrapped and paginated
+lazily). Prints the total time, the time to the first page of lines and the
+peak memory growth of each.
+"""
+import argparse
+import multiprocessing
+import os
+import random
+import shutil
+import sys
+import tempfile
+import time
+
+from docx import Document
+
+from benchmarks.bench_pipeline import MemorySampler
+from benchmarks.corpora import _code_line
+
+LINES_PER_PAGE = 60
+WIDTH = 95
+
+def _write_docx(path, paragraphs):
+    rng = random.Random(0)
+    document = Document()
+    for index in range(paragraphs):
+        document.add_paragraph(_code_line(rng, 30))
+        if index % 1000 == 999:
+            table = document.add_table(rows=20, cols=4)
+            for cell in table._cells:
+                cell.text = _code_line(rng, 4)
+    document.save(path)
+
+def _python_docx_lines(path):
+    from app.utils.text_wrap import wrap_code
+    document = Document(path)
+    content = "\n".join(para.text for para in document.paragraphs)
+    return iter(wrap_code(content, WIDTH))
+
+def _streamed_lines(path):
+    from app.services.docx_reader import iter_docx_lines
+    from app.utils.text_wrap import iter_wrapped
+    return iter_wrapped(iter_docx_lines(path), WIDTH)
+
+MODES = {"python-docx": _python_docx_lines, "streaming": _streamed_lines}
+
+def _run(mode, path, results):
+    with MemorySampler() as sampler:
+        baseline = sampler.peak or 0
+        start = time.perf_counter()
+        lines = MODES[mode](path)
+        first_page = None
+        count = 0
+        for count, _ in enumerate(lines, 1):
+            if count == LINES_PER_PAGE:
+                first_page = time.perf_counter() - start
+        total = time.perf_counter() - start
+    results.put((total, first_page or total, count, (sampler.peak or 0) - baseline))
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--paragraphs", type=int, default=100000)
+    args = parser.parse_args(argv)
+
+    scratch_dir = tempfile.mkdtemp(prefix="unifydoc-bench-")
+    try:
+        path = os.path.join(scratch_dir, "large.docx")
+        _write_docx(path, args.paragraphs)
+        print(f"input {os.path.getsize(path) / 1048576:.2f} MB")
+        context = multiprocessing.get_context("spawn")
+        for mode in MODES:
+            results = context.Queue()
+            process = context.Process(target=_run, args=(mode, path, results))
+            process.start()
+            total, first_page, count, peak = results.get()
+            process.join()
+            print(f"{mode:<12} total {total:7.3f}s  first page {first_page:7.3f}s  "
+                  f"{count} lines  peak +{peak / 1048576:7.1f} MB")
+    finally:
+        shutil.rmtree(scratch_dir, ignore_errors=True)
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
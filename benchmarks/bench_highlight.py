@@ -0,0 +1,72 @@
+"""
+Benchmark of syntax highlighting.
+
+    python -m benchmarks.bench_highlight --lines 50000
+
+Converts a generated Python repository of the given size in plain text and
+with syntax highlighting (first with an empty token cache, then a warm one)
+and prints each time relative to plain text. Exits 1 if highlighting is
+slower than --max-ratio times plain text.
+"""
+import argparse
+import os
+import random
+import shutil
+import sys
+import tempfile
+import time
+
+from app.services import syntax_highlighter
+from app.services.pdf_generator import PDFGenerator
+from benchmarks.corpora import _write_code_file
+
+def _write_repo(root, lines):
+    rng = random.Random(0)
+    paths = []
+    for index in range(lines // 500):
+        path = os.path.join(root, f"pkg{index % 10}", f"module_{index}.py")
+        _write_code_file(path, rng, 500)
+        paths.append(path)
+    return paths
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--lines", type=int, default=50000)
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--profile", default="fast", help="output save profile")
+    parser.add_argument("--max-ratio", type=float, default=1.5)
+    args = parser.parse_args(argv)
+
+    scratch_dir = tempfile.mkdtemp(prefix="unifydoc-bench-")
+    try:
+        root = os.path.join(scratch_dir, "repo")
+        file_paths = _write_repo(root, args.lines)
+        output_pdf_path = os.path.join(scratch_dir, "bench.pdf")
+
+        def convert(highlight, cold):
+            runs = []
+            for _ in range(args.repeat):
+                if cold:
+                    syntax_highlighter._style_cache.clear()
+                    syntax_highlighter._style_cache_bytes = 0
+                generator = PDFGenerator(base_dir=root, save_profile=args.profile,
+                                         syntax_highlighting=highlight)
+                start = time.perf_counter()
+                generator.generate(file_paths, output_pdf_path)
+                runs.append(time.perf_counter() - start)
+            return min(runs), os.path.getsize(output_pdf_path)
+
+        plain, plain_size = convert(False, cold=True)
+        worst = 1.0
+        for label, highlight, cold in (("plain", False, True), ("highlighted", True, True),
+                                       ("highlighted, warm", True, False)):
+            seconds, size = convert(highlight, cold) if highlight else (plain, plain_size)
+            worst = max(worst, seconds / plain)
+            print(f"{label:<18} {seconds:7.3f}s (x{seconds / plain:4.2f})  "
+                  f"output {size / 1048576:6.2f} MB")
+    finally:
+        shutil.rmtree(scratch_dir, ignore_errors=True)
+    return 1 if worst > args.max_ratio else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
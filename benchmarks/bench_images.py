@@ -0,0 +1,49 @@
+"""
+Benchmark of image preprocessing.
+
+    python -m benchmarks.bench_images --scale 0.5
+
+Converts the image_heavy corpus with image downscaling off and on and
+prints the generation time, output size and image totals of each run.
+"""
+import argparse
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+from app.config.settings import Config
+from app.services.image_processor import ImageProcessor
+from app.services.pdf_generator import PDFGenerator
+from benchmarks.corpora import build_corpus
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--scale", type=float, default=0.5, help="corpus size multiplier")
+    parser.add_argument("--dpi", type=int, default=Config.IMAGE_TARGET_DPI)
+    parser.add_argument("--workers", type=int, default=1)
+    args = parser.parse_args(argv)
+
+    scratch_dir = tempfile.mkdtemp(prefix="unifydoc-bench-")
+    try:
+        root, _ = build_corpus("image_heavy", scratch_dir, args.scale)
+        file_paths = sorted(os.path.join(folder, file)
+                            for folder, _, files in os.walk(root) for file in files)
+        output_pdf_path = os.path.join(scratch_dir, "bench.pdf")
+        for enabled in (False, True):
+            generator = PDFGenerator(workers=args.workers, base_dir=root,
+                                     image_processor=ImageProcessor(enabled, args.dpi))
+            start = time.perf_counter()
+            stats = generator.generate(file_paths, output_pdf_path)
+            seconds = time.perf_counter() - start
+            print(f"downscale {'on ' if enabled else 'off'}  {seconds:7.3f}s  "
+                  f"output {stats['output_bytes'] / 1048576:8.2f} MB  "
+                  f"images {stats['images']} ({stats['images_deduplicated']} deduplicated)  "
+                  f"image time {stats['image_seconds']:.3f}s")
+    finally:
+        shutil.rmtree(scratch_dir, ignore_errors=True)
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
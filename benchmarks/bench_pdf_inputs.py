@@ -0,0 +1,60 @@
+"""
+Benchmark of PDF input embedding.
+
+    python -m benchmarks.bench_pdf_inputs --pages 500
+
+Converts one large A4 manual to a letter-size output twice: redrawing each
+page with show_pdf_page (rescaling on) and bulk-copying it with insert_pdf
+(rescaling off), and prints the time and output size of each.
+"""
+import argparse
+import os
+import random
+import shutil
+import sys
+import tempfile
+import time
+
+import fitz
+
+from app.services.pdf_generator import PDFGenerator
+from benchmarks.corpora import _code_line
+
+def _write_manual(path, pages, page_size):
+    rng = random.Random(0)
+    doc = fitz.open()
+    for _ in range(pages):
+        page = doc.new_page(width=page_size[0], height=page_size[1])
+        page.insert_text((50, 50), "\n".join(_code_line(rng) for _ in range(60)),
+                         fontsize=9, fontname="helv")
+    doc.set_toc([[1, "Start", 1], [1, "Middle", pages // 2 + 1], [1, "End", pages]])
+    doc.save(path)
+    doc.close()
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--pages", type=int, default=500)
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args(argv)
+
+    scratch_dir = tempfile.mkdtemp(prefix="unifydoc-bench-")
+    try:
+        manual_path = os.path.join(scratch_dir, "manual.pdf")
+        _write_manual(manual_path, args.pages, (595, 842))
+        output_pdf_path = os.path.join(scratch_dir, "bench.pdf")
+        for label, rescale in (("show_pdf_page", True), ("insert_pdf", False)):
+            runs = []
+            for _ in range(args.repeat):
+                generator = PDFGenerator(page_size=(612, 792), rescale_pdf_inputs=rescale,
+                                         save_profile="fast", base_dir=scratch_dir)
+                start = time.perf_counter()
+                stats = generator.generate([manual_path], output_pdf_path)
+                runs.append(time.perf_counter() - start)
+            print(f"{label:<14} {min(runs):7.3f}s  output "
+                  f"{stats['output_bytes'] / 1048576:7.2f} MB  {stats['pages']} pages")
+    finally:
+        shutil.rmtree(scratch_dir, ignore_errors=True)
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
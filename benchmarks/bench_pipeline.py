@@ -0,0 +1,299 @@
+"""
+Benchmark harness for the conversion pipeline.
+
+    python -m benchmarks.bench_pipeline run --output results.json
+    python -m benchmarks.bench_pipeline compare baseline.json results.json
+
+`run` generates the synthetic corpora, times each pipeline stage and writes
+seconds, pages/sec, MB/sec and peak memory per corpus and stage to a JSON
+file. `compare` flags stages that got slower than a threshold between two
+result files and exits non-zero if any did.
+"""
+import argparse
+import json
+import os
+import platform
+import re
+import shutil
+import statistics
+import sys
+import tempfile
+import threading
+import time
+
+from app.config.settings import Config
+from app.utils.memory import current_rss_bytes
+from benchmarks.corpora import CORPORA, build_corpus
+
+STAGES = ["process_zip", "iter_zip", "generate", "route_index", "route_confirm",
+          "route_generate"]
+
+class MemorySampler:
+    """Polls the resident set size in a background thread to find a stage's peak."""
+
+    def __init__(self, interval=0.02):
+        self.interval = interval
+        self.peak = current_rss_bytes()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            self._sample()
+
+    def _sample(self):
+        rss = current_rss_bytes()
+        if rss is not None and (self.peak is None or rss > self.peak):
+            self.peak = rss
+
+    def __enter__(self):
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc_info):
+        self._stop.set()
+        self._thread.join()
+        self._sample()
+
+def _input_bytes(paths):
+    return sum(os.path.getsize(path) for path in paths if os.path.isfile(path))
+
+def _wait_for_job(client, status_url, timeout=3600):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        status = client.get(status_url).get_json()
+        if status["status"] not in ("queued", "processing"):
+            return status
+        time.sleep(0.05)
+    raise TimeoutError(f"Job at {status_url} did not finish")
+
+class PipelineBench:
+    """Runs every stage against one corpus inside a scratch directory."""
+
+    def __init__(self, scratch_dir, workers):
+        self.scratch_dir = scratch_dir
+        self.workers = workers
+        self._client = None
+
+    @property
+    def client(self):
+        if self._client is None:
+            from app import create_app
+            self._client = create_app().test_client()
+        return self._client
+
+    def close(self):
+        """Flushes the conversion counter while its file still exists."""
+        if self._client is not None:
+            from app.services.counter_service import CounterService
+            CounterService().flush()
+
+    def fresh_dir(self, name):
+        path = os.path.join(self.scratch_dir, name)
+        shutil.rmtree(path, ignore_errors=True)
+        os.makedirs(path)
+        return path
+
+    def stage_process_zip(self, zip_path, root):
+        from app.services.file_processor import FileProcessor
+        dest_dir = self.fresh_dir("extract")
+        paths = FileProcessor.process_zip(zip_path, dest_dir)
+        return {"bytes": os.path.getsize(zip_path), "files": len(paths)}
+
+    def stage_iter_zip(self, zip_path, root):
+        from app.services.file_processor import FileProcessor
+        members = FileProcessor.iter_zip(zip_path, self.scratch_dir)
+        FileProcessor.close_zip(zip_path)
+        return {"bytes": os.path.getsize(zip_path), "files": len(members)}
+
+    def stage_generate(self, zip_path, root):
+        from app.services.pdf_generator import PDFGenerator
+        file_paths = sorted(os.path.join(folder, file)
+                            for folder, _, files in os.walk(root) for file in files)
+        output_pdf_path = os.path.join(self.fresh_dir("output"), "bench.pdf")
+        generator = PDFGenerator(show_file_info=True, workers=self.workers,
+                                 base_dir=os.path.dirname(root))
+        stats = generator.generate(file_paths, output_pdf_path)
+        return {"bytes": _input_bytes(file_paths), "files": len(file_paths),
+                "pages": stats["pages"], "output_bytes": os.path.getsize(output_pdf_path)}
+
+    def stage_route_index(self, zip_path, root):
+        with open(zip_path, "rb") as f:
+            response = self.client.post("/", data={
+                "files": (f, os.path.basename(zip_path)),
+                "show_file_info": "1"
+            }, content_type="multipart/form-data")
+        status = _wait_for_job(self.client, response.get_json()["status_url"])
+        if status["status"] != "success":
+            raise RuntimeError(f"POST / failed: {status}")
+        return {"bytes": os.path.getsize(zip_path),
+                "files": status["progress"]["files_total"],
+                "pages": status["progress"]["pages_done"]}
+
+    def _confirm(self, zip_path):
+        with open(zip_path, "rb") as f:
+            response = self.client.post("/confirm", data={
+                "files": (f, os.path.basename(zip_path))
+            }, content_type="multipart/form-data")
+        if response.status_code != 200:
+            raise RuntimeError(f"POST /confirm failed with {response.status_code}")
+        return response.get_data(as_text=True)
+
+    def stage_route_confirm(self, zip_path, root):
+        self._confirm(zip_path)
+        return {"bytes": os.path.getsize(zip_path)}
+
+    def stage_route_generate(self, zip_path, root):
+        html = self._pending_confirm
+        workspace_id = re.search(r'name="workspace" value="([0-9a-f]+)"', html).group(1)
+        # Keep everything selected: the top-level files and folders, as the page submits them
+        root_level = json.loads(re.search(r"var rootLevel = (.*);", html).group(1))
+        response = self.client.post("/generate", data={
+            "workspace": workspace_id,
+            "files": [file["full_path"] for file in root_level["files"]],
+            "folders": [folder["path"] for folder in root_level["folders"]],
+            "show_file_info": "1"
+        })
+        if response.status_code != 302:
+            raise RuntimeError(f"POST /generate failed with {response.status_code}")
+        return {"bytes": os.path.getsize(zip_path)}
+
+    def prepare(self, stage, zip_path):
+        """Untimed setup a stage needs before each run."""
+        # /generate needs the workspace and file list from a prior /confirm
+        if stage == "route_generate":
+            self._pending_confirm = self._confirm(zip_path)
+
+    def run_stage(self, stage, zip_path, root, repeat):
+        runs = []
+        peak = None
+        info = {}
+        for _ in range(repeat):
+            self.prepare(stage, zip_path)
+            with MemorySampler() as sampler:
+                start = time.perf_counter()
+                info = getattr(self, f"stage_{stage}")(zip_path, root)
+                runs.append(time.perf_counter() - start)
+            if sampler.peak is not None:
+                peak = max(peak or 0, sampler.peak)
+
+        seconds = statistics.median(runs)
+        result = {"seconds": round(seconds, 4), "runs": [round(run, 4) for run in runs],
+                  "peak_rss_bytes": peak}
+        result.update(info)
+        if seconds > 0:
+            if "pages" in info:
+                result["pages_per_sec"] = round(info["pages"] / seconds, 2)
+            if "bytes" in info:
+                result["mb_per_sec"] = round(info["bytes"] / seconds / (1024 * 1024), 3)
+        return result
+
+def _configure(scratch_dir):
+    """
+    Points every on-disk location at the scratch dir and disables caching.
+    Must run before the app's services are imported, since they read these
+    paths once when created.
+    """
+    Config.UPLOAD_DIR = os.path.join(scratch_dir, "uploads")
+    Config.WORKSPACE_ROOT = os.path.join(scratch_dir, "workspaces")
+    Config.RENDER_CACHE_DIR = os.path.join(scratch_dir, "render_cache")
+    Config.RESULT_STORE_DIR = os.path.join(scratch_dir, "results")
+    Config.COUNTER_FILE = os.path.join(scratch_dir, "counter.json")
+    # The counter is flushed once by PipelineBench.close(), before the
+    # scratch dir is removed, rather than by its background thread
+    Config.COUNTER_FLUSH_INTERVAL = 24 * 3600
+    Config.RENDER_CACHE_ENABLED = False
+    os.makedirs(Config.UPLOAD_DIR, exist_ok=True)
+
+def _metadata(args):
+    import fitz
+    return {
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "pymupdf": getattr(fitz, "VersionBind", "unknown"),
+        "scale": args.scale,
+        "repeat": args.repeat,
+        "workers": args.workers,
+        "cpu_count": os.cpu_count()
+    }
+
+def run(args):
+    corpora = args.corpus or list(CORPORA)
+    stages = args.stage or STAGES
+    output_path = os.path.abspath(args.output)
+    scratch_dir = tempfile.mkdtemp(prefix="unifydoc-bench-")
+    results = {}
+    _configure(scratch_dir)
+    bench = PipelineBench(scratch_dir, args.workers)
+    try:
+        corpus_dir = os.path.join(scratch_dir, "corpora")
+        for name in corpora:
+            print(f"Building corpus {name}...", file=sys.stderr)
+            root, zip_path = build_corpus(name, corpus_dir, args.scale)
+            for stage in stages:
+                result = bench.run_stage(stage, zip_path, root, args.repeat)
+                results[f"{name}/{stage}"] = result
+                print(f"  {stage:<15} {result['seconds']:>9.3f}s", file=sys.stderr)
+    finally:
+        bench.close()
+        shutil.rmtree(scratch_dir, ignore_errors=True)
+
+    with open(output_path, "w") as f:
+        json.dump({"meta": _metadata(args), "results": results}, f, indent=2)
+    print(f"Wrote {output_path}", file=sys.stderr)
+    return 0
+
+def compare(args):
+    with open(args.baseline) as f:
+        baseline = json.load(f)["results"]
+    with open(args.current) as f:
+        current = json.load(f)["results"]
+
+    regressions = 0
+    for key in sorted(set(baseline) & set(current)):
+        before = baseline[key]["seconds"]
+        after = current[key]["seconds"]
+        ratio = after / before if before else float("inf")
+        flag = ""
+        if ratio > 1 + args.threshold and after - before > args.min_seconds:
+            flag = "  SLOWER"
+            regressions += 1
+        print(f"{key:<40} {before:>9.3f}s -> {after:>9.3f}s  x{ratio:5.2f}{flag}")
+    for key in sorted(set(baseline) ^ set(current)):
+        print(f"{key:<40} only in {'baseline' if key in baseline else 'current'}")
+
+    print(f"{regressions} regression(s) above {args.threshold:.0%}")
+    return 1 if regressions else 0
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    run_parser = commands.add_parser("run", help="benchmark the pipeline")
+    run_parser.add_argument("--output", default="bench_results.json")
+    run_parser.add_argument("--corpus", action="append", choices=sorted(CORPORA),
+                            help="corpus to run (repeatable; default all)")
+    run_parser.add_argument("--stage", action="append", choices=STAGES,
+                            help="stage to run (repeatable; default all)")
+    run_parser.add_argument("--scale", type=float, default=1.0,
+                            help="corpus size multiplier")
+    run_parser.add_argument("--repeat", type=int, default=3)
+    run_parser.add_argument("--workers", type=int, default=1,
+                            help="PDFGenerator worker processes")
+    run_parser.set_defaults(func=run)
+
+    compare_parser = commands.add_parser("compare", help="flag slowdowns between runs")
+    compare_parser.add_argument("baseline")
+    compare_parser.add_argument("current")
+    compare_parser.add_argument("--threshold", type=float, default=0.10,
+                                help="relative slowdown that counts as a regression")
+    compare_parser.add_argument("--min-seconds", type=float, default=0.05,
+                                help="ignore absolute differences below this")
+    compare_parser.set_defaults(func=compare)
+
+    args = parser.parse_args(argv)
+    return args.func(args)
+
+if __name__ == "__main__":
+    sys.exit(main())
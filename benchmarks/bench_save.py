@@ -0,0 +1,53 @@
+"""
+Size/time report of the output save profiles.
+
+    python -m benchmarks.bench_save --scale 0.2
+
+Converts each corpus once per profile in pdf_output.SAVE_PROFILES and
+prints the total and save time and the output size, relative to "fast".
+"""
+import argparse
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+from app.services.pdf_generator import PDFGenerator
+from app.services.pdf_output import SAVE_PROFILES
+from benchmarks.corpora import CORPORA, build_corpus
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--corpus", action="append", choices=sorted(CORPORA),
+                        help="corpus to run (repeatable; default all)")
+    parser.add_argument("--scale", type=float, default=0.2, help="corpus size multiplier")
+    parser.add_argument("--low-memory", action="store_true",
+                        help="save in chunks as the low-memory mode does")
+    args = parser.parse_args(argv)
+
+    scratch_dir = tempfile.mkdtemp(prefix="unifydoc-bench-")
+    try:
+        for name in args.corpus or list(CORPORA):
+            root, _ = build_corpus(name, os.path.join(scratch_dir, "corpora"), args.scale)
+            file_paths = sorted(os.path.join(folder, file)
+                                for folder, _, files in os.walk(root) for file in files)
+            output_pdf_path = os.path.join(scratch_dir, "bench.pdf")
+            baseline = None
+            for profile in SAVE_PROFILES:
+                generator = PDFGenerator(base_dir=root, low_memory=args.low_memory,
+                                         save_profile=profile)
+                start = time.perf_counter()
+                stats = generator.generate(file_paths, output_pdf_path)
+                seconds = time.perf_counter() - start
+                size = stats["output_bytes"]
+                baseline = baseline or (seconds, size)
+                print(f"{name:<17} {profile:<8} total {seconds:7.3f}s "
+                      f"(x{seconds / baseline[0]:4.2f})  save {stats['save_seconds']:7.3f}s  "
+                      f"output {size / 1048576:8.2f} MB ({size / baseline[1]:6.1%})")
+    finally:
+        shutil.rmtree(scratch_dir, ignore_errors=True)
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,55 @@
+"""
+Benchmark of the code wrapper against textwrap.
+
+    python -m benchmarks.bench_wrap --lines 200000
+
+Wraps generated source of ordinary and minified-length lines with both the
+per-line textwrap.wrap loop the generator used before and wrap_code, and
+prints the median seconds and speed-up for each.
+"""
+import argparse
+import random
+import statistics
+import sys
+import textwrap
+import time
+
+from app.config.settings import Config
+from app.utils.text_wrap import wrap_code
+from benchmarks.corpora import _code_line
+
+def textwrap_lines(content, width):
+    return [wrapped_line
+            for line in content.splitlines()
+            for wrapped_line in textwrap.wrap(line, width=width)]
+
+def _median_seconds(func, content, width, repeat):
+    runs = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func(content, width)
+        runs.append(time.perf_counter() - start)
+    return statistics.median(runs)
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--lines", type=int, default=200000)
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--width", type=int, default=Config.MAX_CHARS_PER_LINE)
+    args = parser.parse_args(argv)
+
+    rng = random.Random(0)
+    contents = {
+        "code": "\n".join(_code_line(rng) for _ in range(args.lines)),
+        "long_lines": "\n".join(_code_line(rng, max_words=400)
+                                for _ in range(max(1, args.lines // 50)))
+    }
+    for name, content in contents.items():
+        before = _median_seconds(textwrap_lines, content, args.width, args.repeat)
+        after = _median_seconds(wrap_code, content, args.width, args.repeat)
+        print(f"{name:<12} textwrap {before:8.3f}s  wrap_code {after:8.3f}s  "
+              f"x{before / after:5.1f}")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,109 @@
+"""
+Synthetic repository corpora for the conversion benchmarks.
+Every corpus is generated offline from a fixed seed, so runs on different
+machines and commits convert exactly the same input.
+"""
+import os
+import random
+import zipfile
+import fitz
+
+WORDS = [
+    "def", "return", "self", "import", "class", "for", "in", "if", "else",
+    "value", "result", "config", "items", "index", "print", "None", "True",
+    "lambda", "yield", "with", "open", "path", "data", "=", "+", "(", ")", ":"
+]
+
+def _code_line(rng, max_words=14):
+    indent = "    " * rng.randint(0, 4)
+    return indent + " ".join(rng.choice(WORDS) for _ in range(rng.randint(0, max_words)))
+
+def _write_code_file(path, rng, lines, max_words=14):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, "w", encoding="utf-8") as f:
+        for _ in range(lines):
+            f.write(_code_line(rng, max_words) + "\n")
+
+def _write_image(path, rng, width=1600, height=1200):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    # Blocky noise: compresses poorly enough to behave like a real screenshot
+    block = 16
+    row_blocks = width // block
+    rows = []
+    for _ in range(height // block):
+        colors = [bytes(rng.randrange(256) for _ in range(3)) for _ in range(row_blocks)]
+        row = b"".join(color * block for color in colors)
+        rows.extend([row] * block)
+    pix = fitz.Pixmap(fitz.csRGB, width, height, b"".join(rows), False)
+    pix.save(path)
+
+def _write_pdf(path, rng, pages):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    doc = fitz.open()
+    for _ in range(pages):
+        page = doc.new_page()
+        text = "\n".join(_code_line(rng) for _ in range(50))
+        page.insert_text((50, 50), text, fontsize=9, fontname="helv")
+    doc.save(path)
+    doc.close()
+
+def many_small_files(root, rng, scale):
+    for index in range(int(2000 * scale)):
+        package = f"pkg{index % 40}"
+        _write_code_file(os.path.join(root, package, f"module_{index}.py"), rng,
+                         rng.randint(5, 60))
+
+def few_huge_files(root, rng, scale):
+    for index in range(3):
+        _write_code_file(os.path.join(root, f"generated_{index}.py"), rng,
+                         int(20000 * scale))
+
+def long_lines(root, rng, scale):
+    for index in range(int(20 * scale) or 1):
+        _write_code_file(os.path.join(root, f"minified_{index}.js"), rng, 300,
+                         max_words=400)
+
+def image_heavy(root, rng, scale):
+    for index in range(int(30 * scale) or 1):
+        _write_image(os.path.join(root, "assets", f"screenshot_{index}.png"), rng)
+    for index in range(int(30 * scale) or 1):
+        _write_code_file(os.path.join(root, "src", f"view_{index}.py"), rng, 80)
+
+def pdf_heavy(root, rng, scale):
+    for index in range(int(6 * scale) or 1):
+        _write_pdf(os.path.join(root, "docs", f"manual_{index}.pdf"), rng, 100)
+    for index in range(int(20 * scale) or 1):
+        _write_code_file(os.path.join(root, "src", f"tool_{index}.py"), rng, 80)
+
+def deep_tree(root, rng, scale):
+    for index in range(int(600 * scale)):
+        depth = rng.randint(1, 14)
+        folders = [f"level{level}_{rng.randint(0, 3)}" for level in range(depth)]
+        _write_code_file(os.path.join(root, *folders, f"leaf_{index}.py"), rng,
+                         rng.randint(5, 40))
+
+CORPORA = {
+    "many_small_files": many_small_files,
+    "few_huge_files": few_huge_files,
+    "long_lines": long_lines,
+    "image_heavy": image_heavy,
+    "pdf_heavy": pdf_heavy,
+    "deep_tree": deep_tree,
+}
+
+def build_corpus(name, base_dir, scale=1.0, seed=1234):
+    """
+    Generates a corpus under base_dir/name and zips it to base_dir/name.zip.
+    Returns (corpus folder, zip path).
+    """
+    root = os.path.join(base_dir, name)
+    rng = random.Random(f"{seed}:{name}")
+    CORPORA[name](root, rng, scale)
+
+    zip_path = os.path.join(base_dir, f"{name}.zip")
+    with zipfile.ZipFile(zip_path, "w", zipfile.ZIP_DEFLATED) as zip_ref:
+        for folder, _, files in os.walk(root):
+            for file in sorted(files):
+                file_path = os.path.join(folder, file)
+                zip_ref.write(file_path, os.path.relpath(file_path, base_dir))
+    return root, zip_path
@@ -0,0 +1,79 @@
+"""
+Converts directories, ZIPs or files to PDF (or HTML/text) without the web app.
+
+    python convert.py src/ other-project.zip "docs/**/*.md" -o out --page-size a4
+
+Each directory and ZIP becomes its own output in the output directory; loose
+files are converted together. Projects whose inputs and settings are
+unchanged since the last run into the same output directory are skipped.
+"""
+import argparse
+import os
+import sys
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("inputs", nargs="+",
+                        help="directories, ZIP files or files; glob patterns are expanded")
+    parser.add_argument("-o", "--output-dir", default=".", help="where outputs are written")
+    parser.add_argument("-j", "--jobs", type=int, default=os.cpu_count(),
+                        help="worker processes (default: one per CPU)")
+    parser.add_argument("--force", action="store_true",
+                        help="convert every project, even if unchanged")
+    parser.add_argument("--name", default="files", help="output name of the loose files")
+    parser.add_argument("--format", dest="output_format", choices=("pdf", "html", "txt"),
+                        default="pdf")
+    parser.add_argument("--margin", type=int, default=10)
+    parser.add_argument("--page-size", choices=("letter", "a4", "legal"), default="letter")
+    parser.add_argument("--orientation", choices=("portrait", "landscape"),
+                        default="portrait")
+    parser.add_argument("--header-note", default="")
+    parser.add_argument("--footer-note", default="")
+    parser.add_argument("--show-file-info", action="store_true",
+                        help="print each file's name and path above its pages")
+    parser.add_argument("--save-profile", choices=("fast", "compact"),
+                        help="PDF save profile (default: PDF_SAVE_PROFILE)")
+    parser.add_argument("--syntax-highlighting", action="store_true")
+    parser.add_argument("--contents-page", action="store_true")
+    return parser.parse_args(argv)
+
+def main(argv=None):
+    args = parse_args(argv)
+    # Imported after parsing, so --help and argument errors return at once
+    from app.config.settings import Config
+    from app.services.batch_service import BatchConverter
+
+    # The same settings the upload form produces
+    settings = {
+        "margin": args.margin,
+        "header_note": args.header_note,
+        "footer_note": args.footer_note,
+        "orientation": args.orientation,
+        "page_size": args.page_size,
+        "show_file_info": args.show_file_info,
+        "save_profile": args.save_profile or Config.PDF_SAVE_PROFILE,
+        "syntax_highlighting": args.syntax_highlighting,
+        "contents_page": args.contents_page,
+        "output_format": args.output_format
+    }
+    try:
+        projects = BatchConverter.find_projects(args.inputs, args.name)
+    except ValueError as e:
+        print(f"convert.py: {e}", file=sys.stderr)
+        return 2
+
+    def report(result):
+        if result["status"] == "converted":
+            print(f"{result['name']}: converted, {result['pages']} pages in "
+                  f"{result['seconds']:.2f}s -> {result['output']}")
+        elif result["status"] == "unchanged":
+            print(f"{result['name']}: unchanged -> {result['output']}")
+        else:
+            print(f"{result['name']}: failed. Reason: {result['error']}", file=sys.stderr)
+
+    converter = BatchConverter(settings, args.output_dir, args.jobs, args.force)
+    results = converter.run(projects, report)
+    return 1 if any(result["status"] == "failed" for result in results) else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -2,6 +2,7 @@ class LoadingPopup {
     constructor() {
         this.overlay = document.getElementById('loading-overlay');
         this.cancelButton = document.getElementById('loading-cancel-btn');
+        this.progress = document.getElementById('loading-progress');
         this.isConverting = false;
         this.currentConversionId = null;
         this.setupEventListeners();
@@ -50,21 +51,31 @@ class LoadingPopup {
                 body: formData
             });
 
-            if (!response.ok) throw new Error('Conversion failed');
+            if (!response.ok) throw await this.responseError(response);
 
-            const result = await response.json();
+            const queued = await response.json();
+            
+            // Cancellation now targets the server-side job
+            this.currentConversionId = queued.job_id;
+            const result = await this.pollJob(queued.status_url);
             
             if (result.status === 'cancelled') {
                 this.showMessage('PDF conversion cancelled.');
                 return;
             }
 
+            if (result.status !== 'success') {
+                const error = new Error(result.message || 'Conversion failed');
+                error.userMessage = result.message;
+                throw error;
+            }
+
             // Redirect or update UI based on successful conversion
             window.location.href = `/?pdf_url=${encodeURIComponent(result.pdf_url)}&view_url=${encodeURIComponent(result.view_url)}`;
 
         } catch (error) {
             console.error('Conversion error:', error);
-            this.showMessage('Error during conversion. Please try again.');
+            this.showMessage(error.userMessage || 'Error during conversion. Please try again.');
         } finally {
             this.isConverting = false;
             this.currentConversionId = null;
@@ -72,7 +83,47 @@ class LoadingPopup {
         }
     }
 
+    async responseError(response) {
+        // The server's message, plus when to retry if it was too busy (429)
+        const error = new Error(`Conversion failed (${response.status})`);
+        try {
+            error.userMessage = (await response.json()).message;
+        } catch (parseError) {
+            // Not a JSON error response; the generic message is shown
+        }
+        const retryAfter = response.headers.get('Retry-After');
+        if (response.status === 429 && retryAfter) {
+            error.userMessage = `${error.userMessage || 'The server is busy.'} ` +
+                `Retry in ${retryAfter} seconds.`;
+        }
+        return error;
+    }
+
+    async pollJob(statusUrl) {
+        // Poll the job until it leaves the queued/processing states
+        while (true) {
+            const response = await fetch(statusUrl);
+            if (!response.ok) throw new Error('Failed to fetch conversion status');
+
+            const job = await response.json();
+            if (job.status !== 'queued' && job.status !== 'processing') {
+                return job;
+            }
+            this.showProgress(job.progress);
+            await new Promise(resolve => setTimeout(resolve, 1000));
+        }
+    }
+
+    showProgress(progress) {
+        if (!this.progress || !progress) return;
+        if (progress.files_total) {
+            this.progress.textContent =
+                `Files ${progress.files_done} / ${progress.files_total} \u00b7 ${progress.pages_done} pages`;
+        }
+    }
+
     show() {
+        if (this.progress) this.progress.textContent = '';
         this.overlay.classList.add('show');
     }
 
@@ -0,0 +1,47 @@
+import os
+import shutil
+import fitz
+import pytest
+from app.services.pdf_generator import PDFGenerator
+
+def _make_corpus(directory):
+    """The same image under two names, with a text file between them."""
+    first = directory / "first.png"
+    pixmap = fitz.Pixmap(fitz.csRGB, fitz.IRect(0, 0, 96, 64), False)
+    for y in range(64):
+        for x in range(96):
+            pixmap.set_pixel(x, y, ((x * 7) % 256, (y * 11) % 256, (x * y) % 256))
+    pixmap.save(str(first))
+    second = directory / "second.png"
+    shutil.copyfile(first, second)
+    notes = directory / "notes.txt"
+    notes.write_text("between the images\n")
+    return [str(first), str(notes), str(second)]
+
+def _render(tmp_path, file_paths, save_profile, **options):
+    output_path = str(tmp_path / f"out-{save_profile}-{len(os.listdir(tmp_path))}.pdf")
+    generator = PDFGenerator(base_dir=str(tmp_path / "corpus"), save_profile=save_profile,
+                             **options)
+    stats = generator.generate(file_paths, output_path)
+    with fitz.open(output_path) as doc:
+        images = {image[0] for page in doc for image in page.get_images()}
+        pixels = [page.get_pixmap().samples for page in doc]
+    return stats, images, pixels
+
+@pytest.mark.parametrize("save_profile", ["fast", "compact"])
+@pytest.mark.parametrize("options", [{"workers": 3}, {"document_id": "ab" * 16}],
+                         ids=["parallel", "spliced"])
+def test_identical_images_are_embedded_once_across_fragments(tmp_path, save_profile, options):
+    corpus = tmp_path / "corpus"
+    corpus.mkdir()
+    file_paths = _make_corpus(corpus)
+
+    serial_stats, serial_images, serial_pixels = _render(tmp_path, file_paths, save_profile,
+                                                         workers=1)
+    stats, images, pixels = _render(tmp_path, file_paths, save_profile, **options)
+
+    assert len(serial_images) == len(images) == 1
+    assert stats["images_deduplicated"] == serial_stats["images_deduplicated"] == 1
+    assert pixels == serial_pixels
+    # Only the empty objects left by the dropped copy separate it from serial output
+    assert stats["output_bytes"] <= serial_stats["output_bytes"] * 1.05
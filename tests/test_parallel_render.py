@@ -0,0 +1,108 @@
+import zipfile
+import fitz
+import pytest
+from app.services.admission_service import JobBudget, JobLimitExceeded
+from app.services.file_processor import FileProcessor
+from app.services.pdf_generator import PDFGenerator
+
+def _make_corpus(directory):
+    """Code, text, image and PDF inputs, with enough lines to span several pages."""
+    paths = []
+    code = directory / "main.py"
+    code.write_text("".join(f"def f{i}(x):\n    return x * {i}  # {'#' * (i % 120)}\n"
+                            for i in range(150)))
+    paths.append(code)
+    notes = directory / "notes.txt"
+    notes.write_text("\n".join(f"line {i}\twith a tab" for i in range(90)))
+    paths.append(notes)
+
+    image = directory / "pixel.png"
+    pixmap = fitz.Pixmap(fitz.csRGB, fitz.IRect(0, 0, 64, 48), False)
+    pixmap.set_rect(pixmap.irect, (200, 40, 40))
+    pixmap.save(str(image))
+    paths.append(image)
+
+    pdf = directory / "input.pdf"
+    with fitz.open() as doc:
+        for number in range(3):
+            doc.new_page(width=612, height=792).insert_text((72, 72), f"PDF input page {number}")
+        doc.save(str(pdf))
+    paths.append(pdf)
+
+    config = directory / "settings.json"
+    config.write_text('{"workers": 3}\n')
+    paths.append(config)
+    return [str(path) for path in paths]
+
+def _make_zip(directory, files=24):
+    """A ZIP of source files, each long enough to be read in several chunks."""
+    zip_path = directory / "project.zip"
+    with zipfile.ZipFile(zip_path, "w", zipfile.ZIP_DEFLATED) as archive:
+        for number in range(files):
+            archive.writestr(f"project/src/module{number:02}.py",
+                             "".join(f"value_{number}_{line} = {line * number}  # {line}\n"
+                                     for line in range(2000)))
+    return str(zip_path)
+
+def _assert_same_output(serial, parallel):
+    serial_stats, serial_texts, serial_toc = serial
+    parallel_stats, parallel_texts, parallel_toc = parallel
+    assert serial_stats["pages"] == parallel_stats["pages"] == len(serial_texts)
+    assert len(parallel_texts) == len(serial_texts)
+    for number, (serial_text, parallel_text) in enumerate(zip(serial_texts, parallel_texts)):
+        assert serial_text == parallel_text, f"page {number} differs"
+    assert serial_toc == parallel_toc
+
+def _render(tmp_path, file_paths, workers):
+    output_path = str(tmp_path / f"out-{workers}.pdf")
+    generator = PDFGenerator(workers=workers, base_dir=str(tmp_path / "corpus"),
+                             footer_note="footer", show_file_info=True)
+    try:
+        stats = generator.generate(file_paths, output_path)
+    finally:
+        FileProcessor.close_zip(str(tmp_path / "corpus" / "project.zip"))
+    with fitz.open(output_path) as doc:
+        texts = [page.get_text() for page in doc]
+        toc = doc.get_toc()
+    return stats, texts, toc
+
+@pytest.mark.parametrize("repeat", [1, 2])
+def test_parallel_render_matches_serial(tmp_path, repeat):
+    corpus = tmp_path / "corpus"
+    corpus.mkdir()
+    # Repeating the inputs gives the pool more files than workers
+    file_paths = _make_corpus(corpus) * repeat
+
+    _assert_same_output(_render(tmp_path, file_paths, workers=1),
+                        _render(tmp_path, file_paths, workers=3))
+
+def test_parallel_render_of_streamed_zip_matches_serial(tmp_path):
+    corpus = tmp_path / "corpus"
+    corpus.mkdir()
+    # Members are read from the archive in place, as with STREAM_ZIP_INGESTION;
+    # the parent opens it first to size and classify them
+    file_paths = FileProcessor.iter_zip(_make_zip(corpus), str(corpus))
+
+    _assert_same_output(_render(tmp_path, file_paths, workers=1),
+                        _render(tmp_path, file_paths, workers=4))
+
+def test_worker_cpu_time_is_charged_to_the_job_budget(tmp_path):
+    corpus = tmp_path / "corpus"
+    corpus.mkdir()
+    file_paths = _make_corpus(corpus) * 2
+    budget = JobBudget(str(tmp_path), cpu_seconds=0, max_pages=0, disk_bytes=0)
+    charges = []
+
+    def charge_cpu(seconds):
+        charges.append(seconds)
+        budget.charge_cpu(seconds)
+
+    generator = PDFGenerator(workers=3, base_dir=str(corpus))
+    generator.generate(file_paths, str(tmp_path / "out.pdf"), cpu_callback=charge_cpu)
+
+    # One charge per group of files rendered in the pool
+    assert len(charges) >= 3 and all(seconds > 0 for seconds in charges)
+    assert budget.cpu_used() >= sum(charges)
+    budget.cpu_seconds = sum(charges) / 2
+    with pytest.raises(JobLimitExceeded):
+        budget.check()